@@ -3,12 +3,48 @@ from os import makedirs
 
 from ovos_backend_client.backends import OfflineBackend, \
     PersonalBackend, BackendType, get_backend_config, API_REGISTRY
+from ovos_backend_client.cache import cached_response
+from ovos_backend_client.dataset import export_dataset, import_dataset
 from ovos_backend_client.settings import get_local_settings
+from ovos_backend_client.stt import STTPriority, get_stt_dispatcher
+from ovos_backend_client.transcription import BatchTranscriptionJob
+from ovos_backend_client.weather import geo_bucketed, get_weather_config, \
+    onecall_current, onecall_hourly, onecall_daily
 from ovos_config.config import Configuration, get_xdg_config_save_path
-from ovos_utils import timed_lru_cache
 from ovos_utils.log import LOG
 
 
+def prepare_skills_data(data, uuid):
+    """ strip a skills.json manifest down to the bare essentials expected by the backend """
+    if not isinstance(data, dict):
+        raise ValueError('data must be of type dict')
+
+    _data = dict(data)  # Make sure the input data isn't modified
+    to_send = {'skills': []}
+    if 'blacklist' in _data:
+        to_send['blacklist'] = _data['blacklist']
+    else:
+        LOG.warning('skills manifest lacks blacklist entry')
+        to_send['blacklist'] = []
+
+    # Make sure skills doesn't contain duplicates (keep only last)
+    if 'skills' in _data:
+        skills = {s['name']: s for s in _data['skills']}
+        to_send['skills'] = [skills[key] for key in skills]
+    else:
+        LOG.warning('skills manifest lacks skills entry')
+        to_send['skills'] = []
+
+    for s in to_send['skills']:
+        # Remove optional fields backend objects to
+        if 'update' in s:
+            s.pop('update')
+
+        # Finalize skill_gid with uuid if needed
+        s['skill_gid'] = s.get('skill_gid', '').replace('@|', f'@{uuid}|')
+    return to_send
+
+
 class BaseApi:
     def __init__(self, url=None, version="v1", identity_file=None, backend_type=None, credentials=None):
         url, version, identity_file, backend_type = get_backend_config(url, version,
@@ -209,35 +245,7 @@ class DeviceApi(BaseApi):
         Args:
              data: dictionary with skills data from msm
         """
-        if not isinstance(data, dict):
-            raise ValueError('data must be of type dict')
-
-        _data = dict(data)  # Make sure the input data isn't modified
-        # Strip the skills.json down to the bare essentials
-        to_send = {'skills': []}
-        if 'blacklist' in _data:
-            to_send['blacklist'] = _data['blacklist']
-        else:
-            LOG.warning('skills manifest lacks blacklist entry')
-            to_send['blacklist'] = []
-
-        # Make sure skills doesn't contain duplicates (keep only last)
-        if 'skills' in _data:
-            skills = {s['name']: s for s in _data['skills']}
-            to_send['skills'] = [skills[key] for key in skills]
-        else:
-            LOG.warning('skills manifest lacks skills entry')
-            to_send['skills'] = []
-
-        for s in to_send['skills']:
-            # Remove optional fields backend objects to
-            if 'update' in s:
-                s.pop('update')
-
-            # Finalize skill_gid with uuid if needed
-            s['skill_gid'] = s.get('skill_gid', '').replace('@|', f'@{self.uuid}|')
-
-        return self.backend.device_upload_skills_data(to_send)
+        return self.backend.device_upload_skills_data(prepare_skills_data(data, self.uuid))
 
     ## DEPRECATED APIS below, use dedicated classes instead
     def get_oauth_token(self, dev_cred):
@@ -298,7 +306,7 @@ class DeviceApi(BaseApi):
         return self.backend.device_put_skill_settings_v1(data)
 
     # cached for 30 seconds because often 1 call per skill is done in quick succession
-    @timed_lru_cache(seconds=30)
+    @cached_response("skill_settings")
     def get_skill_settings(self):
         """Get the remote skill settings for all skills on this device."""
         ## DEPRECATED - compat only for old devices
@@ -338,18 +346,48 @@ class STTApi(BaseApi):
         h["Content-Type"] = "audio/x-flac"
         return h
 
-    def stt(self, audio, language="en-us", limit=1):
+    @property
+    def dispatcher(self):
+        """ shared STTDispatcher bounding concurrent requests to this backend """
+        return get_stt_dispatcher(self.backend_url)
+
+    def stt(self, audio, language="en-us", limit=1, priority=STTPriority.INTERACTIVE):
         """ Web API wrapper for performing Speech to Text (STT)
 
         Args:
             audio (bytes): The recorded audio, as in a FLAC file
             language (str): A BCP-47 language code, e.g. "en-US"
             limit (int): Maximum minutes to transcribe(?)
+            priority (STTPriority): INTERACTIVE requests are served before DATASET ones
 
         Returns:
             dict: JSON structure with transcription results
+
+        Raises:
+            STTQueueFull: too many requests pending
+        """
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            return self.backend.stt_get(audio, language, limit)
+        return dispatcher.transcribe(self.backend.stt_get, audio, language, limit, priority)
+
+    def stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        with a personal backend partial hypotheses are only received after the last chunk,
+        see PersonalBackend.stt_stream, use AsyncSTTApi.stream to get them as they are decoded
+
+        Args:
+            chunks (iterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
         """
-        return self.backend.stt_get(audio, language, limit)
+        yield from self.backend.stt_stream(chunks, language, limit, sample_rate, sample_width)
 
 
 class GeolocationApi(BaseApi):
@@ -417,16 +455,16 @@ class WolframAlphaApi(BaseApi):
         else:
             self.url = f"{self.backend_url}/{self.backend_version}/wolframAlpha"
 
-    # cached to save api calls, wolfram answer wont change often
-    @timed_lru_cache(seconds=60 * 30)
+    # cached across processes to save api calls, wolfram answer wont change often
+    @cached_response("wolfram")
     def spoken(self, query, units="metric", lat_lon=None, optional_params=None):
         return self.backend.wolfram_spoken(query, units, lat_lon, optional_params)
 
-    @timed_lru_cache(seconds=60 * 30)
+    @cached_response("wolfram")
     def simple(self, query, units="metric", lat_lon=None, optional_params=None):
         return self.backend.wolfram_simple(query, units, lat_lon, optional_params)
 
-    @timed_lru_cache(seconds=60 * 30)
+    @cached_response("wolfram")
     def full_results(self, query, units="metric", lat_lon=None, optional_params=None):
         """Wrapper for the WolframAlpha Full Results v2 API.
             https://products.wolframalpha.com/api/documentation/
@@ -464,8 +502,9 @@ class OpenWeatherMapApi(BaseApi):
         """
         return self.backend.owm_language(lang)
 
-    # cached to save api calls, owm only updates data every 15mins or so
-    @timed_lru_cache(seconds=60 * 10)
+    # cached across processes to save api calls, owm only updates data every 15mins or so
+    @geo_bucketed
+    @cached_response("owm")
     def get_weather(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -475,7 +514,8 @@ class OpenWeatherMapApi(BaseApi):
         """
         return self.backend.owm_get_weather(lat_lon, lang, units)
 
-    @timed_lru_cache(seconds=60 * 10)
+    @geo_bucketed
+    @cached_response("owm")
     def get_current(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -483,9 +523,12 @@ class OpenWeatherMapApi(BaseApi):
             units (str): metric or imperial measurement units
             lat_lon (tuple): the geologic (latitude, longitude) of the weather location
         """
+        if get_weather_config()["aggregate"]:
+            return onecall_current(self.get_weather(lat_lon, lang, units))
         return self.backend.owm_get_current(lat_lon, lang, units)
 
-    @timed_lru_cache(seconds=60 * 10)
+    @geo_bucketed
+    @cached_response("owm")
     def get_hourly(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -493,9 +536,12 @@ class OpenWeatherMapApi(BaseApi):
             units (str): metric or imperial measurement units
             lat_lon (tuple): the geologic (latitude, longitude) of the weather location
         """
+        if get_weather_config()["aggregate"]:
+            return onecall_hourly(self.get_weather(lat_lon, lang, units))
         return self.backend.owm_get_hourly(lat_lon, lang, units)
 
-    @timed_lru_cache(seconds=60 * 10)
+    @geo_bucketed
+    @cached_response("owm")
     def get_daily(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -503,6 +549,8 @@ class OpenWeatherMapApi(BaseApi):
             units (str): metric or imperial measurement units
             lat_lon (tuple): the geologic (latitude, longitude) of the weather location
         """
+        if get_weather_config()["aggregate"]:
+            return onecall_daily(self.get_weather(lat_lon, lang, units))
         return self.backend.owm_get_daily(lat_lon, lang, units)
 
 
@@ -567,6 +615,21 @@ class DatasetApi(BaseApi):
     def upload_stt_recording(self, audio, params, upload_url=None):
         return self.backend.dataset_upload_stt_recording(audio, params, upload_url)
 
+    def _validate_local(self):
+        # only the offline backend stores recordings in the local databases
+        if self.backend_type != BackendType.OFFLINE:
+            raise ValueError(f"local datasets not available for {self.backend_type}")
+
+    def export_dataset(self, dst, datasets=("wakewords", "utterances"), compression=None):
+        """ stream the recordings stored on this device into a tar archive, see dataset.export_dataset """
+        self._validate_local()
+        return export_dataset(dst, datasets, compression)
+
+    def import_dataset(self, src, uuid=None):
+        """ add the recordings of an exported archive to this device, see dataset.import_dataset """
+        self._validate_local()
+        return import_dataset(src, uuid)
+
 
 class MetricsApi(BaseApi):
     """Web API wrapper for netrics collection"""
@@ -579,8 +642,31 @@ class MetricsApi(BaseApi):
             raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
 
     def report_metric(self, name, data):
+        """ queue a metric for upload, returns None unless metrics buffering is disabled """
         return self.backend.metrics_upload(name, data)
 
+    def count(self, name, value=1):
+        """ increment a counter, aggregated in memory and reported as {"type": "counter", "value": total} """
+        buffer = self.backend.metrics_buffer
+        if buffer is None:
+            return self.report_metric(name, {"type": "counter", "value": value})
+        buffer.count(name, value)
+
+    def timing(self, name, seconds):
+        """ record a duration, aggregated in memory and reported as
+        {"type": "timer", "count": n, "total": seconds, "min": seconds, "max": seconds} """
+        buffer = self.backend.metrics_buffer
+        if buffer is None:
+            return self.report_metric(name, {"type": "timer", "count": 1, "total": seconds,
+                                             "min": seconds, "max": seconds})
+        buffer.timing(name, seconds)
+
+    def flush(self):
+        """ upload buffered metrics now """
+        buffer = self.backend.metrics_buffer
+        if buffer is not None:
+            buffer.flush()
+
 
 class OAuthApi(BaseApi):
     """Web API wrapper for oauth api"""
@@ -631,8 +717,11 @@ class DatabaseApi(BaseApi):
         if self.backend_type in [BackendType.PERSONAL] and not self.credentials.get("admin"):
             raise ValueError(f"Admin key not set, can not access remote database")
 
-    def list_devices(self):
-        return self.backend.db_list_devices()
+    def list_devices(self, offset=0, limit=None):
+        return self.backend.db_list_devices(offset, limit)
+
+    def iter_devices(self, page_size=100):
+        return self.backend.iter_devices(page_size)
 
     def get_device(self, uuid):
         return self.backend.db_get_device(uuid)
@@ -747,8 +836,11 @@ class DatabaseApi(BaseApi):
     def add_oauth_token(self, token_id, token_data):
         return self.backend.db_post_oauth_token(token_id, token_data)
 
-    def list_stt_recordings(self):
-        return self.backend.db_list_stt_recordings()
+    def list_stt_recordings(self, offset=0, limit=None):
+        return self.backend.db_list_stt_recordings(offset, limit)
+
+    def iter_stt_recordings(self, page_size=100):
+        return self.backend.iter_stt_recordings(page_size)
 
     def get_stt_recording(self, rec_id):
         return self.backend.db_get_stt_recording(rec_id)
@@ -756,14 +848,33 @@ class DatabaseApi(BaseApi):
     def update_stt_recording(self, rec_id, transcription=None, metadata=None):
         return self.backend.db_update_stt_recording(rec_id, transcription, metadata)
 
+    def update_stt_recordings(self, updates):
+        """ bulk update transcriptions, updates is a {rec_id: transcription} dict """
+        return self.backend.db_update_stt_recordings(updates)
+
+    def transcribe_stt_recordings(self, lang="en-us", stt_config=None, workers=None, batch_size=50):
+        """ re-transcribe recorded utterances with a local STT plugin, resumes an interrupted run
+
+        Returns:
+            int: number of recordings updated
+        """
+        job = BatchTranscriptionJob(self.backend, lang, stt_config, workers, batch_size)
+        return job.run()
+
     def delete_stt_recording(self, rec_id):
         return self.backend.db_delete_stt_recording(rec_id)
 
     def add_stt_recording(self, byte_data, transcription, metadata=None):
         return self.backend.db_post_stt_recording(byte_data, transcription, metadata)
 
-    def list_ww_recordings(self):
-        return self.backend.db_list_ww_recordings()
+    def list_ww_recordings(self, offset=0, limit=None):
+        return self.backend.db_list_ww_recordings(offset, limit)
+
+    def iter_ww_recordings(self, page_size=100):
+        return self.backend.iter_ww_recordings(page_size)
+
+    def query_ww_recordings(self, tag=None, speaker_type=None, uuid=None, since=None, offset=0, limit=None):
+        return self.backend.db_query_ww_recordings(tag, speaker_type, uuid, since, offset, limit)
 
     def get_ww_recording(self, rec_id):
         return self.backend.db_get_ww_recording(rec_id)
@@ -777,8 +888,14 @@ class DatabaseApi(BaseApi):
     def add_ww_recording(self, byte_data, transcription, metadata=None):
         return self.backend.db_post_ww_recording(byte_data, transcription, metadata)
 
-    def list_metrics(self):
-        return self.backend.db_list_metrics()
+    def list_metrics(self, offset=0, limit=None):
+        return self.backend.db_list_metrics(offset, limit)
+
+    def iter_metrics(self, page_size=100):
+        return self.backend.iter_metrics(page_size)
+
+    def query_metrics(self, metric_type=None, uuid=None, since=None, offset=0, limit=None):
+        return self.backend.db_query_metrics(metric_type, uuid, since, offset, limit)
 
     def get_metric(self, metric_id):
         return self.backend.db_get_metric(metric_id)
@@ -0,0 +1,431 @@
+from ovos_backend_client.api import prepare_skills_data
+from ovos_backend_client.backends import AsyncOfflineBackend, AsyncPersonalBackend, \
+    BackendType, get_backend_config, API_REGISTRY
+from ovos_backend_client.cache import cached_response
+from ovos_backend_client.session import close_async_sessions
+from ovos_backend_client.weather import geo_bucketed, get_weather_config, \
+    onecall_current, onecall_hourly, onecall_daily
+
+
+class AsyncBaseApi:
+    """ asyncio mirror of BaseApi, every network call is a coroutine
+
+    connections are pooled per event loop, call close() (or use "async with")
+    before the event loop shuts down
+    """
+
+    def __init__(self, url=None, version="v1", identity_file=None, backend_type=None, credentials=None):
+        url, version, identity_file, backend_type = get_backend_config(url, version,
+                                                                       identity_file, backend_type)
+        self.url = url
+        self.credentials = credentials or {}
+        if backend_type == BackendType.PERSONAL:
+            self.backend = AsyncPersonalBackend(url, version, identity_file, credentials=credentials)
+        else:  # if backend_type == BackendType.OFFLINE:
+            self.backend = AsyncOfflineBackend(url, version, identity_file, credentials=credentials)
+        self.validate_backend_type()
+
+    def validate_backend_type(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, _type, value, traceback):
+        await self.close()
+
+    @staticmethod
+    async def close():
+        await close_async_sessions()
+
+    @property
+    def backend_type(self):
+        return self.backend.backend_type
+
+    @property
+    def backend_url(self):
+        if not self.backend.url.startswith("http"):
+            self.backend.url = f"http://{self.backend.url}"
+        return self.backend.url
+
+    @property
+    def backend_version(self):
+        return self.backend.backend_version
+
+    @property
+    def identity(self):
+        return self.backend.identity
+
+    @property
+    def uuid(self):
+        return self.backend.uuid
+
+    @property
+    def access_token(self):
+        return self.backend.access_token
+
+    @property
+    def headers(self):
+        return self.backend.headers
+
+    async def check_token(self):
+        await self.backend.check_token()
+
+    async def refresh_token(self):
+        await self.backend.refresh_token()
+
+    async def get(self, url=None, *args, **kwargs):
+        return await self.backend.get(url, *args, **kwargs)
+
+    async def post(self, url=None, *args, **kwargs):
+        return await self.backend.post(url, *args, **kwargs)
+
+    async def put(self, url=None, *args, **kwargs):
+        return await self.backend.put(url, *args, **kwargs)
+
+    async def patch(self, url=None, *args, **kwargs):
+        return await self.backend.patch(url, *args, **kwargs)
+
+
+class AsyncDeviceApi(AsyncBaseApi):
+    def __init__(self, url=None, version="v1", identity_file=None, backend_type=None):
+        super().__init__(url, version, identity_file, backend_type)
+        self.url = f"{self.backend_url}/{self.backend_version}/device"
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["device"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+
+    async def get(self, url=None, *args, **kwargs):
+        """ Retrieve all device information from the web backend """
+        return await self.backend.device_get()
+
+    async def get_settings(self):
+        """ Retrieve device settings information from the web backend
+
+        Returns:
+            str: JSON string with user configuration information.
+        """
+        return await self.backend.device_get_settings()
+
+    async def get_code(self, state=None):
+        return await self.backend.device_get_code(state)
+
+    async def activate(self, state, token,
+                       core_version="unknown",
+                       platform="unknown",
+                       platform_build="unknown",
+                       enclosure_version="unknown"):
+        return await self.backend.device_activate(state, token, core_version,
+                                                  platform, platform_build, enclosure_version)
+
+    async def update_version(self,
+                             core_version="unknown",
+                             platform="unknown",
+                             platform_build="unknown",
+                             enclosure_version="unknown"):
+        return await self.backend.device_update_version(core_version, platform, platform_build, enclosure_version)
+
+    async def get_location(self):
+        """ Retrieve device location information from the web backend
+
+        Returns:
+            str: JSON string with user location.
+        """
+        return await self.backend.device_get_location()
+
+    async def upload_skill_metadata(self, settings_meta):
+        """Upload skill metadata.
+
+        Args:
+            settings_meta (dict): skill info and settings in JSON format
+        """
+        return await self.backend.device_upload_skill_metadata(settings_meta)
+
+    async def upload_skills_data(self, data):
+        """ Upload skills.json file. This file contains a manifest of installed
+        and failed installations for use with the Marketplace.
+
+        Args:
+             data: dictionary with skills data from msm
+        """
+        return await self.backend.device_upload_skills_data(prepare_skills_data(data, self.uuid))
+
+
+class AsyncSTTApi(AsyncBaseApi):
+    def __init__(self, url=None, version="v1", identity_file=None, backend_type=None):
+        super().__init__(url, version, identity_file, backend_type)
+        self.url = f"{self.backend_url}/{self.backend_version}/stt"
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["stt"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+
+    @property
+    def headers(self):
+        h = self.backend.headers
+        h["Content-Type"] = "audio/x-flac"
+        return h
+
+    async def stt(self, audio, language="en-us", limit=1):
+        """ Web API wrapper for performing Speech to Text (STT)
+
+        Args:
+            audio (bytes): The recorded audio, as in a FLAC file
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum minutes to transcribe(?)
+
+        Returns:
+            dict: JSON structure with transcription results
+        """
+        return await self.backend.stt_get(audio, language, limit)
+
+    async def stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        Args:
+            chunks (iterable|AsyncIterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        async for hypothesis in self.backend.stt_stream(chunks, language, limit, sample_rate, sample_width):
+            yield hypothesis
+
+
+class AsyncGeolocationApi(AsyncBaseApi):
+    """Web API wrapper for performing geolocation lookups."""
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["geolocate"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+        if self.backend_type == BackendType.OFFLINE:
+            self.url = "https://nominatim.openstreetmap.org"
+        else:
+            self.url = f"{self.backend_url}/{self.backend_version}/geolocation"
+
+    async def get_geolocation(self, location):
+        """Call the geolocation endpoint.
+
+        Args:
+            location (str): the location to lookup (e.g. Kansas City Missouri)
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        return await self.backend.geolocation_get(location)
+
+    async def get_ip_geolocation(self, ip):
+        """Call the geolocation endpoint.
+
+        Args:
+            ip (str): the ip address to lookup
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        return await self.backend.ip_geolocation_get(ip)
+
+    async def get_reverse_geolocation(self, lat, lon):
+        """"Call the reverse geolocation endpoint.
+
+        Args:
+            lat (float): latitude
+            lon (float): longitude
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        return await self.backend.reverse_geolocation_get(lat, lon)
+
+
+class AsyncWolframAlphaApi(AsyncBaseApi):
+
+    def __init__(self, url=None, version="v1", identity_file=None, backend_type=None, key=None):
+        super().__init__(url, version, identity_file, backend_type, credentials={"wolfram": key})
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["wolfram"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+        if self.backend_type == BackendType.OFFLINE and not self.credentials["wolfram"]:
+            raise ValueError("WolframAlpha api key not set!")
+
+        if self.backend_type == BackendType.OFFLINE:
+            self.url = "https://api.wolframalpha.com"
+        else:
+            self.url = f"{self.backend_url}/{self.backend_version}/wolframAlpha"
+
+    # cached across processes to save api calls, wolfram answer wont change often
+    @cached_response("wolfram")
+    async def spoken(self, query, units="metric", lat_lon=None, optional_params=None):
+        return await self.backend.wolfram_spoken(query, units, lat_lon, optional_params)
+
+    @cached_response("wolfram")
+    async def simple(self, query, units="metric", lat_lon=None, optional_params=None):
+        return await self.backend.wolfram_simple(query, units, lat_lon, optional_params)
+
+    @cached_response("wolfram")
+    async def full_results(self, query, units="metric", lat_lon=None, optional_params=None):
+        """Wrapper for the WolframAlpha Full Results v2 API.
+            https://products.wolframalpha.com/api/documentation/
+            Pods of interest
+            - Input interpretation - Wolfram's determination of what is being asked about.
+            - Name - primary name of
+            """
+        return await self.backend.wolfram_full_results(query, units, lat_lon, optional_params)
+
+
+class AsyncOpenWeatherMapApi(AsyncBaseApi):
+    """Use Open Weather Map's One Call API to retrieve weather information"""
+
+    def __init__(self, url=None, version="v1", identity_file=None, backend_type=None, key=None):
+        super().__init__(url, version, identity_file, backend_type, credentials={"owm": key})
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["owm"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+        if self.backend_type == BackendType.OFFLINE and not self.backend.credentials["owm"]:
+            raise ValueError("OWM api key not set!")
+        if self.backend_type == BackendType.OFFLINE:
+            self.url = "https://api.openweathermap.org/data/2.5"
+        else:
+            self.url = f"{self.backend_url}/{self.backend_version}/owm"
+
+    def owm_language(self, lang: str):
+        """
+        OWM supports 31 languages, see https://openweathermap.org/current#multi
+
+        Convert Mycroft's language code to OpenWeatherMap's, if missing use english.
+
+        Args:
+            lang: The Mycroft language code.
+        """
+        return self.backend.owm_language(lang)
+
+    # cached across processes to save api calls, owm only updates data every 15mins or so
+    @geo_bucketed
+    @cached_response("owm")
+    async def get_weather(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        return await self.backend.owm_get_weather(lat_lon, lang, units)
+
+    @geo_bucketed
+    @cached_response("owm")
+    async def get_current(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        if get_weather_config()["aggregate"]:
+            return onecall_current(await self.get_weather(lat_lon, lang, units))
+        return await self.backend.owm_get_current(lat_lon, lang, units)
+
+    @geo_bucketed
+    @cached_response("owm")
+    async def get_hourly(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        if get_weather_config()["aggregate"]:
+            return onecall_hourly(await self.get_weather(lat_lon, lang, units))
+        return await self.backend.owm_get_hourly(lat_lon, lang, units)
+
+    @geo_bucketed
+    @cached_response("owm")
+    async def get_daily(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        if get_weather_config()["aggregate"]:
+            return onecall_daily(await self.get_weather(lat_lon, lang, units))
+        return await self.backend.owm_get_daily(lat_lon, lang, units)
+
+
+class AsyncEmailApi(AsyncBaseApi):
+    """Web API wrapper for sending email"""
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["email"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+        if self.backend_type == BackendType.OFFLINE:
+            self.url = self.credentials["smtp"]["host"]
+        else:
+            self.url = self.backend_url
+
+    async def send_email(self, title, body, sender):
+        return await self.backend.email_send(title, body, sender)
+
+
+class AsyncDatasetApi(AsyncBaseApi):
+    """Web API wrapper for dataset collection"""
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["dataset"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+
+    async def upload_wake_word(self, audio, params, upload_url=None):
+        return await self.backend.dataset_upload_wake_word(audio, params, upload_url)
+
+    async def upload_stt_recording(self, audio, params, upload_url=None):
+        return await self.backend.dataset_upload_stt_recording(audio, params, upload_url)
+
+
+class AsyncMetricsApi(AsyncBaseApi):
+    """Web API wrapper for metrics collection"""
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["metrics"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+
+    async def report_metric(self, name, data):
+        return await self.backend.metrics_upload(name, data)
+
+
+class AsyncOAuthApi(AsyncBaseApi):
+    """Web API wrapper for oauth api"""
+
+    def validate_backend_type(self):
+        if not API_REGISTRY[self.backend_type]["oauth"]:
+            raise ValueError(f"{self.__class__.__name__} not available for {self.backend_type}")
+
+    async def refresh_oauth_token(self, dev_cred):
+        """
+            Refresh Oauth token for dev_credential dev_cred.
+
+            Argument:
+                dev_cred:   development credentials identifier
+
+            Returns:
+                json string containing token and additional information
+        """
+        return await self.backend.oauth_refresh_token(dev_cred)
+
+    async def get_oauth_token(self, dev_cred, auto_refresh=True):
+        """
+            Get Oauth token for dev_credential dev_cred.
+
+            Argument:
+                dev_cred:   development credentials identifier
+                auto_refresh: refresh expired tokens automatically
+
+            Returns:
+                json string containing token and additional information
+        """
+        return await self.backend.oauth_get_token(dev_cred, auto_refresh=auto_refresh)
@@ -3,6 +3,8 @@ from ovos_config.config import Configuration
 from ovos_backend_client.backends.base import BackendType
 from ovos_backend_client.backends.offline import OfflineBackend
 from ovos_backend_client.backends.personal import PersonalBackend
+from ovos_backend_client.backends.async_offline import AsyncOfflineBackend
+from ovos_backend_client.backends.async_personal import AsyncPersonalBackend
 
 API_REGISTRY = {
     BackendType.OFFLINE: {
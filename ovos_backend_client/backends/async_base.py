@@ -0,0 +1,229 @@
+import asyncio
+import json
+import queue
+from functools import partial
+from io import BytesIO, StringIO
+
+from ovos_config.config import Configuration
+from requests.exceptions import HTTPError
+
+from ovos_backend_client.backends.base import AbstractBackend
+from ovos_backend_client.session import get_async_session, get_session_config, aiohttp
+from ovos_backend_client.stt import make_hypothesis
+
+
+class AsyncResponse:
+    """ buffered http response, mirrors the subset of requests.Response used by the backends """
+
+    def __init__(self, url, status_code, headers=None, content=b""):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+async def run_sync(func, *args, **kwargs):
+    """ run a blocking callable in the default executor """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+
+
+_END = object()
+
+
+async def aiter_chunks(chunks):
+    """ iterate a sync or async iterable of audio chunks """
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+async def iterate_sync(gen_func, chunks, *args, **kwargs):
+    """ drive a blocking generator consuming chunks in the default executor
+
+    chunks (sync or async iterable) are handed to the generator through a queue as
+    they arrive, its results are yielded back to the event loop one at a time
+    """
+    loop = asyncio.get_running_loop()
+    q = queue.Queue()
+
+    async def pump():
+        try:
+            async for chunk in aiter_chunks(chunks):
+                q.put(chunk)
+        finally:
+            q.put(_END)
+
+    pump_task = asyncio.ensure_future(pump())
+    it = gen_func(iter(q.get, _END), *args, **kwargs)
+    try:
+        while True:
+            item = await loop.run_in_executor(None, next, it, _END)
+            if item is _END:
+                break
+            yield item
+        await pump_task  # surface errors of the chunk source
+    finally:
+        pump_task.cancel()
+        try:
+            it.close()
+        except ValueError:  # still running in the executor
+            pass
+
+
+class AsyncAbstractBackend(AbstractBackend):
+    """ asyncio mirror of AbstractBackend, http verbs are coroutines backed by pooled aiohttp sessions
+
+    identity, headers and the static helpers are shared with the sync backends
+    """
+
+    async def check_token(self):
+        if self.identity.is_expired():
+            await self.refresh_token()
+
+    async def refresh_token(self):
+        pass
+
+    @staticmethod
+    def _to_aiohttp_kwargs(kwargs):
+        """ translate requests style kwargs into their aiohttp equivalents """
+        if kwargs.get("params"):
+            # requests drops None values and stringifies everything else, aiohttp only accepts str
+            kwargs["params"] = {k: str(v) for k, v in kwargs["params"].items() if v is not None}
+        files = kwargs.pop("files", None)
+        if files:
+            form = aiohttp.FormData()
+            for name, fileobj in files.items():
+                form.add_field(name, fileobj.read(), filename=name)
+            kwargs["data"] = form
+        return kwargs
+
+    async def request(self, method, url=None, *args, **kwargs):
+        url = url or self.url
+        if not url.startswith("http"):
+            url = f"http://{url}"
+        headers = self.headers
+        if "headers" in kwargs:
+            headers.update(kwargs.pop("headers"))
+        if "files" in kwargs:
+            headers.pop("Content-Type", None)  # multipart boundary is set by aiohttp
+        await self.check_token()
+        kwargs = self._to_aiohttp_kwargs(kwargs)
+        timeout = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=15)
+        retries = get_session_config()["max_retries"]
+        session = get_async_session(url)
+        for attempt in range(retries + 1):
+            try:
+                async with session.request(method, url, headers=headers,
+                                           timeout=timeout, *args, **kwargs) as response:
+                    return AsyncResponse(str(response.url), response.status,
+                                         dict(response.headers), await response.read())
+            except aiohttp.ClientConnectionError:
+                if attempt >= retries:
+                    raise
+                await asyncio.sleep(0.3 * (2 ** attempt))
+
+    async def get(self, url=None, *args, **kwargs):
+        return await self.request("GET", url, *args, **kwargs)
+
+    async def post(self, url=None, *args, **kwargs):
+        return await self.request("POST", url, *args, **kwargs)
+
+    async def put(self, url=None, *args, **kwargs):
+        return await self.request("PUT", url, *args, **kwargs)
+
+    async def patch(self, url=None, *args, **kwargs):
+        return await self.request("PATCH", url, *args, **kwargs)
+
+    async def delete(self, url=None, *args, **kwargs):
+        return await self.request("DELETE", url, *args, **kwargs)
+
+    # STT Api
+    async def stt_stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        backends without a streaming transport buffer the chunks and call stt_get when they end
+
+        Args:
+            chunks (iterable|AsyncIterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        from speech_recognition import AudioData
+        audio = AudioData(b"".join([c async for c in aiter_chunks(chunks)]), sample_rate, sample_width)
+        yield make_hypothesis(await self.stt_get(audio, language, limit))
+
+    # Metrics API
+    async def metrics_upload_batch(self, metrics):
+        """ upload a list of (name, data) metrics at once """
+        return [await self.metrics_upload(name, data) for name, data in metrics]
+
+    @property
+    def metrics_buffer(self):
+        """ always None, the metrics buffer and the upload spool are sync-only
+
+        their flush threads call the sync upload methods, async backends send right away
+        """
+        return None
+
+    # Dataset API
+    def _spool_upload(self, name, post_func, byte_data, params, upload_url=None):
+        raise NotImplementedError("the upload spool is sync-only")
+
+    def _post_sample(self, byte_data, params, upload_url):
+        raise NotImplementedError("use the dataset_upload_* coroutines")
+
+    async def dataset_upload_wake_word(self, audio, params, upload_url=None):
+        """ upload wake word sample - url can be external to backend"""
+        if not isinstance(audio, bytes):
+            byte_data = audio.get_wav_data()
+        else:
+            byte_data = audio
+        upload_url = upload_url or Configuration().get("listener", {}).get("wake_word_upload", {}).get("url")
+        if upload_url:
+            # upload to arbitrary server
+            ww_files = {
+                'audio': BytesIO(byte_data),
+                'metadata': StringIO(json.dumps(params))
+            }
+            return await self.post(upload_url, files=ww_files)
+        return {}
+
+    async def dataset_upload_stt_recording(self, audio, params, upload_url=None):
+        """ upload stt sample - url can be external to backend"""
+        if not isinstance(audio, bytes):
+            byte_data = audio.get_wav_data()
+        else:
+            byte_data = audio
+        upload_url = upload_url or Configuration().get("listener", {}).get("utterance_upload", {}).get("url")
+        if upload_url:
+            # upload to arbitrary server
+            ww_files = {
+                'audio': BytesIO(byte_data),
+                'metadata': StringIO(json.dumps(params))
+            }
+            return await self.post(upload_url, files=ww_files)
+        return {}
@@ -0,0 +1,475 @@
+import time
+
+from oauthlib.oauth2 import WebApplicationClient
+from ovos_config.config import Configuration
+from ovos_utils.log import LOG
+from ovos_utils.network_utils import get_external_ip
+
+from ovos_backend_client.backends.async_base import AsyncAbstractBackend, iterate_sync, run_sync
+from ovos_backend_client.backends.base import BackendType
+from ovos_backend_client.backends.offline import OfflineBackend
+from ovos_backend_client.cache import cached_response
+from ovos_backend_client.database import get_oauth_app_database, get_oauth_token_database
+from ovos_backend_client.geocoding import get_forward_geocoder, get_reverse_geocoder
+from ovos_backend_client.session import get_async_session, aiohttp
+from ovos_backend_client.stt import get_stt_pool
+from ovos_backend_client.weather import get_weather_config, \
+    onecall_current, onecall_hourly, onecall_daily
+
+
+class AsyncOfflineBackend(AsyncAbstractBackend, OfflineBackend):
+    """ asyncio mirror of OfflineBackend
+
+    network bound methods are coroutines, methods that only touch local files
+    are inherited unchanged from OfflineBackend
+    """
+
+    # OWM API - responses are cached by the AsyncOpenWeatherMapApi wrappers
+    async def _owm_get(self, url, lat_lon=None, lang="en-us", units="metric"):
+        # default to configured location
+        lat, lon = lat_lon or self._get_lat_lon()
+        params = {
+            "lang": lang,
+            "units": units,
+            "lat": lat, "lon": lon,
+            "appid": self.credentials["owm"]
+        }
+        response = await self.get(url, params=params)
+        return response.json()
+
+    async def owm_get_weather(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        return await self._owm_get("https://api.openweathermap.org/data/2.5/onecall",
+                                   lat_lon, lang, units)
+
+    async def owm_get_current(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        if get_weather_config()["aggregate"]:
+            return onecall_current(await self.owm_get_weather(lat_lon, lang, units))
+        return await self._owm_get("https://api.openweathermap.org/data/2.5/weather",
+                                   lat_lon, lang, units)
+
+    async def owm_get_hourly(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        if get_weather_config()["aggregate"]:
+            return onecall_hourly(await self.owm_get_weather(lat_lon, lang, units))
+        return await self._owm_get("https://api.openweathermap.org/data/2.5/forecast",
+                                   lat_lon, lang, units)
+
+    async def owm_get_daily(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        if get_weather_config()["aggregate"]:
+            return onecall_daily(await self.owm_get_weather(lat_lon, lang, units))
+        return await self._owm_get("https://api.openweathermap.org/data/2.5/forecast/daily",
+                                   lat_lon, lang, units)
+
+    # Wolfram Alpha Api - responses are cached by the AsyncWolframAlphaApi wrappers
+    async def wolfram_spoken(self, query, units="metric", lat_lon=None, optional_params=None):
+        optional_params = optional_params or {}
+        if not lat_lon:
+            lat_lon = self._get_lat_lon(**optional_params)
+        params = {'i': query,
+                  "geolocation": "{},{}".format(*lat_lon),
+                  'units': units,
+                  **optional_params}
+        url = 'https://api.wolframalpha.com/v1/spoken'
+        params["appid"] = self.credentials["wolfram"]
+        return (await self.get(url, params=params)).text
+
+    async def wolfram_simple(self, query, units="metric", lat_lon=None, optional_params=None):
+        optional_params = optional_params or {}
+        if not lat_lon:
+            lat_lon = self._get_lat_lon(**optional_params)
+        params = {'i': query,
+                  "geolocation": "{},{}".format(*lat_lon),
+                  'units': units,
+                  **optional_params}
+        url = 'https://api.wolframalpha.com/v1/simple'
+        params["appid"] = self.credentials["wolfram"]
+        return (await self.get(url, params=params)).text
+
+    async def wolfram_full_results(self, query, units="metric", lat_lon=None, optional_params=None):
+        """Wrapper for the WolframAlpha Full Results v2 API.
+        https://products.wolframalpha.com/api/documentation/
+        Pods of interest
+        - Input interpretation - Wolfram's determination of what is being asked about.
+        - Name - primary name of
+        """
+        optional_params = optional_params or {}
+        if not lat_lon:
+            lat_lon = self._get_lat_lon(**optional_params)
+        params = {'input': query,
+                  "units": units,
+                  "mode": "Default",
+                  "format": "image,plaintext",
+                  "geolocation": "{},{}".format(*lat_lon),
+                  "output": "json",
+                  **optional_params}
+        url = 'https://api.wolframalpha.com/v2/query'
+        params["appid"] = self.credentials["wolfram"]
+        data = await self.get(url, params=params)
+        return data.json()
+
+    # Geolocation Api
+    @cached_response("geolocation")
+    async def geolocation_get(self, location):
+        """Call the geolocation endpoint.
+
+        Args:
+            location (str): the location to lookup (e.g. Kansas City Missouri)
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        geocoder = get_forward_geocoder()
+        if geocoder:  # local gazetteer configured, only query nominatim on a miss
+            data = geocoder.geocode(location)
+            if data:
+                return data
+        url = "https://nominatim.openstreetmap.org/search"
+
+        data = (await self.get(url, params={"q": location, "format": "json", "limit": 1},
+                               headers={"User-Agent": "OVOS/1.0"})).json()[0]
+        lat = data.get("lat")
+        lon = data.get("lon")
+
+        if lat and lon:
+            return await self.reverse_geolocation_get(lat, lon)
+
+        url = "https://nominatim.openstreetmap.org/details.php"
+        details = (await self.get(url, params={"osmid": data['osm_id'],
+                                               "osmtype": data['osm_type'][0].upper(),
+                                               "format": "json"},
+                                  headers={"User-Agent": "OVOS/1.0"})).json()
+
+        # if no addresstags are present for the location an empty list is sent instead of a dict
+        tags = details.get("addresstags") or {}
+
+        place_type = details["extratags"].get("linked_place") or details.get("category") or data.get(
+            "type") or data.get("class")
+        name = details["localname"] or details["names"].get("name") or details["names"].get("official_name") or data[
+            "display_name"]
+        cc = details["country_code"] or tags.get("country") or details["extratags"].get('ISO3166-1:alpha2') or ""
+        location = {
+            "address": data["display_name"],
+            "city": {
+                "code": tags.get("postcode") or
+                        details["calculated_postcode"] or "",
+                "name": name if place_type == "city" else "",
+                "state": {
+                    "code": tags.get("state_code") or
+                            details["calculated_postcode"] or "",
+                    "name": name if place_type == "state" else tags.get("state"),
+                    "country": {
+                        "code": cc.upper(),
+                        "name": name if place_type == "country" else ""
+                    }
+                }
+            },
+            "coordinate": {
+                "latitude": lat,
+                "longitude": lon
+            }
+        }
+        if "timezone" not in location:
+            location["timezone"] = self._get_timezone(lon=lon, lat=lat)
+        return location
+
+    @cached_response("geolocation")
+    async def reverse_geolocation_get(self, lat, lon):
+        """Call the reverse geolocation endpoint.
+
+        Args:
+            lat (float): latitude
+            lon (float): longitude
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        geocoder = get_reverse_geocoder()
+        if geocoder:  # local gazetteer configured, no network needed
+            location = geocoder.reverse(lat, lon)
+            if location:
+                return location
+        url = "https://nominatim.openstreetmap.org/reverse"
+        details = (await self.get(url, params={"lat": lat, "lon": lon, "format": "json"},
+                                  headers={"User-Agent": "OVOS/1.0"})).json()
+        address = details.get("address")
+        location = {
+            "address": details["display_name"],
+            "city": {
+                "code": address.get("postcode") or "",
+                "name": address.get("city") or
+                        address.get("village") or
+                        address.get("town") or
+                        address.get("hamlet") or
+                        address.get("county") or "",
+                "state": {
+                    "code": address.get("state_code") or
+                            address.get("ISO3166-2-lvl4") or
+                            address.get("ISO3166-2-lvl6")
+                            or "",
+                    "name": address.get("state") or
+                            address.get("county")
+                            or "",
+                    "country": {
+                        "code": address.get("country_code", "").upper() or "",
+                        "name": address.get("country") or "",
+                    }
+                }
+            },
+            "coordinate": {
+                "latitude": details.get("lat") or lat,
+                "longitude": details.get("lon") or lon
+            }
+        }
+        if "timezone" not in location:
+            location["timezone"] = self._get_timezone(
+                lat=details.get("lat") or lat,
+                lon=details.get("lon") or lon)
+        return location
+
+    @cached_response("geolocation")
+    async def ip_geolocation_get(self, ip):
+        """Call the geolocation endpoint.
+
+        Args:
+            ip (str): the ip address to lookup
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        if not ip or ip in ["0.0.0.0", "127.0.0.1"]:
+            ip = await run_sync(get_external_ip)
+        fields = "status,country,countryCode,region,regionName,city,lat,lon,timezone,query"
+        data = (await self.get("http://ip-api.com/json/" + ip, params={"fields": fields})).json()
+        region_data = {"code": data["region"],
+                       "name": data["regionName"],
+                       "country": {
+                           "code": data["countryCode"],
+                           "name": data["country"]}}
+        city_data = {"code": data["city"],
+                     "name": data["city"],
+                     "state": region_data}
+        timezone_data = {"code": data["timezone"],
+                         "name": data["timezone"]}
+        coordinate_data = {"latitude": float(data["lat"]),
+                           "longitude": float(data["lon"])}
+        return {"city": city_data,
+                "coordinate": coordinate_data,
+                "timezone": timezone_data}
+
+    # Device Api
+    async def device_get(self):
+        """ Retrieve all device information from the json db"""
+        return OfflineBackend.device_get(self)
+
+    async def device_get_settings(self):
+        """ Retrieve device settings information from the json db
+
+        Returns:
+            str: JSON string with user configuration information.
+        """
+        return OfflineBackend.device_get_settings(self)
+
+    async def device_get_code(self, state=None):
+        return OfflineBackend.device_get_code(self, state)
+
+    async def device_activate(self, state, token,
+                              core_version="unknown",
+                              platform="unknown",
+                              platform_build="unknown",
+                              enclosure_version="unknown"):
+        return OfflineBackend.device_activate(self, state, token, core_version,
+                                              platform, platform_build, enclosure_version)
+
+    async def device_update_version(self,
+                                    core_version="unknown",
+                                    platform="unknown",
+                                    platform_build="unknown",
+                                    enclosure_version="unknown"):
+        pass  # irrelevant info
+
+    async def device_get_location(self):
+        """ Retrieve device location information from Configuration
+
+        Returns:
+            str: JSON string with user location.
+        """
+        return OfflineBackend.device_get_location(self)
+
+    async def device_upload_skills_data(self, data):
+        pass
+
+    async def device_upload_skill_metadata(self, settings_meta):
+        return await run_sync(OfflineBackend.device_upload_skill_metadata, self, settings_meta)
+
+    # Metrics API
+    async def metrics_upload(self, name, data):
+        """ upload metrics"""
+        return await run_sync(self.db_post_metric, name, data)
+
+    # Dataset API
+    async def dataset_upload_wake_word(self, audio, params, upload_url=None):
+        """ upload wake word sample - url can be external to backend"""
+        if not isinstance(audio, bytes):
+            byte_data = audio.get_wav_data()
+        else:
+            byte_data = audio
+        if Configuration().get("listener", {}).get('record_wake_words'):
+            await run_sync(self.db_post_ww_recording, byte_data, params["name"], params)
+        return await super().dataset_upload_wake_word(audio, params, upload_url)
+
+    async def dataset_upload_stt_recording(self, audio, params, upload_url=None):
+        """ upload stt sample - url can be external to backend"""
+        if not isinstance(audio, bytes):
+            byte_data = audio.get_wav_data()
+        else:
+            byte_data = audio
+        if Configuration().get("listener", {}).get('record_utterances'):
+            await run_sync(self.db_post_stt_recording, byte_data, params["transcription"], params)
+        return await super().dataset_upload_stt_recording(audio, params, upload_url)
+
+    # Email API
+    async def email_send(self, title, body, sender):
+        """ will raise KeyError if SMTP not configured in mycroft.conf"""
+        return await run_sync(OfflineBackend.email_send, self, title, body, sender)
+
+    # OAuth API
+    async def oauth_refresh_token(self, dev_cred):
+        """
+            Refresh Oauth token for dev_credential dev_cred.
+
+            Argument:
+                dev_cred:   development credentials identifier
+
+            Returns:
+                json string containing token and additional information
+        """
+        # Load all needed data for refresh
+        with get_oauth_app_database() as db:
+            app_data = db.get(dev_cred)
+        with get_oauth_token_database() as db:
+            token_data = db.get(dev_cred)
+
+        if (app_data is None or
+                token_data is None or 'refresh_token' not in token_data):
+            LOG.warning("Token data doesn't contain a refresh token and "
+                        "cannot be refreshed.")
+            return
+
+        refresh_token = token_data["refresh_token"]
+        token_endpoint = app_data["token_endpoint"]
+        client_id = app_data["client_id"]
+        client_secret = app_data["client_secret"]
+
+        # Perform refresh
+        client = WebApplicationClient(client_id, refresh_token=refresh_token)
+        uri, headers, body = client.prepare_refresh_token_request(token_endpoint)
+        async with get_async_session(uri).post(uri, headers=headers, data=body,
+                                               auth=aiohttp.BasicAuth(client_id, client_secret)) as refresh_result:
+            ok = refresh_result.status < 400
+            new_token_data = await refresh_result.json(content_type=None) if ok else {}
+
+        if ok:
+            # Make sure 'expires_at' entry exists in token
+            if 'expires_at' not in new_token_data:
+                new_token_data['expires_at'] = time.time() + token_data['expires_in']
+            # Store token
+            with get_oauth_token_database() as db:
+                token_data.update(new_token_data)
+                db.update_token(dev_cred, token_data)
+
+        return token_data
+
+    async def oauth_get_token(self, dev_cred, auto_refresh=True):
+        """
+            Get Oauth token for dev_credential dev_cred.
+
+            Argument:
+                dev_cred:   development credentials identifier
+                auto_refresh: refresh expired tokens automatically
+
+            Returns:
+                json string containing token and additional information
+        """
+        if auto_refresh:
+            expired = False
+            with get_oauth_token_database() as db:
+                token_data = db.get(dev_cred)
+            if "expires_at" not in token_data:
+                expired = True
+            elif token_data["expires_at"] <= time.time():
+                expired = True
+            if expired:
+                return await self.oauth_refresh_token(dev_cred)
+        return self.db_get_oauth_token(dev_cred)
+
+    # STT Api
+    async def stt_get(self, audio, language="en-us", limit=1):
+        """ Web API wrapper for performing Speech to Text (STT)
+
+        the STT plugin runs locally, inference is moved to the default executor
+
+        Args:
+            audio (bytes): The recorded audio, as in a FLAC file
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+        """
+        return await run_sync(OfflineBackend.stt_get, self, audio, language, limit)
+
+    async def stt_stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        the STT plugin is fed from the default executor as chunks arrive,
+        streaming capable plugins report partial transcriptions
+
+        Args:
+            chunks (iterable|AsyncIterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        if self._stt is not None:
+            # assigned engines are not managed by the pool, the buffered audio goes through stt_get
+            async for hypothesis in AsyncAbstractBackend.stt_stream(self, chunks, language, limit,
+                                                                    sample_rate, sample_width):
+                yield hypothesis
+            return
+        async for hypothesis in iterate_sync(get_stt_pool().stream, chunks, language,
+                                             self.stt_config, sample_rate, sample_width):
+            yield hypothesis
+
+
+class AsyncAbstractPartialBackend(AsyncOfflineBackend):
+    """ helper class that internally delegates unimplemented methods to async offline backend implementation
+    backends that only provide microservices and no DeviceApi should subclass from here
+    """
+
+    def __init__(self, url=None, version="v1", identity_file=None, backend_type=BackendType.OFFLINE, credentials=None):
+        super().__init__(url, version, identity_file, credentials)
+        self.backend_type = backend_type
@@ -0,0 +1,394 @@
+import json
+import time
+from io import BytesIO, StringIO
+
+from ovos_config.config import Configuration
+from ovos_utils.log import LOG
+from requests.exceptions import HTTPError
+
+from ovos_backend_client.backends.async_base import AsyncAbstractBackend, aiter_chunks, run_sync
+from ovos_backend_client.backends.async_offline import AsyncAbstractPartialBackend, BackendType
+from ovos_backend_client.backends.personal import get_token_refresher
+from ovos_backend_client.session import get_async_session, aiohttp
+from ovos_backend_client.stt import encode_audio, make_hypothesis
+
+
+class AsyncPersonalBackend(AsyncAbstractPartialBackend):
+    """ asyncio mirror of PersonalBackend """
+
+    def __init__(self, url="http://0.0.0.0:6712", version="v1", identity_file=None, credentials=None):
+        super().__init__(url, version, identity_file, BackendType.PERSONAL, credentials)
+        self.token_refresher = get_token_refresher(self.url, self.backend_version)
+
+    async def check_token(self):
+        # refreshes happen in the background ahead of expiration,
+        # this only awaits if the token is already expired
+        if self.identity.is_expired():
+            await self.refresh_token()
+        else:
+            self.token_refresher.schedule()
+
+    async def refresh_token(self):
+        # shares the single-flight refresher with the sync backend
+        await run_sync(self.token_refresher.refresh)
+
+    # OWM Api
+    async def _owm_get(self, endpoint, lat_lon=None, lang="en-us", units="metric"):
+        # default to configured location
+        lat, lon = lat_lon or self._get_lat_lon()
+        response = await self.get(url=f"{self.backend_url}/{self.backend_version}/owm/{endpoint}",
+                                  params={
+                                      "lang": self.owm_language(lang),
+                                      "lat": lat,
+                                      "lon": lon,
+                                      "units": units})
+        return response.json()
+
+    async def owm_get_weather(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        return await self._owm_get("onecall", lat_lon, lang, units)
+
+    async def owm_get_current(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        return await self._owm_get("weather", lat_lon, lang, units)
+
+    async def owm_get_hourly(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        return await self._owm_get("forecast", lat_lon, lang, units)
+
+    async def owm_get_daily(self, lat_lon=None, lang="en-us", units="metric"):
+        """Issue an API call and map the return value into a weather report
+
+        Args:
+            units (str): metric or imperial measurement units
+            lat_lon (tuple): the geologic (latitude, longitude) of the weather location
+        """
+        return await self._owm_get("forecast/daily", lat_lon, lang, units)
+
+    # Wolfram Alpha API
+    async def wolfram_spoken(self, query, units="metric", lat_lon=None, optional_params=None):
+        optional_params = optional_params or {}
+        if not lat_lon:
+            lat_lon = self._get_lat_lon(**optional_params)
+        params = {'i': query,
+                  "geolocation": "{},{}".format(*lat_lon),
+                  'units': units,
+                  **optional_params}
+        url = f"{self.backend_url}/{self.backend_version}/wolframAlphaSpoken"
+        data = await self.get(url=url, params=params)
+        return data.text
+
+    async def wolfram_simple(self, query, units="metric", lat_lon=None, optional_params=None):
+        optional_params = optional_params or {}
+        if not lat_lon:
+            lat_lon = self._get_lat_lon(**optional_params)
+        params = {'i': query,
+                  "geolocation": "{},{}".format(*lat_lon),
+                  'units': units,
+                  **optional_params}
+        url = f"{self.backend_url}/{self.backend_version}/wolframAlphaSimple"
+        data = await self.get(url=url, params=params)
+        return data.text
+
+    async def wolfram_full_results(self, query, units="metric", lat_lon=None, optional_params=None):
+        """Wrapper for the WolframAlpha Full Results v2 API.
+        https://products.wolframalpha.com/api/documentation/
+        Pods of interest
+        - Input interpretation - Wolfram's determination of what is being asked about.
+        - Name - primary name of
+        """
+        optional_params = optional_params or {}
+        if not lat_lon:
+            lat_lon = self._get_lat_lon(**optional_params)
+        params = {'input': query,
+                  "units": units,
+                  "mode": "Default",
+                  "format": "image,plaintext",
+                  "geolocation": "{},{}".format(*lat_lon),
+                  "output": "json",
+                  **optional_params}
+        url = f"{self.backend_url}/{self.backend_version}/wolframAlphaFull"
+        data = await self.get(url=url, params=params)
+        return data.json()
+
+    # Geolocation Api
+    async def geolocation_get(self, location):
+        """Call the geolocation endpoint.
+
+        Args:
+            location (str): the location to lookup (e.g. Kansas City Missouri)
+
+        Returns:
+            str: JSON structure with lookup results
+        """
+        url = f"{self.backend_url}/{self.backend_version}/geolocation"
+        location = (await self.get(url, params={"location": location})).json()['data']
+        if "timezone" not in location:
+            location["timezone"] = self._get_timezone(
+                lon=location["coordinate"]["longitude"],
+                lat=location["coordinate"]["latitude"])
+        return location
+
+    # STT Api
+    async def stt_get(self, audio, language="en-us", limit=1):
+        """ Web API wrapper for performing Speech to Text (STT)
+
+        Args:
+            audio (bytes|AudioData): The recorded audio, FLAC, WAV or AudioData,
+                                     WAV/AudioData is downsampled and compressed before upload
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+
+        Returns:
+            dict: JSON structure with transcription results
+        """
+        audio, content_type = await run_sync(encode_audio, audio)
+        data = await self.post(url=f"{self.backend_url}/{self.backend_version}/stt",
+                               data=audio, params={"lang": language, "limit": limit},
+                               headers={"Content-Type": content_type})
+        if data.status_code == 200:
+            return data.json()
+        raise RuntimeError(f"STT api failed, status_code {data.status_code}")
+
+    async def stt_stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        chunks are uploaded with chunked transfer encoding as they arrive and the server
+        answers with one json hypothesis per line, read while the upload is still going.
+        servers without a streaming endpoint get the whole utterance through stt_get
+
+        Args:
+            chunks (iterable|AsyncIterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        url = f"{self.backend_url}/{self.backend_version}/stt/stream"
+        if not url.startswith("http"):
+            url = f"http://{url}"
+        headers = self.headers
+        headers["Content-Type"] = f"audio/L{sample_width * 8}; rate={sample_rate}"
+        await self.check_token()
+        source = aiter_chunks(chunks)
+        sent = []
+
+        async def body():
+            async for chunk in source:
+                sent.append(chunk)
+                yield chunk
+
+        timeout = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=15)
+        async with get_async_session(url).post(url, data=body(), headers=headers, timeout=timeout,
+                                               params={"lang": language, "limit": str(limit)}) as response:
+            if response.status not in (404, 405, 501):
+                if response.status != 200:
+                    raise RuntimeError(f"STT api failed, status_code {response.status}")
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        hypothesis = json.loads(line)
+                        if not isinstance(hypothesis, dict):
+                            hypothesis = make_hypothesis(hypothesis)
+                        yield hypothesis
+                return
+
+        LOG.debug("STT streaming not supported by server, sending whole utterance")
+        sent += [chunk async for chunk in source]
+        # buffered stt_get, not the local plugin of the offline parent
+        async for hypothesis in AsyncAbstractBackend.stt_stream(self, sent, language, limit,
+                                                                sample_rate, sample_width):
+            yield hypothesis
+
+    # Device Api
+    async def device_get(self):
+        """ Retrieve all device information from the web backend """
+        return (await self.get(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}")).json()
+
+    async def device_get_settings(self):
+        """ Retrieve device settings information from the web backend
+
+        Returns:
+            str: JSON string with user configuration information.
+        """
+        return (await self.get(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/setting")).json()
+
+    async def device_get_code(self, state=None):
+        state = state or self.uuid
+        return (await self.get(f"{self.backend_url}/{self.backend_version}/device/code",
+                               params={"state": state})).json()
+
+    async def device_activate(self, state, token,
+                              core_version="unknown",
+                              platform="unknown",
+                              platform_build="unknown",
+                              enclosure_version="unknown"):
+        data = {"state": state,
+                "token": token,
+                "coreVersion": core_version,
+                "platform": platform,
+                "platform_build": platform_build,
+                "enclosureVersion": enclosure_version}
+        r = await self.post(f"{self.backend_url}/{self.backend_version}/device/activate", json=data)
+        try:
+            return r.json()
+        except:
+            # raise expected exception handled by pairing manager, any other resets pairing process
+            raise HTTPError(f"Device activation failed! {r.status_code}")
+
+    async def device_update_version(self,
+                                    core_version="unknown",
+                                    platform="unknown",
+                                    platform_build="unknown",
+                                    enclosure_version="unknown"):
+        data = {"coreVersion": core_version,
+                "platform": platform,
+                "platform_build": platform_build,
+                "enclosureVersion": enclosure_version}
+        return await self.patch(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}", json=data)
+
+    async def device_report_metric(self, name, data):
+        return await self.post(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/metric/" + name,
+                               json=data)
+
+    async def device_get_location(self):
+        """ Retrieve device location information from the web backend
+
+        Returns:
+            str: JSON string with user location.
+        """
+        return (await self.get(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/location")).json()
+
+    async def device_send_email(self, title, body, sender):
+        return (await self.put(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/message",
+                               json={"title": title, "body": body, "sender": sender})).json()
+
+    async def device_upload_skill_metadata(self, settings_meta):
+        """Upload skill metadata.
+
+        Args:
+            settings_meta (dict): skill info and settings in JSON format
+        """
+        return await self.put(url=f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/settingsMeta",
+                              json=settings_meta)
+
+    async def device_upload_skills_data(self, data):
+        """ Upload skills.json file. This file contains a manifest of installed
+        and failed installations for use with the Marketplace.
+
+        Args:
+             data: dictionary with skills data from msm
+        """
+        return await self.put(url=f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/skillJson",
+                              json=data)
+
+    async def device_upload_wake_word_v1(self, audio, params, upload_url=None):
+        """ upload precise wake word V1 endpoint - url can be external to backend"""
+        if not upload_url:
+            config = Configuration().get("listener", {}).get("wake_word_upload", {})
+            upload_url = config.get("url") or f"{self.backend_url}/precise/upload"
+        if not isinstance(audio, bytes):
+            byte_data = audio.get_wav_data()
+        else:
+            byte_data = audio
+
+        ww_files = {
+            'audio': BytesIO(byte_data),
+            'metadata': StringIO(json.dumps(params))
+        }
+        return await self.post(upload_url, files=ww_files)
+
+    async def device_upload_wake_word(self, audio, params):
+        """ upload precise wake word V2 endpoint - integrated with device api"""
+        url = f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/wake-word-file"
+        request_data = dict(
+            wake_word=params['name'],
+            engine=params.get('engine_name') or params.get('engine'),
+            timestamp=params.get('timestamp') or params.get('time') or str(int(1000 * time.time())),
+            model=params['model']
+        )
+        ww_files = {
+            'audio': BytesIO(audio.get_wav_data()),
+            'metadata': StringIO(json.dumps(request_data))
+        }
+        return await self.post(url, files=ww_files)
+
+    # Metrics API
+    async def metrics_upload(self, name, data):
+        """ upload metrics"""
+        return await self.device_report_metric(name, data)
+
+    async def metrics_upload_batch(self, metrics):
+        """ upload a list of (name, data) metrics in a single request
+
+        servers without the batch endpoint get one request per metric
+        """
+        response = await self.post(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/metrics",
+                                   json=[{"name": name, "data": data} for name, data in metrics])
+        if response.status_code in (404, 405, 501):
+            for name, data in metrics:
+                (await self.device_report_metric(name, data)).raise_for_status()
+            return
+        response.raise_for_status()
+
+    # Dataset API
+    async def dataset_upload_wake_word(self, audio, params, upload_url=None):
+        """ upload wake word sample - url can be external to backend"""
+        if upload_url:  # explicit upload endpoint requested
+            return await self.device_upload_wake_word_v1(audio, params, upload_url)
+        return await self.device_upload_wake_word(audio, params)
+
+    async def dataset_upload_stt_recording(self, audio, params, upload_url=None):
+        """ upload stt sample - url can be external to backend"""
+        if upload_url:
+            return await super().dataset_upload_stt_recording(audio, params, upload_url)
+        raise NotImplementedError()  # TODO - add to backend, currently needs external url
+
+    # OAuth API
+    async def oauth_refresh_token(self, dev_cred):
+        """
+            Refresh Oauth token for dev_credential dev_cred.
+
+            Argument:
+                dev_cred:   development credentials identifier
+
+            Returns:
+                json string containing token and additional information
+        """
+        return await self.oauth_get_token(dev_cred, auto_refresh=True)
+
+    async def oauth_get_token(self, dev_cred, auto_refresh=True):
+        """
+            Get Oauth token for dev_credential dev_cred.
+
+            Argument:
+                dev_cred:   development credentials identifier
+                auto_refresh: refresh expired tokens automatically
+
+            Returns:
+                json string containing token and additional information
+        """
+        return (await self.get(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/token/{dev_cred}",
+                               params={"refresh": auto_refresh})).json()
+
+    # Email API
+    async def email_send(self, title, body, sender):
+        return await self.device_send_email(title, body, sender)
@@ -2,17 +2,17 @@ import abc
 import json
 from enum import Enum
 from io import BytesIO, StringIO
+from itertools import islice
 
-import requests
-from ovos_backend_client.database import SkillSettingsModel
+from ovos_backend_client.database import SkillSettingsModel, match_record
 from ovos_backend_client.identity import IdentityManager
+from ovos_backend_client.metrics import get_metrics_buffer
+from ovos_backend_client.session import get_session
+from ovos_backend_client.spool import check_upload, get_upload_spool
+from ovos_backend_client.stt import make_hypothesis
+from ovos_backend_client.timezones import get_timezone_resolver
 from ovos_config.config import Configuration
 
-try:
-    from timezonefinder import TimezoneFinder
-except ImportError:
-    TimezoneFinder = None
-
 
 class BackendType(str, Enum):
     OFFLINE = "offline"
@@ -49,9 +49,10 @@ class AbstractBackend:
 
     @property
     def headers(self):
-        return {"Device": self.uuid,
+        identity = self.identity
+        return {"Device": identity.uuid,
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.access_token}"}
+                "Authorization": f"Bearer {identity.access}"}
 
     def check_token(self):
         if self.identity.is_expired():
@@ -68,7 +69,7 @@ class AbstractBackend:
         if "headers" in kwargs:
             headers.update(kwargs.pop("headers"))
         self.check_token()
-        return requests.get(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
+        return get_session(url).get(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
 
     def post(self, url=None, *args, **kwargs):
         url = url or self.url
@@ -78,7 +79,7 @@ class AbstractBackend:
         if "headers" in kwargs:
             headers.update(kwargs.pop("headers"))
         self.check_token()
-        return requests.post(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
+        return get_session(url).post(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
 
     def put(self, url=None, *args, **kwargs):
         url = url or self.url
@@ -88,7 +89,7 @@ class AbstractBackend:
         if "headers" in kwargs:
             headers.update(kwargs.pop("headers"))
         self.check_token()
-        return requests.put(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
+        return get_session(url).put(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
 
     def patch(self, url=None, *args, **kwargs):
         url = url or self.url
@@ -98,7 +99,7 @@ class AbstractBackend:
         if "headers" in kwargs:
             headers.update(kwargs.pop("headers"))
         self.check_token()
-        return requests.patch(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
+        return get_session(url).patch(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
 
     def delete(self, url=None, *args, **kwargs):
         url = url or self.url
@@ -108,7 +109,7 @@ class AbstractBackend:
         if "headers" in kwargs:
             headers.update(kwargs.pop("headers"))
         self.check_token()
-        return requests.delete(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
+        return get_session(url).delete(url, headers=headers, timeout=(3.05, 15), *args, **kwargs)
 
     # OWM Api
     @staticmethod
@@ -210,16 +211,17 @@ class AbstractBackend:
     # Geolocation Api
     @staticmethod
     def _get_timezone(**kwargs):
-        if TimezoneFinder:
+        resolver = get_timezone_resolver()
+        if resolver.available:
             lat, lon = AbstractBackend._get_lat_lon(**kwargs)
-            tz = TimezoneFinder().timezone_at(lng=float(lon), lat=float(lat))
-            return {
-                "name": tz.replace("/", " "),
-                "code": tz
-            }
-        else:
-            cfg = Configuration().get("location", {}).get("timezone")
-            return cfg or {"name": "UTC", "code": "UTC"}
+            tz = resolver.timezone_at(lat=lat, lon=lon)
+            if tz:
+                return {
+                    "name": tz.replace("/", " "),
+                    "code": tz
+                }
+        cfg = Configuration().get("location", {}).get("timezone")
+        return cfg or {"name": "UTC", "code": "UTC"}
 
     @abc.abstractmethod
     def geolocation_get(self, location):
@@ -273,6 +275,25 @@ class AbstractBackend:
         """
         raise NotImplementedError()
 
+    def stt_stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        backends without a streaming transport buffer the chunks and call stt_get when they end
+
+        Args:
+            chunks (iterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        from speech_recognition import AudioData
+        audio = AudioData(b"".join(chunks), sample_rate, sample_width)
+        yield make_hypothesis(self.stt_get(audio, language, limit))
+
     # Device Api
     def device_get(self):
         """ Retrieve all device information from the web backend """
@@ -339,6 +360,18 @@ class AbstractBackend:
         """ upload metrics"""
         raise NotImplementedError()
 
+    def metrics_upload_batch(self, metrics):
+        """ upload a list of (name, data) metrics at once
+
+        backends buffering metrics_upload must override this to upload directly
+        """
+        return [self.metrics_upload(name, data) for name, data in metrics]
+
+    @property
+    def metrics_buffer(self):
+        """ MetricsBuffer flushed with metrics_upload_batch, None if disabled in mycroft.conf """
+        return get_metrics_buffer(f"{self.backend_type}|{self.url}", self.metrics_upload_batch)
+
     # OAuth API
     @abc.abstractmethod
     def oauth_refresh_token(self, dev_cred):
@@ -368,6 +401,27 @@ class AbstractBackend:
         raise NotImplementedError()
 
     # Dataset API
+    def _post_sample(self, byte_data, params, upload_url):
+        """ multipart upload of an audio sample and its metadata """
+        files = {
+            'audio': BytesIO(byte_data),
+            'metadata': StringIO(json.dumps(params))
+        }
+        return self.post(upload_url, files=files)
+
+    def _spool_upload(self, name, post_func, byte_data, params, upload_url=None):
+        """ hand a sample to the upload spool and return immediately
+
+        post_func(byte_data, params, upload_url) performs the actual upload, it is called
+        right away if the spool is disabled in mycroft.conf
+        """
+        spool = get_upload_spool()
+        if spool is None:
+            return post_func(byte_data, params, upload_url)
+        kind = f"{self.backend_type}|{self.url}|{name}"
+        spool.register(kind, lambda *args: check_upload(post_func(*args)))
+        return {"spooled": spool.enqueue(kind, byte_data, params, upload_url)}
+
     def dataset_upload_wake_word(self, audio, params, upload_url=None):
         """ upload wake word sample - url can be external to backend"""
         if not isinstance(audio, bytes):
@@ -377,11 +431,7 @@ class AbstractBackend:
         upload_url = upload_url or Configuration().get("listener", {}).get("wake_word_upload", {}).get("url")
         if upload_url:
             # upload to arbitrary server
-            ww_files = {
-                'audio': BytesIO(byte_data),
-                'metadata': StringIO(json.dumps(params))
-            }
-            return self.post(upload_url, files=ww_files)
+            return self._spool_upload("sample", self._post_sample, byte_data, params, upload_url)
         return {}
 
     def dataset_upload_stt_recording(self, audio, params, upload_url=None):
@@ -393,11 +443,7 @@ class AbstractBackend:
         upload_url = upload_url or Configuration().get("listener", {}).get("utterance_upload", {}).get("url")
         if upload_url:
             # upload to arbitrary server
-            ww_files = {
-                'audio': BytesIO(byte_data),
-                'metadata': StringIO(json.dumps(params))
-            }
-            return self.post(upload_url, files=ww_files)
+            return self._spool_upload("sample", self._post_sample, byte_data, params, upload_url)
         return {}
 
     # Email API
@@ -488,10 +534,28 @@ class AbstractBackend:
         raise NotImplementedError()
 
     # Database api
+    @staticmethod
+    def _iter_pages(list_func, page_size=100):
+        """ yield every entry of a paginated db_list_* method, one page request at a time
+
+        pages are requested by offset, entries deleted while iterating may cause later entries to be skipped
+        """
+        offset = 0
+        while True:
+            page = list_func(offset=offset, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
     @abc.abstractmethod
-    def db_list_devices(self):
+    def db_list_devices(self, offset=0, limit=None):
         raise NotImplementedError()
 
+    def iter_devices(self, page_size=100):
+        """ lazily iterate db_list_devices, page_size entries are held in memory at a time """
+        return self._iter_pages(self.db_list_devices, page_size)
+
     @abc.abstractmethod
     def db_get_device(self, uuid):
         raise NotImplementedError()
@@ -620,9 +684,13 @@ class AbstractBackend:
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def db_list_stt_recordings(self):
+    def db_list_stt_recordings(self, offset=0, limit=None):
         raise NotImplementedError()
 
+    def iter_stt_recordings(self, page_size=100):
+        """ lazily iterate db_list_stt_recordings, page_size entries are held in memory at a time """
+        return self._iter_pages(self.db_list_stt_recordings, page_size)
+
     @abc.abstractmethod
     def db_get_stt_recording(self, rec_id):
         raise NotImplementedError()
@@ -631,6 +699,11 @@ class AbstractBackend:
     def db_update_stt_recording(self, rec_id, transcription=None, metadata=None):
         raise NotImplementedError()
 
+    def db_update_stt_recordings(self, updates):
+        """ bulk update transcriptions, updates is a {rec_id: transcription} dict """
+        return [self.db_update_stt_recording(rec_id, transcription)
+                for rec_id, transcription in updates.items()]
+
     @abc.abstractmethod
     def db_delete_stt_recording(self, rec_id):
         raise NotImplementedError()
@@ -640,9 +713,20 @@ class AbstractBackend:
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def db_list_ww_recordings(self):
+    def db_list_ww_recordings(self, offset=0, limit=None):
         raise NotImplementedError()
 
+    def iter_ww_recordings(self, page_size=100):
+        """ lazily iterate db_list_ww_recordings, page_size entries are held in memory at a time """
+        return self._iter_pages(self.db_list_ww_recordings, page_size)
+
+    def db_query_ww_recordings(self, tag=None, speaker_type=None, uuid=None, since=None,
+                               offset=0, limit=None):
+        """ wake word recordings matching every given filter, since is a minimum unix timestamp """
+        matches = (r for r in self.iter_ww_recordings()
+                   if match_record(r, since, tag=tag, speaker_type=speaker_type, uuid=uuid))
+        return list(islice(matches, offset, None if limit is None else offset + limit))
+
     @abc.abstractmethod
     def db_get_ww_recording(self, rec_id):
         raise NotImplementedError()
@@ -660,9 +744,19 @@ class AbstractBackend:
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def db_list_metrics(self):
+    def db_list_metrics(self, offset=0, limit=None):
         raise NotImplementedError()
 
+    def iter_metrics(self, page_size=100):
+        """ lazily iterate db_list_metrics, page_size entries are held in memory at a time """
+        return self._iter_pages(self.db_list_metrics, page_size)
+
+    def db_query_metrics(self, metric_type=None, uuid=None, since=None, offset=0, limit=None):
+        """ metrics matching every given filter, since is a minimum unix timestamp """
+        matches = (m for m in self.iter_metrics()
+                   if match_record(m, since, metric_type=metric_type, uuid=uuid))
+        return list(islice(matches, offset, None if limit is None else offset + limit))
+
     @abc.abstractmethod
     def db_get_metric(self, metric_id):
         raise NotImplementedError()
@@ -3,23 +3,28 @@ import os
 import time
 from os import listdir, makedirs, remove
 from os.path import isfile, join
-from tempfile import NamedTemporaryFile
 from uuid import uuid4
 
-import requests
 from oauthlib.oauth2 import WebApplicationClient
 from ovos_config.config import Configuration, update_mycroft_config, get_xdg_config_save_path
 from ovos_config.locations import USER_CONFIG, get_xdg_data_save_path, xdg_data_home
-from ovos_utils import timed_lru_cache
 from ovos_utils.log import LOG
 from ovos_utils.network_utils import get_external_ip
 from ovos_utils.smtp_utils import send_smtp
 
 from ovos_backend_client.backends.base import AbstractBackend, BackendType
-from ovos_backend_client.database import JsonMetricDatabase, JsonWakeWordDatabase, \
-    SkillSettingsModel, OAuthTokenDatabase, OAuthApplicationDatabase, DeviceModel, JsonUtteranceDatabase
+from ovos_backend_client.blobs import release_recording, save_recording
+from ovos_backend_client.cache import cached_response
+from ovos_backend_client.database import get_metric_database, get_wakeword_database, \
+    SkillSettingsModel, DeviceModel, get_utterance_database, get_oauth_token_database, get_oauth_app_database
+from ovos_backend_client.definitions import get_definitions_catalog
+from ovos_backend_client.geocoding import get_forward_geocoder, get_reverse_geocoder
 from ovos_backend_client.identity import IdentityManager
+from ovos_backend_client.session import get_session
 from ovos_backend_client.settings import get_local_settings
+from ovos_backend_client.stt import decode_audio, get_stt_pool
+from ovos_backend_client.weather import get_weather_config, \
+    onecall_current, onecall_hourly, onecall_daily
 
 try:
     from ovos_plugin_manager.tts import get_voices, get_voice_id
@@ -38,22 +43,60 @@ except ImportError:
         return f"{plugin_name}_{lang}_{tts_hash}"
 
 
-    def get_voices():
-        return []
+    def get_voices(scan=False):
+        return {}
+
+
+    def get_wws(scan=False):
+        return {}
+
+
+def _load_ww_definitions():
+    ww_defs = {}
+    for ww_id, ww_cfg in get_wws().items():  # TODO scan=True once implemented
+        plugin, name, _ = ww_id.split("_", 3)
+        ww_defs[ww_id] = {
+            "ww_id": ww_id,
+            "name": ww_cfg.get("display_name") or name,
+            "lang": ww_cfg.get("stt_lang") or
+                    ww_cfg.get("lang") or
+                    Configuration().get("lang", "en-us"),
+            "plugin": ww_cfg.get("module") or plugin,
+            "ww_config": ww_cfg
+        }
+    return ww_defs
+
+
+def _load_voice_definitions():
+    return {voice_id: {
+        "voice_id": voice_id,
+        "lang": voice_data["meta"].get("lang"),
+        "plugin": voice_data["module"],
+        "tts_config": voice_data,
+        "offline": voice_data["meta"].get("offline"),
+        "gender": voice_data["meta"].get("gender"),
+    } for voice_id, voice_data in get_voices(scan=True).items()}
+
+
+def get_ww_catalog():
+    """ wake word definitions indexed by ww_id """
+    return get_definitions_catalog(f"{xdg_data_home()}/OPM/ww_configs", _load_ww_definitions)
 
 
-    def get_wws():
-        return []
+def get_voice_catalog():
+    """ voice definitions indexed by voice_id """
+    return get_definitions_catalog(f"{xdg_data_home()}/OPM/voice_configs", _load_voice_definitions)
 
 
 class OfflineBackend(AbstractBackend):
 
     def __init__(self, url="127.0.0.1", version="v1", identity_file=None, credentials=None):
         super().__init__(url, version, identity_file, BackendType.OFFLINE, credentials)
-        self.stt = None
+        self._stt = None  # engine assigned by the caller, used instead of the pool
+        self._stt_lang = None  # language of the last load_stt_plugin
+        self.stt_config = None  # None -> stt section of mycroft.conf
 
-    # OWM API
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
+    # OWM API - responses are cached by the OpenWeatherMapApi wrappers
     def owm_get_weather(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -74,7 +117,6 @@ class OfflineBackend(AbstractBackend):
         response = self.get(url, params=params)
         return response.json()
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
     def owm_get_current(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -82,6 +124,8 @@ class OfflineBackend(AbstractBackend):
             units (str): metric or imperial measurement units
             lat_lon (tuple): the geologic (latitude, longitude) of the weather location
         """
+        if get_weather_config()["aggregate"]:
+            return onecall_current(self.owm_get_weather(lat_lon, lang, units))
         # default to configured location
 
         lat, lon = lat_lon or self._get_lat_lon()
@@ -95,7 +139,6 @@ class OfflineBackend(AbstractBackend):
         response = self.get(url, params=params)
         return response.json()
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
     def owm_get_hourly(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -103,6 +146,8 @@ class OfflineBackend(AbstractBackend):
             units (str): metric or imperial measurement units
             lat_lon (tuple): the geologic (latitude, longitude) of the weather location
         """
+        if get_weather_config()["aggregate"]:
+            return onecall_hourly(self.owm_get_weather(lat_lon, lang, units))
         # default to configured location
 
         lat, lon = lat_lon or self._get_lat_lon()
@@ -116,7 +161,6 @@ class OfflineBackend(AbstractBackend):
         response = self.get(url, params=params)
         return response.json()
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
     def owm_get_daily(self, lat_lon=None, lang="en-us", units="metric"):
         """Issue an API call and map the return value into a weather report
 
@@ -124,6 +168,8 @@ class OfflineBackend(AbstractBackend):
             units (str): metric or imperial measurement units
             lat_lon (tuple): the geologic (latitude, longitude) of the weather location
         """
+        if get_weather_config()["aggregate"]:
+            return onecall_daily(self.owm_get_weather(lat_lon, lang, units))
         # default to configured location
 
         lat, lon = lat_lon or self._get_lat_lon()
@@ -137,8 +183,7 @@ class OfflineBackend(AbstractBackend):
         response = self.get(url, params=params)
         return response.json()
 
-    # Wolfram Alpha Api
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
+    # Wolfram Alpha Api - responses are cached by the WolframAlphaApi wrappers
     def wolfram_spoken(self, query, units="metric", lat_lon=None, optional_params=None):
         optional_params = optional_params or {}
         if not lat_lon:
@@ -151,7 +196,6 @@ class OfflineBackend(AbstractBackend):
         params["appid"] = self.credentials["wolfram"]
         return self.get(url, params=params).text
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
     def wolfram_simple(self, query, units="metric", lat_lon=None, optional_params=None):
         optional_params = optional_params or {}
         if not lat_lon:
@@ -164,7 +208,6 @@ class OfflineBackend(AbstractBackend):
         params["appid"] = self.credentials["wolfram"]
         return self.get(url, params=params).text
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
     def wolfram_full_results(self, query, units="metric", lat_lon=None, optional_params=None):
         """Wrapper for the WolframAlpha Full Results v2 API.
         https://products.wolframalpha.com/api/documentation/
@@ -188,7 +231,7 @@ class OfflineBackend(AbstractBackend):
         return data.json()
 
     # Geolocation Api
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
+    @cached_response("geolocation")
     def geolocation_get(self, location):
         """Call the geolocation endpoint.
 
@@ -198,6 +241,11 @@ class OfflineBackend(AbstractBackend):
         Returns:
             str: JSON structure with lookup results
         """
+        geocoder = get_forward_geocoder()
+        if geocoder:  # local gazetteer configured, only query nominatim on a miss
+            data = geocoder.geocode(location)
+            if data:
+                return data
         url = "https://nominatim.openstreetmap.org/search"
 
         data = self.get(url, params={"q": location, "format": "json", "limit": 1},
@@ -247,7 +295,7 @@ class OfflineBackend(AbstractBackend):
             location["timezone"] = self._get_timezone(lon=lon, lat=lat)
         return location
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
+    @cached_response("geolocation")
     def reverse_geolocation_get(self, lat, lon):
         """Call the reverse geolocation endpoint.
 
@@ -258,6 +306,11 @@ class OfflineBackend(AbstractBackend):
         Returns:
             str: JSON structure with lookup results
         """
+        geocoder = get_reverse_geocoder()
+        if geocoder:  # local gazetteer configured, no network needed
+            location = geocoder.reverse(lat, lon)
+            if location:
+                return location
         url = "https://nominatim.openstreetmap.org/reverse"
         details = self.get(url, params={"lat": lat, "lon": lon, "format": "json"},
                            headers={"User-Agent": "OVOS/1.0"}).json()
@@ -296,7 +349,7 @@ class OfflineBackend(AbstractBackend):
                 lon=details.get("lon") or lon)
         return location
 
-    @timed_lru_cache(seconds=600)  # cache results for 10 mins
+    @cached_response("geolocation")
     def ip_geolocation_get(self, ip):
         """Call the geolocation endpoint.
 
@@ -309,8 +362,8 @@ class OfflineBackend(AbstractBackend):
         if not ip or ip in ["0.0.0.0", "127.0.0.1"]:
             ip = get_external_ip()
         fields = "status,country,countryCode,region,regionName,city,lat,lon,timezone,query"
-        data = requests.get("http://ip-api.com/json/" + ip,
-                            params={"fields": fields}).json()
+        url = "http://ip-api.com/json/" + ip
+        data = get_session(url).get(url, params={"fields": fields}).json()
         region_data = {"code": data["region"],
                        "name": data["regionName"],
                        "country": {
@@ -379,8 +432,19 @@ class OfflineBackend(AbstractBackend):
 
     # Metrics API
     def metrics_upload(self, name, data):
-        """ upload metrics"""
-        return self.db_post_metric(name, data)
+        """ upload metrics, buffered in memory and written to the database in batches
+
+        returns the saved metric only when buffering is disabled in mycroft.conf,
+        buffered metrics are saved later and None is returned
+        """
+        buffer = self.metrics_buffer
+        if buffer is None:
+            return self.db_post_metric(name, data)
+        buffer.report(name, data)
+
+    def metrics_upload_batch(self, metrics):
+        """ save a list of (name, data) metrics with a single database commit"""
+        return self.db_post_metrics(metrics)
 
     # Skill settings api
     def skill_settings_upload(self, skill_settings):
@@ -445,9 +509,9 @@ class OfflineBackend(AbstractBackend):
                 json string containing token and additional information
         """
         # Load all needed data for refresh
-        with OAuthApplicationDatabase() as db:
+        with get_oauth_app_database() as db:
             app_data = db.get(dev_cred)
-        with OAuthTokenDatabase() as db:
+        with get_oauth_token_database() as db:
             token_data = db.get(dev_cred)
 
         if (app_data is None or
@@ -468,8 +532,8 @@ class OfflineBackend(AbstractBackend):
         # Perform refresh
         client = WebApplicationClient(client_id, refresh_token=refresh_token)
         uri, headers, body = client.prepare_refresh_token_request(token_endpoint)
-        refresh_result = requests.post(uri, headers=headers, data=body,
-                                       auth=(client_id, client_secret))
+        refresh_result = get_session(uri).post(uri, headers=headers, data=body,
+                                               auth=(client_id, client_secret))
 
         if refresh_result.ok:
             new_token_data = refresh_result.json()
@@ -477,7 +541,7 @@ class OfflineBackend(AbstractBackend):
             if 'expires_at' not in new_token_data:
                 new_token_data['expires_at'] = time.time() + token_data['expires_in']
             # Store token
-            with OAuthTokenDatabase() as db:
+            with get_oauth_token_database() as db:
                 token_data.update(new_token_data)
                 db.update_token(dev_cred, token_data)
 
@@ -496,11 +560,11 @@ class OfflineBackend(AbstractBackend):
         """
         if auto_refresh:
             expired = False
-            with OAuthTokenDatabase() as db:
+            with get_oauth_token_database() as db:
                 token_data = db.get(dev_cred)
             if "expires_at" not in token_data:
                 expired = True
-            elif token_data["expires_at"] >= time.time():
+            elif token_data["expires_at"] <= time.time():
                 expired = True
             if expired:
                 return self.oauth_refresh_token(dev_cred)
@@ -607,13 +671,28 @@ class OfflineBackend(AbstractBackend):
                                "lang": info["lang"]})
 
     # STT Api
-    def load_stt_plugin(self, config=None, lang=None):
-        from ovos_plugin_manager.stt import OVOSSTTFactory, get_stt_config
+    @property
+    def stt(self):
+        """ STT engine of this backend
 
-        config = config or get_stt_config(config)
-        if lang:
-            config["lang"] = lang
-        self.stt = OVOSSTTFactory.create(config)
+        an engine assigned here is used for every transcription, otherwise engines come from
+        the process-wide STT pool and are looked up on every use, so an evicted one is reloaded
+        """
+        if self._stt is not None or self._stt_lang is None:
+            return self._stt
+        return get_stt_pool().get(self._stt_lang, self.stt_config)
+
+    @stt.setter
+    def stt(self, engine):
+        self._stt = engine
+
+    def load_stt_plugin(self, config=None, lang=None):
+        """ use config for transcriptions from this backend, plugins are shared
+        with every other backend instance through the process-wide STT pool"""
+        self.stt_config = config
+        self._stt = None
+        self._stt_lang = lang or Configuration().get("lang", "en-us")
+        get_stt_pool().get(self._stt_lang, config)  # load ahead of the first transcription
 
     def stt_get(self, audio, language="en-us", limit=1):
         """ Web API wrapper for performing Speech to Text (STT)
@@ -624,20 +703,40 @@ class OfflineBackend(AbstractBackend):
             limit (int): Maximum alternate transcriptions
 
        """
-        if self.stt is None:
-            self.load_stt_plugin(lang=language)
-        from speech_recognition import AudioFile, Recognizer
-        with NamedTemporaryFile() as fp:
-            fp.write(audio)
-            with AudioFile(fp.name) as source:
-                audio = Recognizer().record(source)
-        tx = self.stt.execute(audio, language)
+        audio = decode_audio(audio)
+        if self._stt is not None:
+            tx = self._stt.execute(audio, language)
+        else:
+            # one engine per (config, language), loaded on demand
+            tx = get_stt_pool().execute(audio, language, self.stt_config)
         if isinstance(tx, str):
             tx = [tx]
         return tx
 
+    def stt_stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        streaming capable STT plugins report partial transcriptions while audio is
+        still being recorded, others transcribe once chunks is exhausted
+
+        Args:
+            chunks (iterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        if self._stt is not None:
+            # assigned engines are not managed by the pool, the buffered audio goes through stt_get
+            yield from AbstractBackend.stt_stream(self, chunks, language, limit, sample_rate, sample_width)
+            return
+        yield from get_stt_pool().stream(chunks, language, self.stt_config, sample_rate, sample_width)
+
     # Database API
-    def db_list_devices(self):
+    def db_list_devices(self, offset=0, limit=None):
         _mail_cfg = self.credentials.get("email", {})
 
         tts_plug = Configuration().get("tts").get("module")
@@ -665,12 +764,12 @@ class OfflineBackend(AbstractBackend):
             "default_ww": default_ww,
             "default_ww_cfg": ww_config
         }
-        return [device]
+        return [device][offset:None if limit is None else offset + limit]
 
     def db_get_device(self, uuid):
         if uuid != self.uuid:
             return None
-        return self.db_list_devices()[0]
+        return self.db_list_devices(limit=1)[0]
 
     def db_update_device(self, uuid, name=None,
                          device_location=None, opt_in=None,
@@ -818,33 +917,33 @@ class OfflineBackend(AbstractBackend):
                                                   settings_json=settings_json, metadata_json=metadata_json)
 
     def db_list_oauth_apps(self):
-        return OAuthApplicationDatabase().values()
+        return get_oauth_app_database().values()
 
     def db_get_oauth_app(self, token_id):
-        return OAuthApplicationDatabase().get_application(token_id)
+        return get_oauth_app_database().get_application(token_id)
 
     def db_update_oauth_app(self, token_id, client_id=None, client_secret=None,
                             auth_endpoint=None, token_endpoint=None,
                             callback_endpoint=None, scope=None, shell_integration=None):
-        with OAuthApplicationDatabase() as db:
+        with get_oauth_app_database() as db:
             return db.add_token(token_id, client_id, client_secret,
                                 auth_endpoint, token_endpoint,
                                 callback_endpoint, scope, shell_integration)
 
     def db_delete_oauth_app(self, token_id):
-        with OAuthApplicationDatabase() as db:
+        with get_oauth_app_database() as db:
             return db.delete_application(token_id)
 
     def db_post_oauth_app(self, token_id, client_id, client_secret,
                           auth_endpoint, token_endpoint,
                           callback_endpoint, scope, shell_integration=True):
-        with OAuthApplicationDatabase() as db:
+        with get_oauth_app_database() as db:
             return db.add_application(token_id, client_id, client_secret,
                                       auth_endpoint, token_endpoint, callback_endpoint,
                                       scope, shell_integration)
 
     def db_list_oauth_tokens(self):
-        return OAuthTokenDatabase().values()
+        return get_oauth_token_database().values()
 
     def db_get_oauth_token(self, token_id):
         """
@@ -856,114 +955,134 @@ class OfflineBackend(AbstractBackend):
             Returns:
                 json string containing token and additional information
         """
-        return OAuthTokenDatabase().get_token(token_id)
+        return get_oauth_token_database().get_token(token_id)
 
     def db_update_oauth_token(self, token_id, token_data):
-        with OAuthTokenDatabase() as db:
+        with get_oauth_token_database() as db:
             return db.add_token(token_id, token_data)
 
     def db_delete_oauth_token(self, token_id):
-        with OAuthTokenDatabase() as db:
+        with get_oauth_token_database() as db:
             return db.delete_token(token_id)
 
     def db_post_oauth_token(self, token_id, token_data):
-        with OAuthTokenDatabase() as db:
+        with get_oauth_token_database() as db:
             return db.add_token(token_id, token_data)
 
-    def db_list_stt_recordings(self):
-        return JsonUtteranceDatabase().values()
+    def db_list_stt_recordings(self, offset=0, limit=None):
+        return get_utterance_database().page(offset, limit)
 
     def db_get_stt_recording(self, rec_id):
-        return JsonUtteranceDatabase().get_utterance(rec_id).serialize()
+        return get_utterance_database().get_utterance(rec_id).serialize()
 
     def db_update_stt_recording(self, rec_id, transcription=None, metadata=None):
         # TODO - metadata unused, extend db
-        return JsonUtteranceDatabase().update_utterance(rec_id, transcription)
+        return get_utterance_database().update_utterance(rec_id, transcription)
+
+    def db_update_stt_recordings(self, updates):
+        # single commit for the whole batch
+        with get_utterance_database() as db:
+            return [db.update_utterance(rec_id, transcription)
+                    for rec_id, transcription in updates.items()]
+
+    @staticmethod
+    def _commit_recording_delete(db, path):
+        """ commit a deleted recording, its audio is only released once the record is gone
+
+        commit errors are raised, the database context manager would swallow them
+        """
+        db.commit()
+        try:
+            release_recording(path)
+        except Exception as e:  # the blob is kept, never lose audio that may still be referenced
+            LOG.error(f"failed to release audio of deleted recording {path}: {e}")
 
     def db_delete_stt_recording(self, rec_id):
-        return JsonUtteranceDatabase().delete_utterance(rec_id)
+        db = get_utterance_database()
+        rec = db.get(rec_id)
+        deleted = db.delete_utterance(rec_id)
+        if deleted:
+            self._commit_recording_delete(db, rec["path"])
+        return deleted
 
     def db_post_stt_recording(self, byte_data, transcription, metadata=None):
         # TODO - metadata unused, extend db
         save_path = Configuration().get("listener", {}).get('save_path') or \
                     f"{get_xdg_data_save_path()}/listener/utterances"
-        os.makedirs(save_path, exist_ok=True)
 
-        with JsonUtteranceDatabase() as db:
+        with get_utterance_database() as db:
             n = f"{transcription.lower().replace('/', '_').replace(' ', '_')}_{db.total_utterances() + 1}"
-            with open(f"{save_path}/{n}.wav", "wb") as f:
-                f.write(byte_data)
-            return db.add_utterance(transcription, f"{save_path}/{n}.wav", self.uuid)
+            return db.add_utterance(transcription, save_recording(byte_data, save_path, n), self.uuid)
+
+    def db_list_ww_recordings(self, offset=0, limit=None):
+        return get_wakeword_database().page(offset, limit)
 
-    def db_list_ww_recordings(self):
-        return JsonWakeWordDatabase().values()
+    def db_query_ww_recordings(self, tag=None, speaker_type=None, uuid=None, since=None,
+                               offset=0, limit=None):
+        return get_wakeword_database().query(offset, limit, since, tag=tag, speaker_type=speaker_type, uuid=uuid)
 
     def db_get_ww_recording(self, rec_id):
-        return JsonWakeWordDatabase().get_wakeword(rec_id).serialize()
+        return get_wakeword_database().get_wakeword(rec_id).serialize()
 
     def db_update_ww_recording(self, rec_id, transcription=None, metadata=None):
-        with JsonWakeWordDatabase() as db:
+        with get_wakeword_database() as db:
             db.update_wakeword(rec_id, transcription=transcription, meta=metadata)
 
     def db_delete_ww_recording(self, rec_id):
-        with JsonWakeWordDatabase() as db:
-            db.delete_wakeword(rec_id)
+        db = get_wakeword_database()
+        rec = db.get_wakeword(rec_id)
+        deleted = db.delete_wakeword(rec_id)
+        if deleted:
+            self._commit_recording_delete(db, rec.path)
+        return deleted
 
     def db_post_ww_recording(self, byte_data, transcription, metadata=None):
         listener_config = Configuration().get("listener", {})
         save_path = listener_config.get('save_path', f"{get_xdg_data_save_path()}/listener/wake_words")
-        filename = join(save_path, '_'.join(str(metadata[k]) for k in sorted(metadata)) + '.wav')
-        os.makedirs(save_path, exist_ok=True)
         metadata = metadata or {}
-        with open(save_path, "wb") as f:
-            f.write(byte_data)
-        with JsonWakeWordDatabase() as db:
-            db.add_wakeword(metadata["name"], filename, metadata, self.uuid)
+        name = '_'.join(str(metadata[k]) for k in sorted(metadata)) or transcription
+        path = save_recording(byte_data, save_path, name)
+        with get_wakeword_database() as db:
+            db.add_wakeword(metadata.get("name", transcription), path, metadata, self.uuid)
+
+    def db_list_metrics(self, offset=0, limit=None):
+        return get_metric_database().page(offset, limit)
 
-    def db_list_metrics(self):
-        return JsonMetricDatabase().values()
+    def db_query_metrics(self, metric_type=None, uuid=None, since=None, offset=0, limit=None):
+        return get_metric_database().query(offset, limit, since, metric_type=metric_type, uuid=uuid)
 
     def db_get_metric(self, metric_id):
-        return JsonMetricDatabase().get(metric_id)
+        return get_metric_database().get(metric_id)
 
     def db_update_metric(self, metric_id, metadata):
         m = self.db_get_metric(metric_id)
         m.meta = metadata
-        with JsonMetricDatabase() as db:
+        with get_metric_database() as db:
             db[metric_id] = m
 
     def db_delete_metric(self, metric_id):
-        with JsonMetricDatabase() as db:
+        with get_metric_database() as db:
             if metric_id in db:
                 db.pop(metric_id)
                 return True
         return False
 
     def db_post_metric(self, metric_type, metadata):
-        with JsonMetricDatabase() as db:
+        with get_metric_database() as db:
             m = db.add_metric(metric_type, metadata, self.uuid)
         return m.serialize()
 
+    def db_post_metrics(self, metrics):
+        # single commit for the whole batch
+        with get_metric_database() as db:
+            return [db.add_metric(metric_type, metadata, self.uuid).serialize()
+                    for metric_type, metadata in metrics]
+
     def db_list_ww_definitions(self):
-        ww_defs = []
-        for ww_id, ww_cfg in get_wws().items():  # TODO scan=True once implemented
-            plugin, name, _ = ww_id.split("_", 3)
-            ww_defs.append({
-                "ww_id": ww_id,
-                "name": ww_cfg.get("display_name") or name,
-                "lang": ww_cfg.get("stt_lang") or
-                        ww_cfg.get("lang") or
-                        Configuration().get("lang", "en-us"),
-                "plugin": ww_cfg.get("module") or plugin,
-                "ww_config": ww_cfg
-            })
-        return ww_defs
+        return get_ww_catalog().values()
 
     def db_get_ww_definition(self, ww_id):
-        ww_defs = self.db_list_ww_definitions()
-        for ww in ww_defs:
-            if ww["ww_id"] == ww_id:
-                return ww
+        return get_ww_catalog().get(ww_id)
 
     def db_update_ww_definition(self, ww_id, name=None, lang=None, ww_config=None, plugin=None):
         ww_folders = f"{xdg_data_home()}/OPM/ww_configs"
@@ -992,6 +1111,7 @@ class OfflineBackend(AbstractBackend):
                 old_cfg["stt_lang"] = lang
         with open(path, "w") as f:
             json.dump(ww_config, f, indent=4, ensure_ascii=False)
+        get_ww_catalog().invalidate()
 
     def db_delete_ww_definition(self, ww_id):
         for lang in listdir(f"{xdg_data_home()}/OPM/ww_configs"):
@@ -1008,30 +1128,13 @@ class OfflineBackend(AbstractBackend):
         ww_config["stt_lang"] = lang  # tag language in STT step
         with open(path, "w") as f:
             json.dump(ww_config, f, indent=4, ensure_ascii=False)
+        get_ww_catalog().invalidate()
 
     def db_list_voice_definitions(self):
-        return [{
-            "voice_id": voice_id,
-            "lang": voice_data["meta"].get("lang"),
-            "plugin": voice_data["module"],
-            "tts_config": voice_data,
-            "offline": voice_data["meta"].get("offline"),
-            "gender": voice_data["meta"].get("gender"),
-        } for voice_id, voice_data in get_voices(scan=True).items()]
+        return get_voice_catalog().values()
 
     def db_get_voice_definition(self, voice_id):
-        voices = get_voices(scan=True)
-        if voice_id in voices:
-            voice_data = voices[voice_id]
-            return {
-                "voice_id": voice_id,
-                "lang": voice_data["meta"].get("lang"),
-                "plugin": voice_data["module"],
-                "tts_config": voice_data,
-                "offline": voice_data["meta"].get("offline"),
-                "gender": voice_data["meta"].get("gender"),
-            }
-        return {}
+        return get_voice_catalog().get(voice_id, {})
 
     def db_update_voice_definition(self, voice_id, name=None, lang=None, plugin=None,
                                    tts_config=None, offline=None, gender=None):
@@ -1063,6 +1166,7 @@ class OfflineBackend(AbstractBackend):
 
         with open(path, "w") as f:
             json.dump(voicedef, f, indent=4, ensure_ascii=False)
+        get_voice_catalog().invalidate()
 
     def db_delete_voice_definition(self, voice_id):
         VOICES_FOLDER = f"{xdg_data_home()}/OPM/voice_configs"
@@ -1083,6 +1187,7 @@ class OfflineBackend(AbstractBackend):
             tts_config["meta"] = {"offline": offline, "gender": gender,
                                   "name": name, "lang": lang}
             json.dump(tts_config, f, indent=4, ensure_ascii=False)
+        get_voice_catalog().invalidate()
 
 
 class AbstractPartialBackend(OfflineBackend):
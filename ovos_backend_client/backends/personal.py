@@ -2,37 +2,69 @@ import base64
 import json
 import os
 import time
-from io import BytesIO, StringIO
+from enum import Enum
+from threading import Lock
 
-import requests
+from ovos_backend_client.backends.base import AbstractBackend
 from ovos_backend_client.backends.offline import AbstractPartialBackend, BackendType
-from ovos_backend_client.database import SkillSettingsModel
-from ovos_backend_client.identity import IdentityManager, identity_lock
+from ovos_backend_client.database import SkillSettingsModel, match_record
+from ovos_backend_client.identity import IdentityManager, TokenRefresher
+from ovos_backend_client.session import get_session
+from ovos_backend_client.stt import encode_audio, make_hypothesis
 from ovos_config.config import Configuration
 from ovos_utils.log import LOG
 from requests.exceptions import HTTPError
 
+_token_refreshers = {}
+_token_refreshers_lock = Lock()
+
+
+def get_token_refresher(url, version="v1"):
+    """ process-wide TokenRefresher for a personal backend
+
+    margin and jitter (seconds) can be set in mycroft.conf
+
+    "server": {
+        "token_refresh": {"margin": 60, "jitter": 30}
+    }
+    """
+    key = f"{url}/{version}"
+    with _token_refreshers_lock:
+        if key not in _token_refreshers:
+
+            def request_token(identity):
+                token_url = f"{url}/{version}/auth/token"
+                headers = {"Device": identity.uuid,
+                           "Content-Type": "application/json",
+                           "Authorization": f"Bearer {identity.access}"}
+                response = get_session(token_url).get(token_url, headers=headers, timeout=(3.05, 15))
+                response.raise_for_status()
+                return response.json()
+
+            cfg = (Configuration().get("server") or {}).get("token_refresh") or {}
+            _token_refreshers[key] = TokenRefresher(request_token,
+                                                    margin=cfg.get("margin", 60),
+                                                    jitter=cfg.get("jitter", 30))
+        return _token_refreshers[key]
+
 
 class PersonalBackend(AbstractPartialBackend):
 
     def __init__(self, url="http://0.0.0.0:6712", version="v1", identity_file=None, credentials=None):
         super().__init__(url, version, identity_file, BackendType.PERSONAL, credentials)
+        self.token_refresher = get_token_refresher(self.url, self.backend_version)
+        self._unpaged = set()  # admin list paths the server returned unpaginated
+        self._paged = set()  # admin list paths known to honour offset/limit
+        self._unfiltered = set()  # admin list paths the server pages but does not filter
+
+    def check_token(self):
+        # refreshes happen in the background ahead of expiration,
+        # this only blocks if the token is already expired
+        self.token_refresher.check()
 
     def refresh_token(self):
-        try:
-            self.identity.get()  # Ensure loading so identity property doesn't cause deadlock
-            identity_lock.acquire(blocking=False)
-            # NOTE: requests needs to be used instead of self.get due to self.get calling this
-            data = requests.get(f"{self.backend_url}/{self.backend_version}/auth/token", headers=self.headers).json()
-            IdentityManager.save(data, lock=False)
-            LOG.debug('Saved credentials')
-        except:
-            LOG.warning("Failed to refresh access token")
-        finally:
-            try:
-                identity_lock.release()
-            except RuntimeError:  # RuntimeError: release unlocked lock
-                pass
+        # concurrent callers wait for a single in-flight refresh
+        self.token_refresher.refresh()
 
     # OWM Api
     def owm_get_weather(self, lat_lon=None, lang="en-us", units="metric"):
@@ -172,20 +204,69 @@ class PersonalBackend(AbstractPartialBackend):
         """ Web API wrapper for performing Speech to Text (STT)
 
         Args:
-            audio (bytes): The recorded audio, as in a FLAC file
+            audio (bytes|AudioData): The recorded audio, FLAC, WAV or AudioData,
+                                     WAV/AudioData is downsampled and compressed before upload
             language (str): A BCP-47 language code, e.g. "en-US"
             limit (int): Maximum alternate transcriptions
 
         Returns:
             dict: JSON structure with transcription results
         """
+        audio, content_type = encode_audio(audio)
         data = self.post(url=f"{self.backend_url}/{self.backend_version}/stt",
                          data=audio, params={"lang": language, "limit": limit},
-                         headers={"Content-Type": "audio/x-flac"})
+                         headers={"Content-Type": content_type})
         if data.status_code == 200:
             return data.json()
         raise RuntimeError(f"STT api failed, status_code {data.status_code}")
 
+    def stt_stream(self, chunks, language="en-us", limit=1, sample_rate=16000, sample_width=2):
+        """ Speech to Text (STT) from audio chunks as they are recorded
+
+        chunks are uploaded with chunked transfer encoding as they arrive, the server answers
+        with one json hypothesis per line. servers without a streaming endpoint get the
+        whole utterance through stt_get
+
+        requests is half duplex, the response is only read once chunks is exhausted, so the
+        server can decode while audio is recorded but partial hypotheses arrive together with
+        the final one. AsyncPersonalBackend reads them while the upload is still going
+
+        Args:
+            chunks (iterable): 16bit mono pcm chunks
+            language (str): A BCP-47 language code, e.g. "en-US"
+            limit (int): Maximum alternate transcriptions
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool} hypotheses, the last one is final
+        """
+        chunks = iter(chunks)
+        sent = []
+
+        def body():
+            for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+
+        response = self.post(url=f"{self.backend_url}/{self.backend_version}/stt/stream",
+                             data=body(), params={"lang": language, "limit": limit}, stream=True,
+                             headers={"Content-Type": f"audio/L{sample_width * 8}; rate={sample_rate}"})
+        if response.status_code in (404, 405, 501):
+            LOG.debug("STT streaming not supported by server, sending whole utterance")
+            sent.extend(chunks)
+            # buffered stt_get, not the local plugin of the offline parent
+            yield from AbstractBackend.stt_stream(self, sent, language, limit, sample_rate, sample_width)
+            return
+        if response.status_code != 200:
+            raise RuntimeError(f"STT api failed, status_code {response.status_code}")
+        for line in response.iter_lines():
+            if line:
+                hypothesis = json.loads(line)
+                if not isinstance(hypothesis, dict):
+                    hypothesis = make_hypothesis(hypothesis)
+                yield hypothesis
+
     # Device Api
     def device_get(self):
         """ Retrieve all device information from the web backend """
@@ -316,12 +397,7 @@ class PersonalBackend(AbstractPartialBackend):
             byte_data = audio.get_wav_data()
         else:
             byte_data = audio
-
-        ww_files = {
-            'audio': BytesIO(byte_data),
-            'metadata': StringIO(json.dumps(params))
-        }
-        return self.post(upload_url, files=ww_files)
+        return self._spool_upload("sample", self._post_sample, byte_data, params, upload_url)
 
     def device_upload_wake_word(self, audio, params):
         """ upload precise wake word V2 endpoint - integrated with device api"""
@@ -332,11 +408,11 @@ class PersonalBackend(AbstractPartialBackend):
             timestamp=params.get('timestamp') or params.get('time') or str(int(1000 * time.time())),
             model=params['model']
         )
-        ww_files = {
-            'audio': BytesIO(audio.get_wav_data()),
-            'metadata': StringIO(json.dumps(request_data))
-        }
-        return self.post(url, files=ww_files)
+        if not isinstance(audio, bytes):
+            byte_data = audio.get_wav_data()
+        else:
+            byte_data = audio
+        return self._spool_upload("wake_word_file", self._post_sample, byte_data, request_data, url)
 
     # Skill settings api
     def skill_settings_upload(self, skill_settings):
@@ -352,8 +428,28 @@ class PersonalBackend(AbstractPartialBackend):
 
     # Metrics API
     def metrics_upload(self, name, data):
-        """ upload metrics"""
-        return self.device_report_metric(name, data)
+        """ upload metrics, buffered in memory and sent in batches
+
+        returns the server response only when buffering is disabled in mycroft.conf,
+        buffered metrics are sent later and None is returned
+        """
+        buffer = self.metrics_buffer
+        if buffer is None:
+            return self.device_report_metric(name, data)
+        buffer.report(name, data)
+
+    def metrics_upload_batch(self, metrics):
+        """ upload a list of (name, data) metrics in a single request
+
+        servers without the batch endpoint get one request per metric
+        """
+        response = self.post(f"{self.backend_url}/{self.backend_version}/device/{self.uuid}/metrics",
+                             json=[{"name": name, "data": data} for name, data in metrics])
+        if response.status_code in (404, 405, 501):
+            for name, data in metrics:
+                self.device_report_metric(name, data).raise_for_status()
+            return
+        response.raise_for_status()
 
     # Dataset API
     def dataset_upload_wake_word(self, audio, params, upload_url=None):
@@ -475,9 +571,71 @@ class PersonalBackend(AbstractPartialBackend):
                         headers={"Authorization": f"Bearer {self.credentials['admin']}"})
 
     # Database api
-    def db_list_devices(self):
-        return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/devices/list",
-                        headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
+    def _fetch_list(self, path, offset=0, limit=None, since=None, **filters):
+        """ GET /admin/<path>/list, paginated with ?offset=&limit= and filtered by field with ?<field>=<value> """
+        params = dict(filters, offset=offset)
+        if limit is not None:
+            params["limit"] = limit
+        if since is not None:
+            params["since"] = since
+        return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/{path}/list", params=params,
+                        headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
+
+    def _ignores_paging(self, path, offset, limit, data):
+        """ True if the server returned the whole list instead of the requested page
+
+        older servers ignore the pagination parameters, the answer is remembered per path so
+        later pages are sliced even when they are shorter than limit. a response that is not
+        longer than limit is ambiguous when offset is set, the server is probed once with limit=1
+        """
+        if path in self._unpaged:
+            return True
+        if limit is not None and len(data) > limit:
+            self._unpaged.add(path)
+        elif offset and data and path not in self._paged:
+            if len(self._fetch_list(path, 0, 1)) > 1:
+                self._unpaged.add(path)
+            else:
+                self._paged.add(path)
+        return path in self._unpaged
+
+    def _scan_matches(self, path, offset=0, limit=None, since=None, page_size=100, **filters):
+        """ page of the matching records for servers that page but ignore the filters
+
+        the server pages are unfiltered, so they are read from the start and filtered
+        locally until offset + limit matches are found
+        """
+        matches = []
+        raw_offset = 0
+        while limit is None or len(matches) < offset + limit:
+            page = self._fetch_list(path, raw_offset, page_size)
+            matches += [r for r in page if match_record(r, since, **filters)]
+            if len(page) < page_size:
+                break
+            raw_offset += page_size
+        return matches[offset:None if limit is None else offset + limit]
+
+    def _list_page(self, path, offset=0, limit=None, since=None, **filters):
+        filters = {k: v.value if isinstance(v, Enum) else v for k, v in filters.items() if v is not None}
+        filtered = bool(filters) or since is not None
+        if filtered and path in self._unfiltered:
+            return self._scan_matches(path, offset, limit, since, **filters)
+        data = self._fetch_list(path, offset, limit, since, **filters)
+        unpaged = self._ignores_paging(path, offset, limit, data)
+        if filtered:
+            matches = [r for r in data if match_record(r, since, **filters)]
+            if len(matches) < len(data) and not unpaged and (offset or limit is not None):
+                # the page was cut before filtering, it may hold fewer than limit matches
+                # even though more exist, remembered so later queries scan right away
+                self._unfiltered.add(path)
+                return self._scan_matches(path, offset, limit, since, **filters)
+            data = matches
+        if unpaged:
+            data = data[offset:] if limit is None else data[offset:offset + limit]
+        return data
+
+    def db_list_devices(self, offset=0, limit=None):
+        return self._list_page("devices", offset, limit)
 
     def db_get_device(self, uuid):
         return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/devices/{uuid}",
@@ -671,9 +829,8 @@ class PersonalBackend(AbstractPartialBackend):
                         json=payload,
                         headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
 
-    def db_list_stt_recordings(self):
-        return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/voice_recs/list",
-                        headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
+    def db_list_stt_recordings(self, offset=0, limit=None):
+        return self._list_page("voice_recs", offset, limit)
 
     def db_get_stt_recording(self, rec_id):
         return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/voice_recs/{rec_id}",
@@ -698,9 +855,12 @@ class PersonalBackend(AbstractPartialBackend):
                         json=payload,
                         headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
 
-    def db_list_ww_recordings(self):
-        return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/ww_recs/list",
-                        headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
+    def db_list_ww_recordings(self, offset=0, limit=None):
+        return self._list_page("ww_recs", offset, limit)
+
+    def db_query_ww_recordings(self, tag=None, speaker_type=None, uuid=None, since=None,
+                               offset=0, limit=None):
+        return self._list_page("ww_recs", offset, limit, since, tag=tag, speaker_type=speaker_type, uuid=uuid)
 
     def db_get_ww_recording(self, rec_id):
         return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/ww_recs/{rec_id}",
@@ -725,9 +885,11 @@ class PersonalBackend(AbstractPartialBackend):
                          json=payload,
                          headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
 
-    def db_list_metrics(self):
-        return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/metrics/list",
-                        headers={"Authorization": f"Bearer {self.credentials['admin']}"}).json()
+    def db_list_metrics(self, offset=0, limit=None):
+        return self._list_page("metrics", offset, limit)
+
+    def db_query_metrics(self, metric_type=None, uuid=None, since=None, offset=0, limit=None):
+        return self._list_page("metrics", offset, limit, since, metric_type=metric_type, uuid=uuid)
 
     def db_get_metric(self, metric_id):
         return self.get(url=f"{self.backend_url}/{self.backend_version}/admin/metrics/{metric_id}",
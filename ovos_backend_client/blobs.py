@@ -0,0 +1,226 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import wave
+from contextlib import contextmanager
+from io import BytesIO
+from os.path import dirname, isfile, join
+from threading import Lock
+from uuid import uuid4
+
+from ovos_config.config import Configuration
+from ovos_config.locations import get_xdg_data_save_path
+from ovos_utils.log import LOG
+
+
+class BlobStore:
+    """ content addressed audio storage shared by the recording databases
+
+    every blob is named after the sha256 of the uploaded bytes and stored in
+    <path>/<hash[:2]>/<hash[2:4]>/<hash>.wav, uploading the same audio again returns
+    the existing file. a reference count per blob is kept in <path>/refs.db (sqlite,
+    safe across processes), the file is deleted along with the last record using it.
+    files are written and removed while holding the database write lock, so a put and a
+    release of the same blob in different processes can not interleave
+
+    with compress enabled mono WAV is stored as lossless FLAC (<hash>.flac), read
+    returns it decoded back to WAV, other audio is always stored as uploaded
+
+    Args:
+        path (str): blob directory
+        compress (bool): store WAV as FLAC
+    """
+
+    def __init__(self, path, compress=False):
+        self.path = os.path.abspath(path)
+        self.compress = compress
+        os.makedirs(self.path, exist_ok=True)
+        self._db = sqlite3.connect(join(self.path, "refs.db"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS refs (digest TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        self._db.commit()
+        self._lock = Lock()
+
+    @contextmanager
+    def _transaction(self):
+        """ exclusive write transaction, blob files are only created and deleted inside one
+
+        BEGIN IMMEDIATE takes the sqlite write lock, so a reference count and its file
+        change together for every process sharing the store
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._db.commit()
+
+    # paths
+    def _blob_path(self, digest, ext):
+        return join(self.path, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+    def path_of(self, digest):
+        """ file of a blob, None if it is not stored """
+        for ext in ("wav", "flac"):
+            path = self._blob_path(digest, ext)
+            if isfile(path):
+                return path
+        return None
+
+    def digest_of(self, path):
+        """ digest of a blob file path, None for files outside the store """
+        if not path or dirname(dirname(dirname(os.path.abspath(path)))) != self.path:
+            return None
+        return os.path.basename(path).rsplit(".", 1)[0]
+
+    # content
+    @staticmethod
+    def _flac(data):
+        """ lossless FLAC of a mono WAV, None for anything else """
+        try:
+            with wave.open(BytesIO(data), "rb") as wav:
+                if wav.getnchannels() != 1 or wav.getsampwidth() > 3:
+                    return None  # downmixed or truncated by speech_recognition
+        except (wave.Error, EOFError):
+            return None
+        from ovos_backend_client.stt import decode_audio
+        return decode_audio(data).get_flac_data()
+
+    def _encode(self, data):
+        """ (extension, file contents) a blob is stored as """
+        if bytes(data[:4]) == b"fLaC":
+            return "flac", data  # already compressed, eg. imported from a compressed store
+        flac = self._flac(data) if self.compress else None
+        return ("wav", data) if flac is None else ("flac", flac)
+
+    def put(self, data):
+        """ store audio and take a reference to it
+
+        Returns:
+            str: sha256 of data, pass it to release when the recording is deleted
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        encoded = self._encode(data) if self.path_of(digest) is None else None  # outside of the write lock
+        with self._transaction():
+            count = self.refcount(digest)
+            if count:
+                self._db.execute("UPDATE refs SET count = ? WHERE digest = ?", (count + 1, digest))
+            else:
+                self._db.execute("INSERT INTO refs VALUES (?, 1)", (digest,))
+            # checked again while holding the lock, a concurrent release may have deleted it
+            if self.path_of(digest) is None:
+                ext, content = encoded or self._encode(data)
+                path = self._blob_path(digest, ext)
+                os.makedirs(dirname(path), exist_ok=True)
+                tmp = f"{path}.{uuid4().hex}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(content)
+                os.replace(tmp, path)
+        return digest
+
+    def read(self, digest):
+        """ contents of a blob as WAV, memory mapped when stored uncompressed
+
+        Returns:
+            mmap.mmap|bytes: audio, raises FileNotFoundError for unknown blobs
+        """
+        path = self.path_of(digest)
+        if path is None:
+            raise FileNotFoundError(digest)
+        if path.endswith(".flac"):
+            from ovos_backend_client.stt import decode_audio
+            with open(path, "rb") as f:
+                return decode_audio(f.read()).get_wav_data()
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def refcount(self, digest):
+        row = self._db.execute("SELECT count FROM refs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else 0
+
+    def release(self, digest):
+        """ drop a reference, the blob is deleted with the last one
+
+        Returns:
+            bool: True if the blob was deleted
+        """
+        with self._transaction():
+            count = self.refcount(digest) - 1
+            if count > 0:
+                self._db.execute("UPDATE refs SET count = ? WHERE digest = ?", (count, digest))
+                return False
+            self._db.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+            path = self.path_of(digest)
+            if path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return True
+
+
+def get_blob_config():
+    """ recording blob store configuration from mycroft.conf
+
+    "server": {
+        "blob_store": {
+            "enabled": false,  // true stores offline recordings deduplicated by content
+            "path": "~/.local/share/ovos_backend_client/blobs",
+            "compress": false  // store WAV recordings as FLAC
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("blob_store") or {}
+    return {"enabled": cfg.get("enabled", False),
+            "path": os.path.expanduser(cfg.get("path") or
+                                       join(get_xdg_data_save_path("ovos_backend_client"), "blobs")),
+            "compress": cfg.get("compress", False)}
+
+
+_stores = {}
+_stores_lock = Lock()
+
+
+def get_blob_store():
+    """ process wide BlobStore, None if disabled in mycroft.conf """
+    cfg = get_blob_config()
+    if not cfg.pop("enabled"):
+        return None
+    if cfg["path"] not in _stores:
+        with _stores_lock:
+            if cfg["path"] not in _stores:
+                try:
+                    _stores[cfg["path"]] = BlobStore(**cfg)
+                except OSError as e:
+                    LOG.error(f"blob store unavailable, saving recordings as files: {e}")
+                    return None
+    return _stores[cfg["path"]]
+
+
+def save_recording(byte_data, save_path, name, ext="wav"):
+    """ store a recording in the blob store if enabled, else as <save_path>/<name>.<ext>
+
+    Returns:
+        str: path of the stored audio
+    """
+    store = get_blob_store()
+    if store is not None:
+        return store.path_of(store.put(byte_data))
+    os.makedirs(save_path, exist_ok=True)
+    path = join(save_path, f"{name}.{ext}")
+    with open(path, "wb") as f:
+        f.write(byte_data)
+    return path
+
+
+def release_recording(path):
+    """ drop the blob store reference of a deleted recording, files outside the store are kept """
+    store = get_blob_store()
+    digest = store.digest_of(path) if store is not None else None
+    if digest:
+        store.release(digest)
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import wraps
+from os import makedirs
+from os.path import dirname, join
+from threading import Lock, local
+
+from ovos_config.config import Configuration
+from ovos_config.locations import get_xdg_cache_save_path
+from ovos_utils.log import LOG
+
+# default time to live (seconds) per cache namespace
+DEFAULT_TTL = {
+    "owm": 600,  # owm only updates data every 15mins or so
+    "wolfram": 1800,  # wolfram answers wont change often
+    "geolocation": 600,
+    "skill_settings": 30  # often 1 call per skill is done in quick succession
+}
+
+
+class AbstractResponseCache:
+    """ key/value store for json serializable api responses
+
+    every entry belongs to a namespace (eg. "owm") and expires after its own ttl
+    """
+
+    def get(self, namespace, key):
+        """ return the cached value, or None if missing/expired """
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl):
+        raise NotImplementedError
+
+    def clear(self, namespace=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryResponseCache(AbstractResponseCache):
+    """ per process LRU cache, equivalent to the old timed_lru_cache behaviour """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                self._data.pop((namespace, key))
+                return None
+            self._data.move_to_end((namespace, key))
+            return json.loads(value)
+
+    def set(self, namespace, key, value, ttl):
+        with self._lock:
+            self._data[(namespace, key)] = (json.dumps(value), time.time() + ttl)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+            else:
+                for k in [k for k in self._data if k[0] == namespace]:
+                    self._data.pop(k)
+
+
+class SQLiteResponseCache(AbstractResponseCache):
+    """ cache stored in a sqlite file, shared by every process in the device
+
+    sqlite handles the cross process locking, WAL mode allows readers to
+    proceed while another process writes, each thread gets its own connection
+
+    cache hits are read only, the LRU timestamp of an entry is refreshed
+    at most once every touch_interval seconds
+    """
+    touch_interval = 60
+
+    def __init__(self, path=None, max_entries=1000):
+        self.path = path or join(get_xdg_cache_save_path("ovos_backend_client"), "responses.db")
+        self.max_entries = max_entries
+        self._local = local()
+        makedirs(dirname(self.path), exist_ok=True)
+        with self._connection as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "namespace TEXT NOT NULL, "
+                         "key TEXT NOT NULL, "
+                         "value TEXT NOT NULL, "
+                         "expires_at REAL NOT NULL, "
+                         "accessed_at REAL NOT NULL, "
+                         "PRIMARY KEY (namespace, key))")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    @property
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:  # eg. network filesystems
+                pass
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self._connection as conn:
+            row = conn.execute("SELECT value, expires_at, accessed_at FROM responses "
+                               "WHERE namespace=? AND key=?", (namespace, key)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM responses WHERE namespace=? AND key=?", (namespace, key))
+                return None
+            if now - row[2] >= self.touch_interval:
+                conn.execute("UPDATE responses SET accessed_at=? WHERE namespace=? AND key=?",
+                             (now, namespace, key))
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl):
+        now = time.time()
+        with self._connection as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                         (namespace, key, json.dumps(value), now + ttl, now))
+            # drop expired entries and least recently used ones above the size bound
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM responses WHERE rowid IN ("
+                         "SELECT rowid FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
+
+    def clear(self, namespace=None):
+        with self._connection as conn:
+            if namespace is None:
+                conn.execute("DELETE FROM responses")
+            else:
+                conn.execute("DELETE FROM responses WHERE namespace=?", (namespace,))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+CACHE_BACKENDS = {
+    "memory": MemoryResponseCache,
+    "sqlite": SQLiteResponseCache
+}
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_cache_config():
+    """ response cache settings from mycroft.conf
+
+    "server": {
+        "cache": {
+            "backend": "sqlite",  // "sqlite", "memory" or "none"
+            "path": "~/.cache/ovos_backend_client/responses.db",
+            "max_entries": 1000,
+            "ttl": {"owm": 600, "wolfram": 1800, "geolocation": 600, "skill_settings": 30}
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("cache") or {}
+    return {"backend": cfg.get("backend", "sqlite"),
+            "path": cfg.get("path"),
+            "max_entries": cfg.get("max_entries", 1000),
+            "ttl": {**DEFAULT_TTL, **(cfg.get("ttl") or {})}}
+
+
+def get_response_cache():
+    """ process-wide response cache, created on first use from mycroft.conf """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cfg = get_cache_config()
+                if cfg["backend"] == "sqlite":
+                    try:
+                        _cache = SQLiteResponseCache(cfg["path"], cfg["max_entries"])
+                    except Exception as e:
+                        LOG.error(f"Failed to open response cache, using in memory cache: {e}")
+                        _cache = MemoryResponseCache(cfg["max_entries"])
+                elif cfg["backend"] in CACHE_BACKENDS:
+                    _cache = CACHE_BACKENDS[cfg["backend"]](max_entries=cfg["max_entries"])
+                else:
+                    _cache = AbstractResponseCache()  # caching disabled
+    return _cache
+
+
+def set_response_cache(cache):
+    """ replace the process-wide response cache, eg. with a custom AbstractResponseCache"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None and _cache is not cache:
+            _cache.close()
+        _cache = cache
+
+
+def _cache_key(func, instance, args, kwargs):
+    # positional and keyword calls with the same values share the same entry
+    try:
+        bound = inspect.signature(func).bind(instance, *args, **kwargs)
+        bound.apply_defaults()
+        call_args = list(bound.arguments.items())[1:]
+    except TypeError:
+        call_args = [list(args), sorted(kwargs.items())]
+    data = [func.__module__, func.__qualname__, getattr(instance, "url", None), call_args]
+    return hashlib.sha256(json.dumps(data, default=str).encode("utf-8")).hexdigest()
+
+
+def _cache_get(namespace, key):
+    try:
+        return get_response_cache().get(namespace, key)
+    except NotImplementedError:
+        return None
+    except Exception as e:
+        LOG.warning(f"response cache read failed: {e}")
+        return None
+
+
+def _cache_set(namespace, key, value, ttl=None):
+    if value is None:
+        return
+    if ttl is None:
+        ttl = get_cache_config()["ttl"].get(namespace, 600)
+    try:
+        get_response_cache().set(namespace, key, value, ttl)
+    except (NotImplementedError, TypeError, ValueError):
+        pass  # caching disabled or value not json serializable
+    except Exception as e:
+        LOG.warning(f"response cache write failed: {e}")
+
+
+def cached_response(namespace, ttl=None):
+    """ decorator caching the return value of api methods in the response cache
+
+    entries are keyed by method, instance url and call arguments, ttl defaults
+    to the configured value for the namespace, coroutine functions are supported
+    """
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                key = _cache_key(func, self, args, kwargs)
+                value = _cache_get(namespace, key)
+                if value is None:
+                    value = await func(self, *args, **kwargs)
+                    _cache_set(namespace, key, value, ttl)
+                return value
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = _cache_key(func, self, args, kwargs)
+            value = _cache_get(namespace, key)
+            if value is None:
+                value = func(self, *args, **kwargs)
+                _cache_set(namespace, key, value, ttl)
+            return value
+
+        return wrapper
+
+    return decorator
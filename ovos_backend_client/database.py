@@ -1,12 +1,18 @@
 import enum
 import json
+import time
 
 from copy import deepcopy
+from itertools import islice
+from os.path import expanduser, join, isfile
 from json_database import JsonStorageXDG, JsonDatabaseXDG
 from ovos_config.config import Configuration
 from ovos_config.locations import get_xdg_config_save_path, get_xdg_cache_save_path
+from ovos_utils.log import LOG
 
 from ovos_backend_client.identity import IdentityManager
+from ovos_backend_client.jsonl import JsonlDatabase
+from ovos_backend_client.sqlite_database import SQLiteRecordingDatabase, SQLiteKeyValueDatabase
 
 
 class AudioTag(str, enum.Enum):
@@ -38,21 +44,22 @@ class DatabaseModel:
 
 
 class MetricModel(DatabaseModel):
-    def __init__(self, metric_id, metric_type, meta=None, uuid="AnonDevice"):
+    def __init__(self, metric_id, metric_type, meta=None, uuid="AnonDevice", timestamp=None):
         if isinstance(meta, str):
             meta = json.loads(meta)
         super().__init__(metric_id=metric_id, metric_type=metric_type,
-                         meta=meta, uuid=uuid)
+                         meta=meta, uuid=uuid, timestamp=timestamp)
 
 
 class WakeWordRecordingModel(DatabaseModel):
     def __init__(self, wakeword_id, transcription, path, meta=None,
-                 uuid="AnonDevice", tag=AudioTag.UNTAGGED, speaker_type=SpeakerTag.UNTAGGED):
+                 uuid="AnonDevice", tag=AudioTag.UNTAGGED, speaker_type=SpeakerTag.UNTAGGED,
+                 timestamp=None):
         if isinstance(meta, str):
             meta = json.loads(meta)
         super().__init__(wakeword_id=wakeword_id, transcription=transcription,
                          path=path, meta=meta or [], uuid=uuid,
-                         tag=tag, speaker_type=speaker_type)
+                         tag=tag, speaker_type=speaker_type, timestamp=timestamp)
 
 
 class UtteranceRecordingModel(DatabaseModel):
@@ -236,18 +243,29 @@ class DeviceModel(DatabaseModel):
         }
 
 
-class JsonMetricDatabase(JsonDatabaseXDG):
-    def __init__(self):
-        super().__init__("ovos_metrics", xdg_folder=get_xdg_cache_save_path())
+def match_record(record, since=None, **filters):
+    """ True if every non None filter equals the record field, since is a minimum timestamp
 
-    def add_metric(self, metric_type=None, meta=None, uuid="AnonDevice"):
-        metric_id = self.total_metrics() + 1
-        metric = MetricModel(metric_id, metric_type, meta, uuid)
-        self.add_item(metric)
-        return metric
+    records created before timestamps were tracked never match since
+    """
+    if since is not None and (record.get("timestamp") is None or record["timestamp"] < since):
+        return False
+    return all(record.get(k) == v for k, v in filters.items() if v is not None)
 
-    def total_metrics(self):
-        return len(self)
+
+class _RecordingDatabase:
+    def page(self, offset=0, limit=None):
+        """ list of at most limit items, starting at position offset """
+        return list(islice(self, offset, None if limit is None else offset + limit))
+
+    def query(self, offset=0, limit=None, since=None, **filters):
+        """ page of the items matching the filters, see match_record """
+        matches = (item for item in self if match_record(item, since, **filters))
+        return list(islice(matches, offset, None if limit is None else offset + limit))
+
+    def _new_id(self, first=0):
+        """ id for the next record, storage engines with stable ids override this """
+        return len(self) + first
 
     def __enter__(self):
         """ Context handler """
@@ -261,19 +279,27 @@ class JsonMetricDatabase(JsonDatabaseXDG):
             print(e)
 
 
-class JsonWakeWordDatabase(JsonDatabaseXDG):
-    def __init__(self):
-        super().__init__("ovos_wakewords", xdg_folder=get_xdg_cache_save_path())
+class MetricDatabaseMixin(_RecordingDatabase):
+    def add_metric(self, metric_type=None, meta=None, uuid="AnonDevice"):
+        metric_id = self._new_id(1)
+        metric = MetricModel(metric_id, metric_type, meta, uuid, timestamp=time.time())
+        self.add_item(metric, allow_duplicates=True)  # ids are unique
+        return metric
 
+    def total_metrics(self):
+        return len(self)
+
+
+class WakeWordDatabaseMixin(_RecordingDatabase):
     def add_wakeword(self, transcription, path, meta=None,
                      uuid="AnonDevice", tag=AudioTag.UNTAGGED,
-                     speaker_type=SpeakerTag.UNTAGGED):
-        wakeword_id = self.total_wakewords()
+                     speaker_type=SpeakerTag.UNTAGGED, timestamp=None):
+        wakeword_id = self._new_id()
         wakeword = WakeWordRecordingModel(wakeword_id,
                                           transcription,
                                           path, meta, uuid,
-                                          tag, speaker_type)
-        self.add_item(wakeword)
+                                          tag, speaker_type, timestamp=timestamp or time.time())
+        self.add_item(wakeword, allow_duplicates=True)
         return wakeword
 
     def get_wakeword(self, rec_id):
@@ -311,27 +337,13 @@ class JsonWakeWordDatabase(JsonDatabaseXDG):
     def total_wakewords(self):
         return len(self)
 
-    def __enter__(self):
-        """ Context handler """
-        return self
-
-    def __exit__(self, _type, value, traceback):
-        """ Commits changes and Closes the session """
-        try:
-            self.commit()
-        except Exception as e:
-            print(e)
-
-
-class JsonUtteranceDatabase(JsonDatabaseXDG):
-    def __init__(self):
-        super().__init__("ovos_utterances", xdg_folder=get_xdg_cache_save_path())
 
+class UtteranceDatabaseMixin(_RecordingDatabase):
     def add_utterance(self, transcription, path, uuid="AnonDevice"):
-        utterance_id = self.total_utterances()
+        utterance_id = self._new_id()
         utterance = UtteranceRecordingModel(utterance_id, transcription,
                                             path, uuid)
-        self.add_item(utterance)
+        self.add_item(utterance, allow_duplicates=True)
 
     def get_utterance(self, rec_id):
         utt = self[rec_id]
@@ -356,25 +368,48 @@ class JsonUtteranceDatabase(JsonDatabaseXDG):
     def total_utterances(self):
         return len(self)
 
-    def __enter__(self):
-        """ Context handler """
-        return self
 
-    def __exit__(self, _type, value, traceback):
-        """ Commits changes and Closes the session """
-        try:
-            self.commit()
-        except Exception as e:
-            print(e)
+class JsonMetricDatabase(MetricDatabaseMixin, JsonDatabaseXDG):
+    def __init__(self):
+        super().__init__("ovos_metrics", xdg_folder=get_xdg_cache_save_path())
 
 
-class OAuthTokenDatabase(JsonStorageXDG):
-    """ This helper class creates ovos-config-assistant/ovos-backend-manager compatible json databases
-        This allows users to use oauth even when not using a backend"""
+class JsonWakeWordDatabase(WakeWordDatabaseMixin, JsonDatabaseXDG):
+    def __init__(self):
+        super().__init__("ovos_wakewords", xdg_folder=get_xdg_cache_save_path())
+
 
+class JsonUtteranceDatabase(UtteranceDatabaseMixin, JsonDatabaseXDG):
     def __init__(self):
-        super().__init__("ovos_oauth", xdg_folder=get_xdg_cache_save_path())
+        super().__init__("ovos_utterances", xdg_folder=get_xdg_cache_save_path())
+
+
+class _JsonlRecordingDatabase(JsonlDatabase):
+    """ append-only log next to the json_database file it replaces, which is imported on first use """
+
+    def __init__(self, name):
+        folder = join(get_xdg_cache_save_path(), "json_database")
+        super().__init__(name, join(folder, f"{name}.jsonl"),
+                         legacy_path=join(folder, f"{name}.jsondb"),
+                         compact_ratio=get_database_config()["compact_ratio"])
+
+
+class JsonlMetricDatabase(MetricDatabaseMixin, _JsonlRecordingDatabase):
+    def __init__(self):
+        super().__init__("ovos_metrics")
+
+
+class JsonlWakeWordDatabase(WakeWordDatabaseMixin, _JsonlRecordingDatabase):
+    def __init__(self):
+        super().__init__("ovos_wakewords")
+
+
+class JsonlUtteranceDatabase(UtteranceDatabaseMixin, _JsonlRecordingDatabase):
+    def __init__(self):
+        super().__init__("ovos_utterances")
 
+
+class OAuthTokenDatabaseMixin:
     def add_token(self, token_id, token_data):
         self[token_id] = token_data
 
@@ -394,13 +429,7 @@ class OAuthTokenDatabase(JsonStorageXDG):
         return len(self)
 
 
-class OAuthApplicationDatabase(JsonStorageXDG):
-    """ This helper class creates ovos-config-assistant/ovos-backend-manager compatible json databases
-        This allows users to use oauth even when not using a backend"""
-
-    def __init__(self):
-        super().__init__("ovos_oauth_apps", xdg_folder=get_xdg_cache_save_path())
-
+class OAuthApplicationDatabaseMixin:
     def add_application(self, oauth_service,
                         client_id, client_secret,
                         auth_endpoint, token_endpoint, callback_endpoint, scope,
@@ -434,3 +463,128 @@ class OAuthApplicationDatabase(JsonStorageXDG):
 
     def total_apps(self):
         return len(self)
+
+
+class OAuthTokenDatabase(OAuthTokenDatabaseMixin, JsonStorageXDG):
+    """ This helper class creates ovos-config-assistant/ovos-backend-manager compatible json databases
+        This allows users to use oauth even when not using a backend"""
+
+    def __init__(self):
+        super().__init__("ovos_oauth", xdg_folder=get_xdg_cache_save_path())
+
+
+class OAuthApplicationDatabase(OAuthApplicationDatabaseMixin, JsonStorageXDG):
+    """ This helper class creates ovos-config-assistant/ovos-backend-manager compatible json databases
+        This allows users to use oauth even when not using a backend"""
+
+    def __init__(self):
+        super().__init__("ovos_oauth_apps", xdg_folder=get_xdg_cache_save_path())
+
+
+class _SQLiteRecordingDatabase(SQLiteRecordingDatabase):
+    """ table of the sqlite database, the jsonl or json_database file it replaces is imported on first use """
+
+    def __init__(self):
+        folder = join(get_xdg_cache_save_path(), "json_database")
+        legacy_path = join(folder, f"{self.TABLE}.jsonl")
+        if not isfile(legacy_path):
+            legacy_path = join(folder, f"{self.TABLE}.jsondb")
+        super().__init__(get_database_config()["path"], legacy_path=legacy_path)
+
+
+# storage first in the mro, ids come from MAX(id) and failed transactions are rolled back
+class SQLiteMetricDatabase(_SQLiteRecordingDatabase, MetricDatabaseMixin):
+    TABLE = "ovos_metrics"
+    ID_FIELD = "metric_id"
+    INDEXES = ("uuid", "metric_type", "timestamp")
+
+
+class SQLiteWakeWordDatabase(_SQLiteRecordingDatabase, WakeWordDatabaseMixin):
+    TABLE = "ovos_wakewords"
+    ID_FIELD = "wakeword_id"
+    INDEXES = ("uuid", "tag", "speaker_type", "transcription", "timestamp")
+
+
+class SQLiteUtteranceDatabase(_SQLiteRecordingDatabase, UtteranceDatabaseMixin):
+    TABLE = "ovos_utterances"
+    ID_FIELD = "utterance_id"
+    INDEXES = ("uuid", "transcription")
+
+
+class _SQLiteKeyValueDatabase(SQLiteKeyValueDatabase):
+    def __init__(self):
+        super().__init__(get_database_config()["path"],
+                         legacy_path=join(get_xdg_cache_save_path(), "json_database", f"{self.TABLE}.json"))
+
+
+class SQLiteOAuthTokenDatabase(OAuthTokenDatabaseMixin, _SQLiteKeyValueDatabase):
+    TABLE = "ovos_oauth"
+
+
+class SQLiteOAuthApplicationDatabase(OAuthApplicationDatabaseMixin, _SQLiteKeyValueDatabase):
+    TABLE = "ovos_oauth_apps"
+
+
+DATABASE_ENGINES = {
+    "json": {"metrics": JsonMetricDatabase,
+             "wakewords": JsonWakeWordDatabase,
+             "utterances": JsonUtteranceDatabase,
+             "oauth_tokens": OAuthTokenDatabase,
+             "oauth_apps": OAuthApplicationDatabase},
+    "jsonl": {"metrics": JsonlMetricDatabase,
+              "wakewords": JsonlWakeWordDatabase,
+              "utterances": JsonlUtteranceDatabase,
+              "oauth_tokens": OAuthTokenDatabase,
+              "oauth_apps": OAuthApplicationDatabase},
+    "sqlite": {"metrics": SQLiteMetricDatabase,
+               "wakewords": SQLiteWakeWordDatabase,
+               "utterances": SQLiteUtteranceDatabase,
+               "oauth_tokens": SQLiteOAuthTokenDatabase,
+               "oauth_apps": SQLiteOAuthApplicationDatabase}
+}
+
+
+def get_database_config():
+    """ storage engine of the metrics/wake word/utterance/oauth databases, from mycroft.conf
+
+    "server": {
+        "database": {
+            "engine": "json",  // "json" rewrites the whole file on commit, "jsonl" appends to a log, "sqlite" uses WAL
+            "compact_ratio": 2.0,  // jsonl only, log operations per item before it is compacted
+            "path": "~/.cache/mycroft/ovos_backend.db"  // sqlite only
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("database") or {}
+    engine = cfg.get("engine", "json")
+    if engine not in DATABASE_ENGINES:
+        LOG.error(f"unknown database engine '{engine}', falling back to json")
+        engine = "json"
+    return {"engine": engine,
+            "compact_ratio": cfg.get("compact_ratio", 2.0),
+            "path": expanduser(cfg.get("path") or join(get_xdg_cache_save_path(), "ovos_backend.db"))}
+
+
+def get_metric_database():
+    """ metrics database of the configured engine """
+    return DATABASE_ENGINES[get_database_config()["engine"]]["metrics"]()
+
+
+def get_wakeword_database():
+    """ wake word recordings database of the configured engine """
+    return DATABASE_ENGINES[get_database_config()["engine"]]["wakewords"]()
+
+
+def get_utterance_database():
+    """ utterance recordings database of the configured engine """
+    return DATABASE_ENGINES[get_database_config()["engine"]]["utterances"]()
+
+
+def get_oauth_token_database():
+    """ oauth tokens database of the configured engine """
+    return DATABASE_ENGINES[get_database_config()["engine"]]["oauth_tokens"]()
+
+
+def get_oauth_app_database():
+    """ oauth applications database of the configured engine """
+    return DATABASE_ENGINES[get_database_config()["engine"]]["oauth_apps"]()
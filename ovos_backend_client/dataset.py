@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import time
+from io import BytesIO
+from os.path import basename, splitext
+from tempfile import SpooledTemporaryFile
+from threading import Thread
+from uuid import uuid4
+
+from ovos_config.config import Configuration
+from ovos_config.locations import get_xdg_data_save_path
+from ovos_utils.log import LOG
+
+from ovos_backend_client.blobs import get_blob_store, release_recording, save_recording
+from ovos_backend_client.database import get_wakeword_database, get_utterance_database
+
+DATASETS = ("wakewords", "utterances")
+
+# parallel compressors, tarfile compresses in a single thread when they are missing
+COMPRESSORS = {"gz": ["pigz", "-c"],
+               "xz": ["xz", "-T0", "-c"]}
+
+
+def _database(kind):
+    if kind == "wakewords":
+        return get_wakeword_database()
+    if kind == "utterances":
+        return get_utterance_database()
+    raise ValueError(f"unknown dataset '{kind}', expected one of {DATASETS}")
+
+
+def _record_id(kind, record):
+    return record["wakeword_id" if kind == "wakewords" else "utterance_id"]
+
+
+def _discard_recording(path):
+    """ delete audio saved for a record that was rolled back """
+    store = get_blob_store()
+    if store is not None and store.digest_of(path):
+        release_recording(path)
+        return
+    try:
+        os.remove(path)
+    except OSError as e:
+        LOG.warning(f"failed to remove {path}: {e}")
+
+
+class _TarWriter:
+    """ streaming tar writer, piped through an external multi-threaded compressor if installed """
+
+    def __init__(self, fileobj, compression=None):
+        self._proc = self._pump = None
+        if compression and compression not in COMPRESSORS:
+            raise ValueError(f"unsupported compression '{compression}', expected one of {list(COMPRESSORS)}")
+        cmd = COMPRESSORS.get(compression)
+        if cmd and shutil.which(cmd[0]):
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._pump = Thread(target=shutil.copyfileobj, args=(self._proc.stdout, fileobj), daemon=True)
+            self._pump.start()
+            self.tar = tarfile.open(fileobj=self._proc.stdin, mode="w|")
+        else:
+            self.tar = tarfile.open(fileobj=fileobj, mode=f"w|{compression or ''}")
+
+    def add(self, name, fileobj, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        self.tar.addfile(info, fileobj)
+
+    def add_bytes(self, name, data):
+        self.add(name, BytesIO(data), len(data))
+
+    def close(self):
+        self.tar.close()
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._pump.join()
+            if self._proc.wait() != 0:
+                raise RuntimeError(f"compressor exited with code {self._proc.returncode}")
+
+
+def export_dataset(dst, datasets=DATASETS, compression=None):
+    """ stream the local recording databases into a tar archive
+
+    every recording is stored as <dataset>/<id>.json (the database record) followed by its audio,
+    <dataset>/<id>.wav (or .flac), so consumers can pair samples without buffering, WebDataset style.
+    a <dataset>.jsonl with every record and the name of its audio member closes each dataset
+
+    audio is copied straight from disk in chunks and the jsonl index is spooled to a temporary
+    file, memory use does not depend on the dataset size
+
+    Args:
+        dst (str|file): output path or binary file object
+        datasets (tuple): any of "wakewords", "utterances"
+        compression (str): None, "gz" or "xz", pigz/xz compress in parallel when installed
+
+    Returns:
+        int: number of recordings exported
+    """
+    if isinstance(dst, str):
+        with open(dst, "wb") as f:
+            return export_dataset(f, datasets, compression)
+    writer = _TarWriter(dst, compression)
+    total = 0
+    ok = False
+    try:
+        for kind in datasets:
+            with SpooledTemporaryFile(max_size=1024 * 1024) as index:
+                for record in _database(kind):
+                    key = f"{kind}/{_record_id(kind, record):08d}"
+                    audio = f"{key}{splitext(record['path'])[1] or '.wav'}"
+                    try:
+                        f = open(record["path"], "rb")
+                    except OSError as e:
+                        LOG.warning(f"skipping {key}, audio unavailable: {e}")
+                        continue
+                    with f:
+                        writer.add_bytes(f"{key}.json", json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                        writer.add(audio, f, os.fstat(f.fileno()).st_size)
+                    index.write(json.dumps(dict(record, audio=audio), ensure_ascii=False).encode("utf-8") + b"\n")
+                    total += 1
+                size = index.tell()
+                index.seek(0)
+                writer.add(f"{kind}.jsonl", index, size)
+        ok = True
+    finally:
+        try:
+            writer.close()
+        except Exception as e:
+            if ok:
+                raise
+            LOG.error(f"failed to close the archive after an export error: {e}")
+    return total
+
+
+def import_dataset(src, uuid=None):
+    """ add the recordings of an export_dataset archive to the local databases
+
+    the archive is read as a stream, one recording in memory at a time. audio is saved like
+    uploaded recordings (blob store or listener save_path) and every database is committed
+    once, when the archive moves on to the next dataset (sqlite allows a single writer).
+    recordings get new ids, everything else in the record is kept. metadata members must be
+    directly followed by their audio, like export_dataset writes them, orphaned ones are skipped
+
+    each dataset is committed separately, if the import fails only the dataset being read is
+    rolled back, along with the audio saved for it, datasets already committed are kept
+
+    Args:
+        src (str|file): archive path or binary file object, compression is detected
+        uuid (str): device uuid for the imported records, default keeps the original
+
+    Returns:
+        int: number of recordings imported
+    """
+    if isinstance(src, str):
+        with open(src, "rb") as f:
+            return import_dataset(f, uuid)
+    listener = Configuration().get("listener", {})
+    save_paths = {"wakewords": listener.get("save_path") or f"{get_xdg_data_save_path()}/listener/wake_words",
+                  "utterances": listener.get("save_path") or f"{get_xdg_data_save_path()}/listener/utterances"}
+    db = current = None
+    pending = None  # (kind, key, record) waiting for its audio
+    saved = []  # audio of the records not committed yet
+    total = 0
+    try:
+        with tarfile.open(fileobj=src, mode="r|*") as tar:
+            for member in tar:
+                kind, _, name = member.name.partition("/")
+                if not member.isfile() or kind not in DATASETS or not name:
+                    continue
+                key, ext = splitext(name)
+                data = tar.extractfile(member).read()
+                if pending is not None and pending[:2] != (kind, key):
+                    LOG.warning(f"skipping {pending[0]}/{pending[1]}.json, no audio")
+                    pending = None
+                if ext == ".json":
+                    pending = (kind, key, json.loads(data))
+                    continue
+                if pending is None:
+                    LOG.warning(f"skipping {member.name}, no metadata")
+                    continue
+                record, pending = pending[2], None
+                if kind != current:
+                    if db is not None:
+                        db.commit()
+                        saved = []
+                    db, current = _database(kind), kind
+                stem = splitext(basename(record.get("path") or key))[0]
+                path = save_recording(data, save_paths[kind], f"{stem}_{uuid4().hex[:8]}", ext.lstrip(".") or "wav")
+                saved.append(path)
+                if kind == "wakewords":
+                    db.add_wakeword(record.get("transcription"), path, record.get("meta"),
+                                    uuid or record.get("uuid", "AnonDevice"),
+                                    record.get("tag", "untagged"), record.get("speaker_type", "untagged"),
+                                    timestamp=record.get("timestamp"))
+                else:
+                    db.add_utterance(record.get("transcription"), path, uuid or record.get("uuid", "AnonDevice"))
+                total += 1
+    except Exception:
+        if db is not None:
+            db.reset()
+        for path in saved:
+            _discard_recording(path)
+        raise
+    if db is not None:
+        db.commit()
+    return total
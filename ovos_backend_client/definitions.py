@@ -0,0 +1,88 @@
+import os
+import time
+from copy import deepcopy
+from threading import Lock
+
+
+class DefinitionsCatalog:
+    """ dict index of the wake word / voice definitions stored in an OPM config folder
+
+    load_func scans the plugins and the folder, that only happens again when a file in the
+    folder or in one of its language subfolders is added, removed or modified (mtimes of the
+    directories and of every definition file) or after invalidate is called
+
+    the folder is stat'ed at most once every rescan_interval seconds, lookups in between
+    are served from memory, so changes on disk are picked up with that much delay
+
+    results are copies, callers are free to modify them
+
+    Args:
+        folder (str): OPM config folder, eg. ~/.local/share/OPM/ww_configs
+        load_func (callable): returns a {definition_id: definition} dict
+        rescan_interval (float): min seconds between checks of the folder for changes
+    """
+
+    def __init__(self, folder, load_func, rescan_interval=1):
+        self.folder = folder
+        self.load_func = load_func
+        self.rescan_interval = rescan_interval
+        self._index = None
+        self._fingerprint = None
+        self._scanned_at = 0
+        self._lock = Lock()
+
+    def _scan(self):
+        """ mtimes of the folder, its language subfolders and the definition files in them """
+        try:
+            mtimes = []
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    mtimes.append((entry.name, entry.stat().st_mtime_ns))
+                    if entry.is_dir():
+                        with os.scandir(entry.path) as files:
+                            mtimes += [(f"{entry.name}/{f.name}", f.stat().st_mtime_ns) for f in files]
+            return [os.stat(self.folder).st_mtime_ns] + sorted(mtimes)
+        except OSError:
+            return None
+
+    def _get_index(self):
+        index = self._index
+        if index is not None and time.monotonic() - self._scanned_at < self.rescan_interval:
+            return index
+        fingerprint = self._scan()
+        self._scanned_at = time.monotonic()
+        if index is None or fingerprint != self._fingerprint:
+            with self._lock:
+                index = self._index = self.load_func()
+                self._fingerprint = fingerprint
+        return index
+
+    def invalidate(self):
+        """ reload on next access, eg. after a change within the filesystem mtime resolution """
+        self._index = None
+
+    def get(self, definition_id, default=None):
+        definition = self._get_index().get(definition_id)
+        return default if definition is None else deepcopy(definition)
+
+    def values(self):
+        return deepcopy(list(self._get_index().values()))
+
+    def __contains__(self, definition_id):
+        return definition_id in self._get_index()
+
+    def __len__(self):
+        return len(self._get_index())
+
+
+_catalogs = {}
+_catalogs_lock = Lock()
+
+
+def get_definitions_catalog(folder, load_func):
+    """ process wide DefinitionsCatalog of a folder, load_func is used when it is created """
+    if folder not in _catalogs:
+        with _catalogs_lock:
+            if folder not in _catalogs:
+                _catalogs[folder] = DefinitionsCatalog(folder, load_func)
+    return _catalogs[folder]
@@ -8,3 +8,7 @@ class BackendDown(RequestException):
 
 class InternetDown(RequestException):
     pass
+
+
+class STTQueueFull(RuntimeError):
+    """ the STT dispatcher is saturated, retry later """
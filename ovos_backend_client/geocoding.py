@@ -0,0 +1,405 @@
+import hashlib
+import math
+import mmap
+import os
+import re
+import unicodedata
+from array import array
+from os.path import isfile, join
+from threading import Lock
+
+from ovos_config.config import Configuration
+from ovos_config.locations import get_xdg_cache_save_path
+from ovos_utils.log import LOG
+
+
+def normalize_place_name(name):
+    """ lowercase, strip accents and punctuation, eg. "São Paulo!" -> "sao paulo" """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+
+def _to_xyz(lat, lon):
+    """ project a coordinate onto the unit sphere, euclidean distance between
+    projected points grows with the great circle distance """
+    lat, lon = math.radians(float(lat)), math.radians(float(lon))
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat)
+
+
+class Gazetteer:
+    """ places loaded from GeoNames dump files, stored column-wise in flat arrays
+
+    Args:
+        cities_file (str): GeoNames cities file, eg. cities15000.txt from
+                           https://download.geonames.org/export/dump/
+        admin1_file (str): optional admin1CodesASCII.txt, state names
+        countries_file (str): optional countryInfo.txt, country names
+    """
+
+    def __init__(self, cities_file, admin1_file=None, countries_file=None):
+        self.path = cities_file
+        self.names = []
+        self.country_codes = []
+        self.admin1_codes = []
+        self.timezones = []
+        self.lats = array("d")
+        self.lons = array("d")
+        self.populations = array("q")
+        self.admin1_names = {}
+        self.country_names = {}
+        self._load_cities(cities_file)
+        if admin1_file and isfile(admin1_file):
+            self._load_admin1(admin1_file)
+        if countries_file and isfile(countries_file):
+            self._load_countries(countries_file)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _load_cities(self, path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 18:
+                    continue
+                self.names.append(cols[1])
+                self.lats.append(float(cols[4]))
+                self.lons.append(float(cols[5]))
+                self.country_codes.append(cols[8])
+                self.admin1_codes.append(cols[10])
+                self.populations.append(int(cols[14] or 0))
+                self.timezones.append(cols[17])
+
+    def _load_admin1(self, path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) >= 2:
+                    self.admin1_names[cols[0]] = cols[1]
+
+    def _load_countries(self, path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) >= 5:
+                    self.country_names[cols[0]] = cols[4]
+
+    def location(self, idx, lat=None, lon=None):
+        """ place at idx in the location dict format returned by the geolocation apis """
+        cc = self.country_codes[idx]
+        admin1 = self.admin1_codes[idx]
+        state = self.admin1_names.get(f"{cc}.{admin1}", "")
+        country = self.country_names.get(cc, "")
+        tz = self.timezones[idx]
+        location = {
+            "address": ", ".join(n for n in (self.names[idx], state, country) if n),
+            "city": {
+                "code": "",
+                "name": self.names[idx],
+                "state": {
+                    "code": admin1,
+                    "name": state,
+                    "country": {
+                        "code": cc.upper(),
+                        "name": country
+                    }
+                }
+            },
+            "coordinate": {
+                "latitude": self.lats[idx] if lat is None else lat,
+                "longitude": self.lons[idx] if lon is None else lon
+            }
+        }
+        if tz:
+            location["timezone"] = {"name": tz.replace("/", " "), "code": tz}
+        return location
+
+
+class KDTree:
+    """ static 3d KD-tree stored implicitly in a permutation array
+
+    every [lo, hi) segment of the permutation is a subtree with its root at the
+    middle index, so no node objects are allocated
+    """
+
+    def __init__(self, points):
+        self.points = array("d")
+        for p in points:
+            self.points.extend(p)
+        n = len(self.points) // 3
+        idx = list(range(n))
+        self._build(idx, 0, n, 0)
+        self.perm = array("i", idx)
+
+    def __len__(self):
+        return len(self.perm)
+
+    def _build(self, idx, lo, hi, axis):
+        # iterative to avoid deep recursion on large gazetteers
+        stack = [(lo, hi, axis)]
+        pts = self.points
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= 1:
+                continue
+            idx[lo:hi] = sorted(idx[lo:hi], key=lambda i: pts[3 * i + axis])
+            mid = (lo + hi) // 2
+            nxt = (axis + 1) % 3
+            stack.append((lo, mid, nxt))
+            stack.append((mid + 1, hi, nxt))
+
+    def nearest(self, point):
+        """ index of the point closest to point, -1 if the tree is empty """
+        n = len(self.perm)
+        if not n:
+            return -1
+        pts, perm = self.points, self.perm
+        q = point
+        x, y, z = point
+        best, best_d = -1, float("inf")
+        stack = [(0, n, 0)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            lo, hi, axis = pop()
+            mid = (lo + hi) >> 1
+            i = perm[mid]
+            j = 3 * i
+            dx, dy, dz = pts[j] - x, pts[j + 1] - y, pts[j + 2] - z
+            d = dx * dx + dy * dy + dz * dz
+            if d < best_d:
+                best, best_d = i, d
+            diff = pts[j + axis] - q[axis]
+            nxt = axis + 1 if axis < 2 else 0
+            # diff > 0 means the query point is on the "low" side of the split
+            if diff > 0:
+                if diff * diff < best_d and mid + 1 < hi:
+                    push((mid + 1, hi, nxt))
+                if lo < mid:
+                    push((lo, mid, nxt))
+            else:
+                if diff * diff < best_d and lo < mid:
+                    push((lo, mid, nxt))
+                if mid + 1 < hi:
+                    push((mid + 1, hi, nxt))
+        return best
+
+
+class ReverseGeocoder:
+    """ nearest city lookups over a local gazetteer, no network involved """
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+        self.tree = KDTree(_to_xyz(lat, lon) for lat, lon in zip(gazetteer.lats, gazetteer.lons))
+
+    def nearest(self, lat, lon):
+        """ gazetteer index of the closest place """
+        return self.tree.nearest(_to_xyz(lat, lon))
+
+    def reverse(self, lat, lon):
+        """ location dict for the closest place, None if the gazetteer is empty """
+        idx = self.nearest(lat, lon)
+        if idx < 0:
+            return None
+        return self.gazetteer.location(idx, lat, lon)
+
+
+class PlaceIndex:
+    """ sorted "normalized name<TAB>gazetteer index" lines in a memory-mapped file
+
+    exact and prefix lookups are a binary search over the mapped bytes, the
+    pages are shared between processes by the OS page cache and nothing is
+    loaded into the python heap
+
+    Args:
+        path (str): index file, see PlaceIndex.build
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.fstat(self._file.fileno()).st_size else b""
+
+    @staticmethod
+    def build(gazetteer, path):
+        """ write the index for a gazetteer, atomically replacing path """
+        lines = set()
+        for idx, name in enumerate(gazetteer.names):
+            norm = normalize_place_name(name)
+            if norm:
+                lines.add(f"{norm}\t{idx}\n".encode("utf-8"))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.writelines(sorted(lines))
+        os.replace(tmp, path)
+        return PlaceIndex(path)
+
+    def _lower_bound(self, key):
+        """ offset of the first line >= key """
+        mm = self._mm
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if mm[start:end] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def prefix(self, prefix, limit=None):
+        """ gazetteer indexes of places whose normalized name starts with prefix """
+        key = prefix.encode("utf-8")
+        mm = self._mm
+        pos = self._lower_bound(key)
+        results = []
+        while pos < len(mm) and (limit is None or len(results) < limit):
+            end = mm.find(b"\n", pos)
+            line = mm[pos:end]
+            if not line.startswith(key):
+                break
+            results.append(int(line.rsplit(b"\t", 1)[1]))
+            pos = end + 1
+        return results
+
+    def lookup(self, name):
+        """ gazetteer indexes of places named exactly name (normalized) """
+        return self.prefix(f"{name}\t")
+
+    def close(self):
+        if self._mm:
+            self._mm.close()
+        self._file.close()
+
+
+class ForwardGeocoder:
+    """ place name -> location lookups over a local gazetteer
+
+    queries are split into a place name followed by optional qualifiers,
+    eg. "Kansas City Missouri" -> "kansas city" in state "missouri", the most
+    populated place matching every qualifier wins
+
+    Args:
+        gazetteer (Gazetteer): places to search
+        index_path (str): where to store the memory-mapped name index, by default
+                          in the XDG cache dir, rebuilt if the cities file changes
+    """
+
+    def __init__(self, gazetteer, index_path=None):
+        self.gazetteer = gazetteer
+        if not index_path:
+            st = os.stat(gazetteer.path)
+            digest = hashlib.md5(f"{os.path.abspath(gazetteer.path)}{st.st_size}{st.st_mtime_ns}".encode()
+                                 ).hexdigest()
+            index_path = join(get_xdg_cache_save_path("ovos_backend_client"), f"places_{digest}.idx")
+        if isfile(index_path):
+            self.index = PlaceIndex(index_path)
+        else:
+            os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+            self.index = PlaceIndex.build(gazetteer, index_path)
+
+    def _qualifiers(self, idx):
+        g = self.gazetteer
+        cc = g.country_codes[idx]
+        admin1 = g.admin1_codes[idx]
+        words = [cc, admin1,
+                 g.admin1_names.get(f"{cc}.{admin1}", ""),
+                 g.country_names.get(cc, "")]
+        return " " + " ".join(normalize_place_name(w) for w in words if w) + " "
+
+    def search(self, query):
+        """ gazetteer index of the best match for query, -1 on a miss """
+        tokens = normalize_place_name(query).split()
+        # longest leading run of tokens naming a place, the rest must qualify it
+        for k in range(len(tokens), 0, -1):
+            candidates = self.index.lookup(" ".join(tokens[:k]))
+            if not candidates:
+                continue
+            rest = tokens[k:]
+            if rest:
+                candidates = [i for i, q in ((i, self._qualifiers(i)) for i in candidates)
+                              if all(f" {t} " in q for t in rest)]
+            if candidates:
+                return max(candidates, key=lambda i: self.gazetteer.populations[i])
+        return -1
+
+    def geocode(self, query):
+        """ location dict for query, None on a miss """
+        idx = self.search(query)
+        if idx < 0:
+            return None
+        return self.gazetteer.location(idx)
+
+
+def get_geocoder_config():
+    """ local geocoding settings from mycroft.conf
+
+    "server": {
+        "geocoder": {
+            // "local" answers geolocation from a GeoNames dump,
+            // nominatim is only queried when a place name is not found
+            "engine": "nominatim",
+            "cities_file": "/path/to/cities15000.txt",
+            "admin1_file": "/path/to/admin1CodesASCII.txt",
+            "countries_file": "/path/to/countryInfo.txt"
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("geocoder") or {}
+    return {"engine": cfg.get("engine", "nominatim"),
+            "cities_file": cfg.get("cities_file"),
+            "admin1_file": cfg.get("admin1_file"),
+            "countries_file": cfg.get("countries_file")}
+
+
+_gazetteer = None
+_reverse_geocoder = None
+_forward_geocoder = None
+_geocoder_lock = Lock()
+
+
+def get_gazetteer():
+    """ process-wide Gazetteer, None unless the local engine is configured """
+    global _gazetteer
+    if _gazetteer is None:
+        cfg = get_geocoder_config()
+        if cfg["engine"] != "local":
+            return None
+        with _geocoder_lock:
+            if _gazetteer is None:
+                if not cfg["cities_file"] or not isfile(cfg["cities_file"]):
+                    LOG.error(f"local geocoder enabled but cities file not found: {cfg['cities_file']}")
+                    return None
+                _gazetteer = Gazetteer(cfg["cities_file"], cfg["admin1_file"], cfg["countries_file"])
+    return _gazetteer
+
+
+def get_reverse_geocoder():
+    """ process-wide ReverseGeocoder, None unless the local engine is configured """
+    global _reverse_geocoder
+    if _reverse_geocoder is None:
+        gazetteer = get_gazetteer()
+        if gazetteer is None:
+            return None
+        with _geocoder_lock:
+            if _reverse_geocoder is None:
+                _reverse_geocoder = ReverseGeocoder(gazetteer)
+    return _reverse_geocoder
+
+
+def get_forward_geocoder():
+    """ process-wide ForwardGeocoder, None unless the local engine is configured """
+    global _forward_geocoder
+    if _forward_geocoder is None:
+        gazetteer = get_gazetteer()
+        if gazetteer is None:
+            return None
+        with _geocoder_lock:
+            if _forward_geocoder is None:
+                _forward_geocoder = ForwardGeocoder(gazetteer)
+    return _forward_geocoder
@@ -1,9 +1,11 @@
 import json
 import os
+import random
 import shutil
 import time
 from os.path import isfile, dirname, expanduser
 from tempfile import tempdir
+from threading import Event, Lock, Timer
 
 from combo_lock import ComboLock
 from ovos_config.config import get_xdg_config_save_path
@@ -52,8 +54,9 @@ class DeviceIdentity:
         self.refresh = kwargs.get("refresh", "")
         self.expires_at = kwargs.get("expires_at", -1)
 
-    def is_expired(self):
-        return self.refresh and 0 < self.expires_at <= time.time()
+    def is_expired(self, margin=0):
+        """ margin (seconds) allows checking if the token will expire soon """
+        return self.refresh and 0 < self.expires_at <= time.time() + margin
 
     def has_refresh(self):
         return self.refresh != ""
@@ -63,9 +66,27 @@ class IdentityManager:
     IDENTITY_FILE = f"{get_xdg_config_save_path()}/identity/identity2.json"
     OLD_IDENTITY_FILE = expanduser(f"~/.{get_xdg_base()}/identity/identity2.json")
     __identity = None
+    # (path, inode, mtime, size) of the identity file when __identity was last synced with it
+    __signature = None
+
+    @staticmethod
+    def _file_signature():
+        try:
+            st = os.stat(IdentityManager.IDENTITY_FILE)
+        except OSError:
+            return IdentityManager.IDENTITY_FILE, None
+        return IdentityManager.IDENTITY_FILE, st.st_ino, st.st_mtime_ns, st.st_size
+
+    @staticmethod
+    def is_stale():
+        """ True if the identity file changed on disk (or was replaced) since it was last loaded/saved """
+        return IdentityManager.__identity is None or \
+            IdentityManager.__signature != IdentityManager._file_signature()
 
     @classmethod
     def set_identity_file(cls, identity_path):
+        if identity_path == cls.IDENTITY_FILE and not cls.is_stale():
+            return  # cached identity is still valid, avoid locking and re-reading the file
         cls.IDENTITY_FILE = identity_path
         cls.load()
 
@@ -75,6 +96,7 @@ class IdentityManager:
                 not isfile(IdentityManager.IDENTITY_FILE):
             os.makedirs(dirname(IdentityManager.IDENTITY_FILE), exist_ok=True)
             shutil.move(IdentityManager.OLD_IDENTITY_FILE, IdentityManager.IDENTITY_FILE)
+        IdentityManager.__signature = IdentityManager._file_signature()
         if isfile(IdentityManager.IDENTITY_FILE):
             LOG.debug(f'Loading identity: {IdentityManager.IDENTITY_FILE}')
             try:
@@ -90,7 +112,7 @@ class IdentityManager:
         try:
             if lock:
                 identity_lock.acquire()
-                IdentityManager._load()
+            IdentityManager._load()
         finally:
             if lock:
                 identity_lock.release()
@@ -111,6 +133,7 @@ class IdentityManager:
                 json.dump(IdentityManager.__identity.__dict__, f)
                 f.flush()
                 os.fsync(f.fileno())
+            IdentityManager.__signature = IdentityManager._file_signature()
         finally:
             if lock:
                 identity_lock.release()
@@ -120,6 +143,8 @@ class IdentityManager:
         LOG.debug('Updating identity')
         login = login or {}
         expiration = login.get("expiration", -1)
+        if IdentityManager.__identity is None:
+            IdentityManager.__identity = DeviceIdentity()
         IdentityManager.__identity.uuid = login.get("uuid", "")
         IdentityManager.__identity.access = login.get("accessToken", "")
         IdentityManager.__identity.refresh = login.get("refreshToken", "")
@@ -140,6 +165,115 @@ class IdentityManager:
 
     @staticmethod
     def get():
-        if not IdentityManager.__identity:
+        """ return the cached identity, only reloading under the file lock if the file changed on disk """
+        if IdentityManager.is_stale():
             IdentityManager.load()
         return IdentityManager.__identity
+
+
+class TokenRefresher:
+    """ keeps the device access token fresh
+
+    - the token is renewed on a background timer ahead of expires_at (margin + random jitter),
+      so requests do not pay the refresh latency inline
+    - concurrent refresh attempts are coalesced, the first caller performs the
+      request and everyone else waits for its result
+    - across processes the identity file lock is held while refreshing and the file is
+      re-read first, if another process already refreshed the token the request is skipped
+
+    Args:
+        refresh_func (callable): receives the current DeviceIdentity and returns the
+                                 login dict to be saved, eg. the /auth/token response
+        margin (float): seconds before expiration when the token is renewed
+        jitter (float): max random seconds subtracted from the scheduled refresh, so
+                        many devices/processes do not refresh at the same instant
+    """
+    retry_delay = 10  # seconds before the background refresh is retried after a failure
+
+    def __init__(self, refresh_func, margin=60, jitter=30):
+        self.refresh_func = refresh_func
+        self.margin = margin
+        self.jitter = jitter
+        self._lock = Lock()
+        self._inflight = None  # Event set once the ongoing refresh completes
+        self._timer = None
+        self._scheduled_for = None  # expires_at the current timer was scheduled for
+
+    def needs_refresh(self, identity=None, margin=None):
+        identity = identity or IdentityManager.get()
+        return bool(identity.is_expired(margin=self.margin if margin is None else margin))
+
+    def refresh(self, timeout=15, margin=None):
+        """ refresh the token, or wait for the refresh already in flight
+
+        Args:
+            timeout (float): max seconds to wait for a refresh started by another thread
+            margin (float): seconds before expiration when the token is considered stale,
+                            defaults to self.margin
+        """
+        with self._lock:
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = self._inflight = Event()
+        if not leader:
+            event.wait(timeout)
+            return
+        failed = False
+        try:
+            with identity_lock:
+                identity = IdentityManager.load(lock=False)
+                if self.needs_refresh(identity, margin):  # else another process already did it
+                    data = self.refresh_func(identity)
+                    IdentityManager.save(data, lock=False)
+                    LOG.debug('Saved credentials')
+        except Exception as e:
+            LOG.warning(f"Failed to refresh access token: {e}")
+            failed = True
+        finally:
+            with self._lock:
+                self._inflight = None
+            event.set()
+        self.schedule(min_delay=self.retry_delay if failed else 0)
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None  # this thread is still alive, do not block rescheduling
+            self._scheduled_for = None
+        # the timer fired up to margin + jitter seconds before expiration
+        self.refresh(margin=self.margin + self.jitter)
+
+    def schedule(self, min_delay=0):
+        """ (re)schedule the background refresh for the current identity, if needed
+
+        Args:
+            min_delay (float): lower bound of the delay, used to back off after a failed refresh
+        """
+        identity = IdentityManager.get()
+        if not identity.refresh or identity.expires_at <= 0:
+            return
+        with self._lock:
+            if self._scheduled_for == identity.expires_at and self._timer and self._timer.is_alive():
+                return  # already scheduled
+            if self._timer:
+                self._timer.cancel()
+            delay = identity.expires_at - time.time() - self.margin - random.uniform(0, self.jitter)
+            self._timer = Timer(max(delay, min_delay), self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+            self._scheduled_for = identity.expires_at
+
+    def check(self):
+        """ called before every request, only blocks if the token already expired """
+        identity = IdentityManager.get()
+        if identity.is_expired():
+            self.refresh()
+        else:
+            self.schedule()
+
+    def shutdown(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            self._timer = None
+            self._scheduled_for = None
@@ -0,0 +1,318 @@
+import json
+import os
+from contextlib import contextmanager
+from copy import deepcopy
+from os.path import dirname, isfile
+from threading import Lock
+
+from combo_lock import ComboLock
+from ovos_utils.log import LOG
+
+FORMAT = "ovos-jsonl"
+VERSION = 1
+
+# on-disk format migrations, MIGRATIONS[v](items) -> items in format v + 1
+MIGRATIONS = {}
+
+# path -> (inode, offset, version, ops, items) of the last load, later loads only read the tail
+# items is a tuple shared by every instance of the path, its dicts are never modified or handed out
+_loaded = {}
+_loaded_lock = Lock()
+
+# path -> ComboLock serializing writers of a log, across threads and processes
+_locks = {}
+
+
+def jsonify(value):
+    """ json compatible copy of an item, objects are stored as their __dict__
+
+    unlike json_database.utils.jsonify_recursively str enums (eg. AudioTag) are kept as strings
+    """
+    return json.loads(json.dumps(value, default=lambda o: o.__dict__, ensure_ascii=False))
+
+
+class JsonlDatabase:
+    """ append-only log storage with the item api of json_database.JsonDatabase
+
+    the first line is a header with the format version, every other line is one operation
+    ({"op": "add", "item": {...}}, {"op": "set", "id": 0, "item": {...}} or {"op": "del", "id": 0})
+    replayed in order on load. commit only appends the operations done since the last commit,
+    so inserting is O(1) regardless of the database size
+
+    every process keeps the state it last read, loading again only reads the lines appended
+    since. instances share that state until they modify it, opening a database does not copy
+    it and reads return copies of the items, changes are private to the instance until commit.
+    once the log holds compact_ratio times more operations than items it is rewritten as a snapshot
+
+    writers hold <path>.lock while committing, the lines other processes appended meanwhile
+    are read first and the pending operations replayed on top of them. set/del operations
+    follow their item if its position changed and are dropped if another process deleted it
+
+    item ids are list indexes, as in json_database, deleting an item shifts the ones after it
+
+    Args:
+        name (str): database name
+        path (str): log file path
+        legacy_path (str): json_database file imported when the log does not exist yet
+        compact_ratio (float): operations per item that trigger a compaction on commit
+    """
+
+    def __init__(self, name, path, legacy_path=None, compact_ratio=2.0):
+        self.name = name
+        self.path = path
+        self.legacy_path = legacy_path
+        self.compact_ratio = compact_ratio
+        self._items = []
+        self._pending = []  # (operation, previous item) not committed yet
+        self._ops = 0  # operations in the log file
+        self._lock_held = False
+        self._load()
+
+    # storage
+    @contextmanager
+    def _locked(self):
+        """ inter-process write lock of the log, reentrant for this instance """
+        if self._lock_held:
+            yield
+            return
+        with _loaded_lock:
+            if self.path not in _locks:
+                os.makedirs(dirname(self.path) or ".", exist_ok=True)
+                _locks[self.path] = ComboLock(f"{self.path}.lock")
+            lock = _locks[self.path]
+        with lock:
+            self._lock_held = True
+            try:
+                yield
+            finally:
+                self._lock_held = False
+
+    def _read(self):
+        """ replay the log into self._items, reusing the previous load of this path """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        with _loaded_lock:
+            cached = _loaded.get(self.path)
+        offset, items, ops, version = 0, (), 0, None
+        if cached and cached[0] == st.st_ino and cached[1] <= st.st_size:
+            _, offset, version, ops, items = cached
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial write of a concurrent commit or a crash, read next time
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    LOG.error(f"{self.path}: skipping corrupted line")
+                    continue
+                if version is None:
+                    version = record.get("version", 0) if record.get("format") == FORMAT else 0
+                    if version != 0:
+                        continue  # header
+                records.append(record)
+        if records:  # else the snapshot is reused as is
+            items = list(items)
+            ops += sum(self._apply(items, record) for record in records)
+            items = tuple(items)
+            with _loaded_lock:
+                _loaded[self.path] = (st.st_ino, offset, version, ops, items)
+        self._items = items
+        self._ops = ops
+        if version is not None and version < VERSION:
+            self._migrate(version)
+        elif version is not None and version > VERSION:
+            LOG.warning(f"{self.path} was written by a newer version (format v{version})")
+        return True
+
+    @staticmethod
+    def _apply(items, record):
+        op = record.get("op")
+        if op == "add":
+            items.append(record["item"])
+        elif op == "set":
+            items[record["id"]] = record["item"]
+        elif op == "del":
+            items.pop(record["id"])
+        else:
+            return 0
+        return 1
+
+    def _migrate(self, version):
+        LOG.info(f"migrating {self.path} from format v{version} to v{VERSION}")
+        items = self._items
+        for v in range(version, VERSION):
+            if v in MIGRATIONS:
+                items = MIGRATIONS[v](items)
+        self._items = list(items)
+        with self._locked():
+            self._compact()
+
+    def _load(self):
+        if self._read():
+            return
+        if self.legacy_path and isfile(self.legacy_path):
+            with self._locked():
+                if self._read():
+                    return  # imported by another process meanwhile
+                try:
+                    with open(self.legacy_path) as f:
+                        self._items = json.load(f).get(self.name, [])
+                except Exception as e:
+                    LOG.error(f"failed to import {self.legacy_path}: {e}")
+                    return
+                LOG.info(f"importing {len(self._items)} items from {self.legacy_path}")
+                self._compact()
+
+    @staticmethod
+    def _write_lines(path, lines, mode):
+        os.makedirs(dirname(path) or ".", exist_ok=True)
+        with open(path, mode) as f:
+            f.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rebase(self):
+        """ catch up with the log and replay the pending operations on top of it
+
+        Returns:
+            list: operations to append, with the ids of the items they apply to now
+        """
+        pending, self._pending = self._pending, []
+        if not self._read():
+            return [op for op, _ in pending]  # no log yet, self._items is still the local view
+        ops = []
+        for op, previous in pending:
+            self._writable()
+            if op["op"] != "add":
+                item_id = op["id"]
+                if item_id >= len(self._items) or self._items[item_id] != previous:
+                    try:
+                        item_id = self._items.index(previous)
+                    except ValueError:
+                        LOG.warning(f"{self.path}: item {op['id']} was deleted by another process, "
+                                    f"dropping '{op['op']}'")
+                        continue
+                op = dict(op, id=item_id)
+            self._apply(self._items, op)
+            ops.append(op)
+        return ops
+
+    def _compact(self):
+        tmp = f"{self.path}.tmp"
+        self._write_lines(tmp, [{"format": FORMAT, "version": VERSION, "name": self.name}] +
+                          [{"op": "add", "item": item} for item in self._items], "w")
+        os.replace(tmp, self.path)
+        self._pending = []
+        self._ops = len(self._items)
+        with _loaded_lock:
+            _loaded.pop(self.path, None)
+
+    def compact(self):
+        """ rewrite the log as a snapshot of the current items """
+        with self._locked():
+            self._rebase()
+            self._compact()
+
+    def commit(self):
+        """ append the pending operations to the log """
+        with self._locked():
+            if not isfile(self.path):
+                self._compact()  # writes the header and everything pending
+                return
+            ops = self._rebase()
+            if ops:
+                self._write_lines(self.path, ops, "a")
+                self._ops += len(ops)
+            if self._ops > self.compact_ratio * len(self._items) + 100:
+                self._compact()
+
+    def reset(self):
+        """ drop uncommitted changes """
+        self._pending = []
+        with _loaded_lock:
+            _loaded.pop(self.path, None)
+        self._items = []
+        self._load()
+
+    def _writable(self):
+        """ copy the shared snapshot before the first change """
+        if isinstance(self._items, tuple):
+            self._items = list(self._items)
+
+    # item manipulations, same api as json_database.JsonDatabase
+    def append(self, value):
+        value = jsonify(value)
+        self._writable()
+        self._items.append(value)
+        self._pending.append(({"op": "add", "item": value}, None))
+        return len(self)
+
+    def add_item(self, value, allow_duplicates=False):
+        if allow_duplicates or value not in self:
+            return self.append(value)
+        return self.get_item_id(value)
+
+    def get_item_id(self, item):
+        item = jsonify(item)
+        for idx, value in enumerate(self._items):
+            if value == item:
+                return idx
+        return -1
+
+    def update_item(self, item_id, new_item):
+        new_item = jsonify(new_item)
+        self._writable()
+        previous, self._items[item_id] = self._items[item_id], new_item
+        self._pending.append(({"op": "set", "id": item_id, "item": new_item}, previous))
+
+    def remove_item(self, item_id):
+        self._writable()
+        item = self._items.pop(item_id)
+        self._pending.append(({"op": "del", "id": item_id}, item))
+        return item
+
+    def _item_id(self, item_id):
+        if not isinstance(item_id, int):
+            item_id = int(item_id)
+        if item_id < 0 or item_id >= len(self._items):
+            raise IndexError(item_id)
+        return item_id
+
+    def __getitem__(self, item_id):
+        return deepcopy(self._items[self._item_id(item_id)])
+
+    def __setitem__(self, item_id, value):
+        self.update_item(self._item_id(item_id), value)
+
+    def get(self, item_id, default=None):
+        try:
+            return self[item_id]
+        except (IndexError, ValueError):
+            return default
+
+    def pop(self, item_id):
+        return self.remove_item(self._item_id(item_id))
+
+    def values(self):
+        return deepcopy(list(self._items))
+
+    def __iter__(self):
+        for item in self._items:
+            yield deepcopy(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return jsonify(item) in self._items
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, value, traceback):
+        self.commit()
@@ -0,0 +1,199 @@
+import atexit
+from collections import deque
+from threading import Event, Lock, Thread
+
+from ovos_config.config import Configuration
+from ovos_utils.log import LOG
+
+
+class MetricsBuffer:
+    """ in memory metrics queue flushed in batches by a background thread
+
+    reporting is a deque append, cheap enough for the intent hot path. counters and
+    timers are aggregated per name at flush time, other metrics are sent as reported
+
+    flush_func receives a list of (name, data) tuples, it is called from the flush thread
+    every interval seconds or as soon as max_events metrics are waiting. if it fails the
+    batch is kept and sent again with the next flush, merged with the counters and timers
+    reported since. at most max_buffered metrics are kept in memory (oldest dropped)
+
+    Args:
+        flush_func (callable): uploads a list of (name, data) metrics
+        max_events (int): flush as soon as this many metrics are queued
+        interval (float): max seconds a metric waits in memory
+        max_buffered (int): memory bound while flush_func keeps failing
+    """
+
+    def __init__(self, flush_func, max_events=50, interval=30, max_buffered=1000):
+        self.flush_func = flush_func
+        self.max_events = max(1, max_events)
+        self.interval = interval
+        self.max_buffered = max_buffered
+        self._events = deque(maxlen=max_buffered)
+        self._failed = deque()  # (kind, name, value) of the last failed batch, sent before _events
+        self._wakeup = Event()
+        self._flush_lock = Lock()
+        self._thread = None
+        self._running = False
+
+    def report(self, name, data):
+        """ queue a metric for upload """
+        self._events.append(("event", name, data))
+        self._notify()
+
+    def count(self, name, value=1):
+        """ increment a counter, reported as {"type": "counter", "value": total} """
+        self._events.append(("counter", name, value))
+        self._notify()
+
+    def timing(self, name, seconds):
+        """ record a duration, reported as {"type": "timer", "count", "total", "min", "max"} """
+        self._events.append(("timer", name, seconds))
+        self._notify()
+
+    def __len__(self):
+        return len(self._failed) + len(self._events)
+
+    def _notify(self):
+        if self._failed:
+            self._trim()
+        if not self._running:
+            self._start()
+        if len(self._events) >= self.max_events:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._flush_lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _trim(self):
+        """ enforce max_buffered, the failed batch is older than anything reported after it """
+        while len(self) > self.max_buffered:
+            try:
+                self._failed.popleft()
+            except IndexError:
+                break
+
+    def _pop(self):
+        """ next queued (kind, name, value), the failed batch goes first as it is older """
+        try:
+            return self._failed.popleft()
+        except IndexError:
+            return self._events.popleft()
+
+    def _drain(self):
+        events = []
+        counters = {}
+        timers = {}
+        while True:
+            try:
+                kind, name, value = self._pop()
+            except IndexError:
+                break
+            if kind == "counter":
+                counters[name] = counters.get(name, 0) + value
+            elif kind in ("timer", "timers"):
+                if kind == "timer":  # a single duration
+                    value = {"type": "timer", "count": 1, "total": value, "min": value, "max": value}
+                if name not in timers:
+                    timers[name] = {"type": "timer", "count": 0, "total": 0,
+                                    "min": value["min"], "max": value["max"]}
+                timer = timers[name]
+                timer["count"] += value["count"]
+                timer["total"] += value["total"]
+                timer["min"] = min(timer["min"], value["min"])
+                timer["max"] = max(timer["max"], value["max"])
+            else:
+                events.append((name, value))
+        events += [(name, {"type": "counter", "value": value}) for name, value in counters.items()]
+        events += list(timers.items())
+        return events
+
+    def _requeue(self, events):
+        """ keep a failed batch for the next flush, aggregates are merged again then """
+        for name, data in events:
+            kind = data.get("type") if isinstance(data, dict) else None
+            if kind == "counter" and set(data) == {"type", "value"}:
+                self._failed.append(("counter", name, data["value"]))
+            elif kind == "timer" and set(data) == {"type", "count", "total", "min", "max"}:
+                self._failed.append(("timers", name, data))
+            else:
+                self._failed.append(("event", name, data))
+        self._trim()
+
+    def flush(self):
+        """ upload everything queued so far
+
+        Returns:
+            int: number of metrics sent
+        """
+        with self._flush_lock:
+            events = self._drain()
+            if not events:
+                return 0
+            try:
+                self.flush_func(events)
+            except Exception as e:
+                LOG.error(f"failed to upload {len(events)} metrics: {e}")
+                self._requeue(events)
+                return 0
+            return len(events)
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def shutdown(self):
+        """ stop the flush thread and send what is left """
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(5)
+        self.flush()
+
+
+def get_metrics_config():
+    """ metrics buffer configuration from mycroft.conf
+
+    "server": {
+        "metrics": {
+            "buffer": true,  // false uploads every metric as it is reported
+            "max_events": 50,  // flush as soon as this many metrics are queued
+            "interval": 30,  // max seconds a metric waits in memory
+            "max_buffered": 1000  // oldest metrics are dropped while uploads fail
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("metrics") or {}
+    return {"buffer": cfg.get("buffer", True),
+            "max_events": cfg.get("max_events", 50),
+            "interval": cfg.get("interval", 30),
+            "max_buffered": cfg.get("max_buffered", 1000)}
+
+
+_buffers = {}
+_buffers_lock = Lock()
+
+
+def get_metrics_buffer(key, flush_func):
+    """ process wide MetricsBuffer for a backend, None if buffering is disabled in mycroft.conf
+
+    Args:
+        key (str): backend identifier, buffers are shared by backends with the same key
+        flush_func (callable): used when the buffer is created
+    """
+    if key not in _buffers:
+        with _buffers_lock:
+            if key not in _buffers:
+                cfg = get_metrics_config()
+                if not cfg.pop("buffer"):
+                    return None
+                _buffers[key] = MetricsBuffer(flush_func, **cfg)
+                atexit.register(_buffers[key].shutdown)
+    return _buffers[key]
@@ -0,0 +1,107 @@
+import asyncio
+import weakref
+from threading import Lock
+from urllib.parse import urlparse
+
+import requests
+from ovos_config.config import Configuration
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+_sessions = {}
+_sessions_lock = Lock()
+_async_sessions = weakref.WeakKeyDictionary()  # event loop -> {host: aiohttp.ClientSession}
+
+
+def get_session_config():
+    """ pooling options for the http sessions, read from the "server" section of mycroft.conf
+
+    "server": {
+        "session": {
+            "pool_connections": 10,
+            "pool_maxsize": 10,
+            "max_retries": 3,
+            "keep_alive": true
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("session") or {}
+    return {
+        "pool_connections": cfg.get("pool_connections", 10),
+        "pool_maxsize": cfg.get("pool_maxsize", 10),
+        "max_retries": cfg.get("max_retries", 3),
+        "keep_alive": cfg.get("keep_alive", True)
+    }
+
+
+def create_session(pool_connections=10, pool_maxsize=10, max_retries=3, keep_alive=True):
+    """ create a requests.Session backed by a pooled HTTPAdapter """
+    retries = Retry(total=max_retries, connect=max_retries, read=max_retries,
+                    backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                    raise_on_status=False)  # return the last 5xx response, callers check status_code
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def _session_key(url):
+    parsed = urlparse(url if "://" in url else f"http://{url}")
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def get_session(url):
+    """ return the process-wide pooled session for the host of url
+
+    connections are kept alive between calls, so only the first request
+    to a given host pays the TCP+TLS handshake
+    """
+    key = _session_key(url)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = create_session(**get_session_config())
+    return session
+
+
+def close_sessions():
+    """ close all pooled sessions, eg. before forking or on shutdown """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_async_session(url):
+    """ return the pooled aiohttp session for the host of url, bound to the running event loop """
+    if aiohttp is None:
+        raise ImportError("aiohttp not installed, run: pip install ovos-backend-client[async]")
+    loop = asyncio.get_running_loop()
+    sessions = _async_sessions.setdefault(loop, {})
+    key = _session_key(url)
+    session = sessions.get(key)
+    if session is None or session.closed:
+        cfg = get_session_config()
+        connector = aiohttp.TCPConnector(limit=cfg["pool_maxsize"],
+                                         force_close=not cfg["keep_alive"])
+        session = sessions[key] = aiohttp.ClientSession(connector=connector)
+    return session
+
+
+async def close_async_sessions():
+    """ close all pooled aiohttp sessions bound to the running event loop """
+    loop = asyncio.get_running_loop()
+    for session in _async_sessions.pop(loop, {}).values():
+        await session.close()
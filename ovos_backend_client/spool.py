@@ -0,0 +1,354 @@
+import json
+import os
+import random
+import time
+from os.path import getsize, isdir, join
+from threading import Condition, Lock, Thread
+from uuid import uuid4
+
+from ovos_config.config import Configuration
+from ovos_config.locations import get_xdg_data_save_path
+from ovos_utils.log import LOG
+
+
+# claim owners of the UploadSpool instances of this process
+_owners = set()
+
+
+class RetryUpload(Exception):
+    """ raised by upload handlers when the server may accept the sample later """
+
+
+class UploadSpool:
+    """ durable queue of audio samples waiting to be uploaded
+
+    every sample is stored as two files, <entry>.audio and <entry>.json, the json is written
+    last so a crash never leaves a half written entry behind. entry names start with a
+    nanosecond timestamp, sorting them gives the upload (and eviction) order
+
+    before uploading, a sample is claimed by renaming its json to <entry>.<pid>-<token>.inflight,
+    the rename is atomic so processes sharing the spool never upload the same sample twice.
+    claims of processes that died are returned to the queue
+
+    a daemon thread uploads up to batch_size samples per cycle, reusing the pooled
+    connection, and backs off exponentially while the server is failing. handlers are
+    registered per kind by the backends, a handler uploads one sample and raises to
+    have it retried later, samples of kinds without a handler wait until one is registered
+
+    Args:
+        path (str): spool directory
+        max_bytes (int): disk usage cap, the oldest samples are evicted first
+        batch_size (int): max uploads per cycle
+        base_delay (float): seconds to wait after the first failure, doubled on every failure
+        max_delay (float): upper bound for the backoff
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, batch_size=10, base_delay=5, max_delay=600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.batch_size = max(1, batch_size)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self._handlers = {}
+        self._lock = Lock()  # guards the spool directory
+        self._wakeup = Condition()
+        self._thread = None
+        self._running = True
+        self._retry_at = 0
+        self._owner = f"{os.getpid()}-{uuid4().hex[:8]}"  # claims of this instance
+        _owners.add(self._owner)
+
+    # storage
+    def _entries(self):
+        """ committed entry names, oldest first """
+        if not isdir(self.path):
+            return []
+        return sorted(f[:-5] for f in os.listdir(self.path) if f.endswith(".json"))
+
+    def _entry_size(self, entry):
+        size = 0
+        for ext in (".audio", ".json"):
+            try:
+                size += getsize(join(self.path, entry + ext))
+            except OSError:
+                pass
+        return size
+
+    def _claimed(self):
+        """ {entry: owner} of the samples being uploaded """
+        if not isdir(self.path):
+            return {}
+        return dict(f[:-9].split(".", 1) for f in os.listdir(self.path) if f.endswith(".inflight"))
+
+    def _claim(self, entry):
+        """ take an entry for upload, False if another uploader was faster """
+        try:
+            os.rename(join(self.path, entry + ".json"), join(self.path, f"{entry}.{self._owner}.inflight"))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _unclaim(self, entry, owner=None):
+        """ put a claimed entry back in the queue """
+        try:
+            os.rename(join(self.path, f"{entry}.{owner or self._owner}.inflight"), join(self.path, entry + ".json"))
+        except FileNotFoundError:
+            pass
+
+    def _recover(self):
+        """ return the claims of dead processes to the queue """
+        for entry, owner in self._claimed().items():
+            pid = int(owner.split("-", 1)[0])
+            if pid == os.getpid():
+                stale = owner not in _owners  # a previous process got the same pid, eg. in containers
+            else:
+                try:
+                    os.kill(pid, 0)
+                    stale = False
+                except ProcessLookupError:
+                    stale = True
+                except PermissionError:
+                    stale = False  # alive, owned by another user
+            if stale:
+                LOG.debug(f"recovering spool entry {entry} claimed by {owner}")
+                self._unclaim(entry, owner)
+
+    def _remove(self, entry, claimed=False):
+        # metadata first, an orphaned .audio is invisible and removed on eviction
+        meta = f"{entry}.{self._owner}.inflight" if claimed else entry + ".json"
+        for name in (meta, entry + ".audio"):
+            try:
+                os.remove(join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    def _load(self, entry):
+        with open(join(self.path, f"{entry}.{self._owner}.inflight")) as f:
+            meta = json.load(f)
+        with open(join(self.path, entry + ".audio"), "rb") as f:
+            return meta, f.read()
+
+    def _evict(self):
+        # caller holds self._lock
+        entries = self._entries()
+        committed = set(entries).union(self._claimed())
+        for f in os.listdir(self.path):
+            if f.endswith(".audio") and f[:-6] not in committed:
+                os.remove(join(self.path, f))
+        sizes = {e: self._entry_size(e) for e in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            LOG.warning(f"upload spool full, dropping oldest sample: {entry}")
+            self._remove(entry)
+            total -= sizes[entry]
+
+    @property
+    def pending(self):
+        """ number of samples waiting to be uploaded, including the ones being uploaded """
+        with self._lock:
+            return len(self._entries()) + len(self._claimed())
+
+    @property
+    def size(self):
+        """ bytes used by the spool """
+        with self._lock:
+            return sum(self._entry_size(e) for e in self._entries())
+
+    # api
+    def register(self, kind, handler):
+        """ set the callable uploading samples of a kind, handler(audio: bytes, params: dict, url: str) """
+        self._handlers[kind] = handler
+        if isdir(self.path):  # samples from a previous run may be waiting for this handler
+            self._notify()
+
+    def enqueue(self, kind, audio, params, url=None):
+        """ store a sample for upload and return immediately
+
+        Returns:
+            str: entry id
+        """
+        entry = f"{time.time_ns():020d}-{uuid4().hex[:8]}"
+        meta = {"kind": kind, "url": url, "params": params}
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(join(self.path, entry + ".audio"), "wb") as f:
+                f.write(audio)
+            tmp = join(self.path, entry + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp, join(self.path, entry + ".json"))
+            self._evict()
+        self._notify()
+        return entry
+
+    def _notify(self):
+        self._ensure_thread()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _backoff(self):
+        self.failures += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        delay *= random.uniform(0.5, 1)  # jitter, devices that went offline together do not retry together
+        self._retry_at = time.monotonic() + delay
+        return delay
+
+    def upload_batch(self):
+        """ upload up to batch_size samples, stops at the first failure
+
+        Returns:
+            int: number of samples uploaded
+        """
+        uploaded = 0
+        with self._lock:
+            self._recover()
+            entries = self._entries()
+        for entry in entries:
+            if uploaded >= self.batch_size:
+                break
+            if not self._has_handler(entry) or not self._claim(entry):
+                continue  # no handler yet, or evicted / taken by another process meanwhile
+            try:
+                meta, audio = self._load(entry)
+            except FileNotFoundError:
+                with self._lock:
+                    self._remove(entry, claimed=True)
+                continue  # evicted meanwhile
+            except Exception as e:
+                LOG.error(f"dropping corrupted spool entry {entry}: {e}")
+                with self._lock:
+                    self._remove(entry, claimed=True)
+                continue
+            try:
+                self._handlers[meta["kind"]](audio, meta["params"], meta.get("url"))
+            except (RetryUpload, OSError) as e:  # requests exceptions are OSErrors
+                self._unclaim(entry)
+                LOG.warning(f"sample upload failed, retrying in {self._backoff():.0f}s: {e}")
+                break
+            except Exception as e:
+                LOG.error(f"dropping sample {entry}, upload failed: {e}")
+                with self._lock:
+                    self._remove(entry, claimed=True)
+                continue
+            with self._lock:
+                self._remove(entry, claimed=True)
+            uploaded += 1
+            self.failures = 0
+        return uploaded
+
+    def _has_handler(self, entry):
+        try:
+            with open(join(self.path, entry + ".json")) as f:
+                return json.load(f).get("kind") in self._handlers
+        except FileNotFoundError:
+            return False  # claimed or evicted meanwhile
+        except Exception:
+            return True  # let upload_batch drop it
+
+    def _has_work(self):
+        with self._lock:
+            self._recover()
+            entries = self._entries()
+        return any(self._has_handler(entry) for entry in entries)
+
+    def _uploading(self):
+        with self._lock:
+            return self._owner in self._claimed().values()
+
+    def _run(self):
+        while self._running:
+            with self._wakeup:
+                wait = self._retry_at - time.monotonic()
+                if wait > 0:
+                    self._wakeup.wait(wait)
+                    continue
+                if not self._has_work():
+                    self._wakeup.wait()
+                    continue
+            try:
+                self.upload_batch()
+            except Exception as e:
+                LOG.exception(f"upload spool error: {e}")
+                self._backoff()
+
+    def flush(self, timeout=None):
+        """ wait until every uploadable sample was sent or timeout expires
+
+        Returns:
+            bool: True if nothing is left to upload
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._has_work() or self._uploading():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._notify()
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self):
+        """ stop the uploader thread, pending samples stay on disk """
+        self._running = False
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(5)
+
+
+def get_spool_config():
+    """ upload spool configuration from mycroft.conf
+
+    "server": {
+        "upload_spool": {
+            "enabled": true,  // false uploads samples synchronously
+            "path": "~/.local/share/ovos_backend_client/upload_spool",
+            "max_bytes": 52428800,  // oldest samples are dropped past this size
+            "batch_size": 10,  // uploads per cycle
+            "base_delay": 5,  // seconds before the first retry, doubles on every failure
+            "max_delay": 600
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("upload_spool") or {}
+    return {"enabled": cfg.get("enabled", True),
+            "path": os.path.expanduser(cfg.get("path") or
+                                       join(get_xdg_data_save_path("ovos_backend_client"), "upload_spool")),
+            "max_bytes": cfg.get("max_bytes", 50 * 1024 * 1024),
+            "batch_size": cfg.get("batch_size", 10),
+            "base_delay": cfg.get("base_delay", 5),
+            "max_delay": cfg.get("max_delay", 600)}
+
+
+_spool = None
+_spool_lock = Lock()
+
+
+def get_upload_spool():
+    """ process wide UploadSpool, None if disabled in mycroft.conf """
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                cfg = get_spool_config()
+                if not cfg.pop("enabled"):
+                    return None
+                _spool = UploadSpool(**cfg)
+    return _spool
+
+
+def check_upload(response):
+    """ raise RetryUpload for responses worth retrying, other failures drop the sample """
+    status = getattr(response, "status_code", 200)
+    if status >= 500 or status in (408, 429):
+        raise RetryUpload(f"status_code {status}")
+    if status >= 400:
+        raise ValueError(f"upload rejected, status_code {status}")
+    return response
@@ -0,0 +1,311 @@
+import json
+import os
+import sqlite3
+from enum import Enum
+from itertools import islice
+from os.path import dirname, isfile
+from threading import Lock
+
+from ovos_utils.log import LOG
+
+from ovos_backend_client.jsonl import JsonlDatabase, jsonify
+
+# (path, table) already created by this process, the schema is only checked on first open
+_created = set()
+_created_lock = Lock()
+
+
+class SQLiteDatabase:
+    """ one table of the local sqlite database
+
+    the database runs in WAL mode, readers never block writers and any number of processes
+    can read concurrently. every instance owns its connection, changes are only visible to
+    others after commit, uncommitted changes are rolled back when the instance is discarded
+
+    the first time a table is opened its json_database counterpart is imported,
+    the import is recorded in the migrations table so it only happens once
+
+    Args:
+        path (str): sqlite file
+        legacy_path (str): json file to import the first time the table is opened
+    """
+    TABLE = ""
+    SCHEMA = ""
+    INDEXES = ()
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        os.makedirs(dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with _created_lock:
+            if (path, self.TABLE) not in _created:
+                self._create()
+                _created.add((path, self.TABLE))
+
+    def _create(self):
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY)")
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({self.SCHEMA})")
+            for column in self.INDEXES:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_{column} "
+                                  f"ON {self.TABLE} ({column})")
+        if self.legacy_path and not self._migrated():
+            self.conn.execute("BEGIN IMMEDIATE")  # one process imports, the others wait
+            try:
+                if not self._migrated():
+                    n = self._import_legacy()
+                    if n:
+                        LOG.info(f"imported {n} items from {self.legacy_path} into {self.path}")
+                self.conn.execute("INSERT OR IGNORE INTO migrations VALUES (?)", (self.TABLE,))
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                LOG.error(f"failed to import {self.legacy_path}: {e}")
+
+    def _migrated(self):
+        return self.conn.execute("SELECT 1 FROM migrations WHERE name = ?", (self.TABLE,)).fetchone() is not None
+
+    def _import_legacy(self):
+        raise NotImplementedError()
+
+    def commit(self):
+        self.conn.commit()
+
+    def store(self, path=None):
+        """ json_database.JsonStorage compat """
+        self.commit()
+
+    def reset(self):
+        """ drop uncommitted changes """
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, value, traceback):
+        if _type is None:
+            self.commit()
+        else:
+            self.reset()
+
+    def __del__(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class SQLiteRecordingDatabase(SQLiteDatabase):
+    """ sqlite storage with the item api of json_database.JsonDatabase
+
+    unlike json_database, item ids are the record ids (ID_FIELD) instead of list positions,
+    so they stay valid after deleting other items and every lookup is an index seek
+
+    the fields in INDEXES are copied to indexed columns, the full item is stored as json
+    """
+    ID_FIELD = ""
+
+    @property
+    def SCHEMA(self):
+        # no type affinity, strings and numbers keep their type and compare as such
+        return ", ".join(["id INTEGER PRIMARY KEY", "data TEXT NOT NULL"] + list(self.INDEXES))
+
+    def _import_legacy(self):
+        if self.legacy_path.endswith(".jsonl"):
+            items = JsonlDatabase(self.TABLE, self.legacy_path).values() if isfile(self.legacy_path) else []
+        elif isfile(self.legacy_path):
+            with open(self.legacy_path) as f:
+                items = json.load(f).get(self.TABLE, [])
+        else:
+            items = []
+        for idx, item in enumerate(items):
+            if item.get(self.ID_FIELD) is None:
+                item[self.ID_FIELD] = idx
+            self._upsert(item[self.ID_FIELD], item)
+        return len(items)
+
+    def _upsert(self, item_id, item):
+        columns = ["id", "data"] + list(self.INDEXES)
+        values = [item_id, json.dumps(item, ensure_ascii=False)] + [self._column(item.get(c)) for c in self.INDEXES]
+        self.conn.execute(f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(columns)}) "
+                          f"VALUES ({', '.join('?' * len(columns))})", values)
+
+    @staticmethod
+    def _column(value):
+        if isinstance(value, Enum):
+            return value.value
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+
+    def _new_id(self, first=0):
+        row = self.conn.execute(f"SELECT MAX(id) FROM {self.TABLE}").fetchone()
+        return first if row[0] is None else max(row[0] + 1, first)
+
+    # item manipulations
+    def append(self, value):
+        value = jsonify(value)
+        item_id = value.get(self.ID_FIELD)
+        if item_id is None:
+            item_id = value[self.ID_FIELD] = self._new_id()
+        self._upsert(item_id, value)
+        return len(self)
+
+    def add_item(self, value, allow_duplicates=False):
+        if allow_duplicates or value not in self:
+            return self.append(value)
+        return self.get_item_id(value)
+
+    def get_item_id(self, item):
+        item = jsonify(item)
+        for item_id, data in self.conn.execute(f"SELECT id, data FROM {self.TABLE} ORDER BY id"):
+            if json.loads(data) == item:
+                return item_id
+        return -1
+
+    def update_item(self, item_id, new_item):
+        self._upsert(item_id, jsonify(new_item))
+
+    def remove_item(self, item_id):
+        item = self[item_id]
+        self.conn.execute(f"DELETE FROM {self.TABLE} WHERE id = ?", (item_id,))
+        return item
+
+    def __getitem__(self, item_id):
+        row = self.conn.execute(f"SELECT data FROM {self.TABLE} WHERE id = ?", (int(item_id),)).fetchone()
+        if row is None:
+            raise IndexError(item_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, item_id, value):
+        self[item_id]  # IndexError for unknown ids, as json_database
+        self.update_item(int(item_id), value)
+
+    def get(self, item_id, default=None):
+        try:
+            return self[item_id]
+        except (IndexError, ValueError):
+            return default
+
+    def pop(self, item_id):
+        return self.remove_item(int(item_id))
+
+    def values(self):
+        return list(self)
+
+    def page(self, offset=0, limit=None):
+        """ list of at most limit items, starting at position offset """
+        rows = self.conn.execute(f"SELECT data FROM {self.TABLE} ORDER BY id LIMIT ? OFFSET ?",
+                                 (-1 if limit is None else limit, offset))
+        return [json.loads(data) for (data,) in rows]
+
+    def query(self, offset=0, limit=None, since=None, **filters):
+        """ page of the items matching the filters, indexed columns are filtered in sqlite
+
+        Args:
+            since (float): minimum "timestamp" of the items
+            filters: field=value, None values are ignored
+        """
+        where, args, rest = [], [], {}
+        for k, v in filters.items():
+            if v is None:
+                continue
+            if k in self.INDEXES:
+                where.append(f"{k} = ?")
+                args.append(self._column(v))
+            else:
+                rest[k] = v
+        if since is not None and "timestamp" in self.INDEXES:
+            where.append("timestamp >= ?")
+            args.append(since)
+            since = None
+        sql = f"SELECT data FROM {self.TABLE}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        items = (json.loads(data) for (data,) in self.conn.execute(sql + " ORDER BY id", args))
+        if rest or since is not None:
+            items = (i for i in items
+                     if (since is None or (i.get("timestamp") is not None and i["timestamp"] >= since))
+                     and all(i.get(k) == v for k, v in rest.items()))
+        return list(islice(items, offset, None if limit is None else offset + limit))
+
+    def __iter__(self):
+        for (data,) in self.conn.execute(f"SELECT data FROM {self.TABLE} ORDER BY id"):
+            yield json.loads(data)
+
+    def __len__(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def __contains__(self, item):
+        item = jsonify(item)
+        if isinstance(item, dict) and item.get(self.ID_FIELD) is not None:
+            return self.get(item[self.ID_FIELD]) == item
+        return self.get_item_id(item) >= 0
+
+
+class SQLiteKeyValueDatabase(SQLiteDatabase):
+    """ sqlite storage with the dict api of json_database.JsonStorage """
+    SCHEMA = "key TEXT PRIMARY KEY, data TEXT NOT NULL"
+
+    def _import_legacy(self):
+        if not isfile(self.legacy_path):
+            return 0
+        with open(self.legacy_path) as f:
+            data = json.load(f)
+        for key, value in data.items():
+            self[key] = value
+        return len(data)
+
+    def __getitem__(self, key):
+        row = self.conn.execute(f"SELECT data FROM {self.TABLE} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.conn.execute(f"INSERT OR REPLACE INTO {self.TABLE} (key, data) VALUES (?, ?)",
+                          (key, json.dumps(jsonify(value), ensure_ascii=False)))
+
+    def __delitem__(self, key):
+        if self.conn.execute(f"DELETE FROM {self.TABLE} WHERE key = ?", (key,)).rowcount == 0:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def __contains__(self, key):
+        return self.conn.execute(f"SELECT 1 FROM {self.TABLE} WHERE key = ?", (key,)).fetchone() is not None
+
+    def keys(self):
+        return [k for (k,) in self.conn.execute(f"SELECT key FROM {self.TABLE} ORDER BY key")]
+
+    def values(self):
+        return [json.loads(d) for (d,) in self.conn.execute(f"SELECT data FROM {self.TABLE} ORDER BY key")]
+
+    def items(self):
+        return [(k, json.loads(d)) for k, d in self.conn.execute(f"SELECT key, data FROM {self.TABLE} ORDER BY key")]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
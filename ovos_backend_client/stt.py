@@ -0,0 +1,524 @@
+import enum
+import hashlib
+import heapq
+import itertools
+import json
+import shutil
+import subprocess
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from threading import Condition, Lock, Thread
+
+from ovos_config.config import Configuration
+from ovos_utils.log import LOG
+
+from ovos_backend_client.exceptions import STTQueueFull
+
+
+def _downmix(frames, width, channels):
+    """ average interleaved little endian PCM channels into a single one """
+    import audioop
+    if channels == 2:
+        return audioop.tomono(frames, width, 0.5, 0.5)
+    if width == 3:  # no memoryview format for 24 bit samples
+        return audioop.lin2lin(_downmix(audioop.lin2lin(frames, 3, 4), 4, channels), 4, 3)
+    samples = memoryview(frames).cast({1: "b", 2: "h", 4: "i"}[width])
+    mono = None
+    for channel in range(channels):
+        data = audioop.mul(samples[channel::channels].tobytes(), width, 1 / channels)
+        mono = data if mono is None else audioop.add(mono, data, width)
+    return mono
+
+
+def _wav_to_audio_data(data):
+    from speech_recognition import AudioData
+    with wave.open(BytesIO(data), "rb") as wav:
+        frames = wav.readframes(wav.getnframes())
+        width, channels = wav.getsampwidth(), wav.getnchannels()
+        if width == 1:  # 8 bit WAV is unsigned, AudioData holds signed samples
+            import audioop
+            frames = audioop.bias(frames, 1, -128)
+        if channels > 1:
+            frames = _downmix(frames, width, channels)
+        return AudioData(frames, wav.getframerate(), width)
+
+
+def decode_audio(audio):
+    """ build a speech_recognition.AudioData from encoded audio without touching the filesystem
+
+    WAV is parsed in place with the wave module, FLAC is piped through the
+    flac decoder bundled with speech_recognition, other formats fall back
+    to speech_recognition.AudioFile
+
+    Args:
+        audio (bytes|bytearray|memoryview|AudioData): WAV or FLAC file contents
+    """
+    from speech_recognition import AudioData, AudioFile, Recognizer, get_flac_converter
+    if isinstance(audio, AudioData):
+        return audio
+    header = bytes(audio[:4])
+    if header == b"RIFF":
+        return _wav_to_audio_data(audio)
+    if header == b"fLaC":
+        process = subprocess.run([get_flac_converter(), "--stdout", "--totally-silent", "--decode", "-"],
+                                 input=audio, stdout=subprocess.PIPE, check=True)
+        return _wav_to_audio_data(process.stdout)
+    with NamedTemporaryFile() as fp:
+        fp.write(audio)
+        fp.flush()
+        with AudioFile(fp.name) as source:
+            return Recognizer().record(source)
+
+
+CONTENT_TYPES = {
+    "flac": "audio/x-flac",
+    "opus": "audio/ogg; codecs=opus",
+    "wav": "audio/wav"
+}
+
+
+def get_upload_config():
+    """ how audio is encoded before being sent to a remote STT, from mycroft.conf
+
+    "server": {
+        "stt_upload": {
+            "codec": "flac",  // "flac", "opus" (needs ffmpeg) or "wav"
+            "sample_rate": 16000  // rate expected by the STT engine
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("stt_upload") or {}
+    return {"codec": cfg.get("codec", "flac"),
+            "sample_rate": cfg.get("sample_rate", 16000)}
+
+
+def _encode_opus(wav_data):
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise FileNotFoundError("ffmpeg not found")
+    process = subprocess.run([ffmpeg, "-loglevel", "error", "-f", "wav", "-i", "-",
+                              "-c:a", "libopus", "-b:a", "24k", "-f", "ogg", "-"],
+                             input=wav_data, stdout=subprocess.PIPE, check=True)
+    return process.stdout
+
+
+def encode_audio(audio, codec=None, sample_rate=None):
+    """ prepare audio for upload, downsampled to 16bit mono at sample_rate and compressed
+
+    already compressed input (FLAC) and anything that is not WAV/AudioData
+    is sent as is, opus falls back to FLAC if ffmpeg is unavailable
+
+    Args:
+        audio (bytes|AudioData): audio to upload
+        codec (str): "flac", "opus" or "wav", defaults to the configured codec
+        sample_rate (int): target sample rate, defaults to the configured rate
+
+    Returns:
+        tuple: (encoded bytes, Content-Type header value)
+    """
+    cfg = get_upload_config()
+    codec = codec or cfg["codec"]
+    sample_rate = sample_rate or cfg["sample_rate"]
+    try:
+        from speech_recognition import AudioData
+    except ImportError:
+        return audio, CONTENT_TYPES["flac"]
+    if isinstance(audio, (bytes, bytearray, memoryview)) and bytes(audio[:4]) == b"RIFF":
+        audio = _wav_to_audio_data(audio)
+    if not isinstance(audio, AudioData):
+        return audio, CONTENT_TYPES["flac"]
+
+    # only ever downsample, upsampling adds bytes and no information
+    rate = min(sample_rate, audio.sample_rate) if sample_rate else audio.sample_rate
+    if codec == "wav":
+        return audio.get_wav_data(convert_rate=rate, convert_width=2), CONTENT_TYPES["wav"]
+    if codec == "opus":
+        try:
+            return _encode_opus(audio.get_wav_data(convert_rate=rate, convert_width=2)), \
+                CONTENT_TYPES["opus"]
+        except Exception as e:
+            LOG.warning(f"opus encoding failed, falling back to flac: {e}")
+    return audio.get_flac_data(convert_rate=rate, convert_width=2), CONTENT_TYPES["flac"]
+
+
+def make_hypothesis(transcript, final=True):
+    """ normalize a STT result into a streaming hypothesis
+
+    Args:
+        transcript (str|list): transcription, lists are the alternatives returned by stt_get
+        final (bool): False for partial results that may still change
+
+    Returns:
+        dict: {"transcript": str, "final": bool}
+    """
+    if isinstance(transcript, (list, tuple)):
+        transcript = transcript[0] if transcript else ""
+    return {"transcript": transcript or "", "final": final}
+
+
+def _default_factory(config):
+    from ovos_plugin_manager.stt import OVOSSTTFactory
+    return OVOSSTTFactory.create(config)
+
+
+class STTEnginePool:
+    """ loaded STT plugins keyed by (plugin config, lang)
+
+    - at most max_resident engines are kept loaded, the least recently used one is evicted
+    - every engine has its own lock, loading or running one language never blocks another
+    - an engine only runs one transcription at a time, plugins are not assumed thread safe
+
+    Args:
+        max_resident (int): max number of engines kept in memory
+        factory (callable): receives a stt config dict, returns a loaded STT plugin
+    """
+
+    def __init__(self, max_resident=2, factory=None):
+        self.max_resident = max(1, max_resident)
+        self.factory = factory or _default_factory
+        self._engines = OrderedDict()  # key -> engine, in LRU order
+        self._locks = {}  # key -> [Lock, number of threads holding or waiting for it]
+        self._lock = Lock()  # guards the dicts above, never held while loading
+
+    @staticmethod
+    def get_config(config=None, lang=None):
+        """ stt config for a language, defaults to the stt section of mycroft.conf """
+        if not config:
+            from ovos_plugin_manager.stt import get_stt_config
+            config = get_stt_config()
+        config = dict(config)
+        if lang:
+            config["lang"] = lang
+        return config
+
+    @staticmethod
+    def make_key(config):
+        return json.dumps(config, sort_keys=True, default=str)
+
+    @contextmanager
+    def _key_lock(self, key):
+        """ hold the lock of an engine, it exists while any thread holds or waits for it """
+        with self._lock:
+            entry = self._locks.setdefault(key, [Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def _evict(self):
+        """ drop the least recently used idle engines above max_resident, caller holds self._lock
+
+        engines in use (key lock held or awaited) are skipped, the pool shrinks back on a later eviction
+
+        Returns:
+            list: evicted engines, pass them to _shutdown once self._lock is released
+        """
+        evicted = []
+        for key in list(self._engines):
+            if len(self._engines) <= self.max_resident:
+                break
+            if key in self._locks:
+                continue  # in use
+            evicted.append(self._engines.pop(key))
+            LOG.debug(f"evicting STT engine: {key}")
+        return evicted
+
+    @staticmethod
+    def _shutdown(engines):
+        for engine in engines:
+            shutdown = getattr(engine, "shutdown", None)
+            if callable(shutdown):
+                try:
+                    shutdown()
+                except Exception as e:
+                    LOG.warning(f"STT engine shutdown failed: {e}")
+
+    def _get(self, key, config):
+        with self._lock:
+            if key in self._engines:
+                self._engines.move_to_end(key)
+                return self._engines[key]
+        engine = self.factory(config)
+        with self._lock:
+            self._engines[key] = engine
+            evicted = self._evict()
+        self._shutdown(evicted)
+        return engine
+
+    def get(self, lang, config=None):
+        """ loaded engine for (config, lang), loading it if needed """
+        config = self.get_config(config, lang)
+        key = self.make_key(config)
+        with self._key_lock(key):  # concurrent callers load the engine only once
+            return self._get(key, config)
+
+    def execute(self, audio, lang, config=None):
+        """ transcribe audio (speech_recognition.AudioData) with the engine for (config, lang) """
+        config = self.get_config(config, lang)
+        key = self.make_key(config)
+        with self._key_lock(key):
+            engine = self._get(key, config)
+            return engine.execute(audio, lang)
+
+    def stream(self, chunks, lang, config=None, sample_rate=16000, sample_width=2):
+        """ transcribe raw pcm chunks as they are recorded
+
+        plugins implementing the OPM StreamingSTT interface (stream_start/stream_data/stream_stop)
+        are fed every chunk and report partial results, any other plugin transcribes the
+        buffered audio once chunks is exhausted, the engine is held until the stream ends
+
+        Args:
+            chunks (iterable): 16bit mono pcm chunks
+            lang (str): language of the audio
+            config (dict): stt plugin config
+            sample_rate (int): sample rate of the chunks
+            sample_width (int): bytes per sample
+
+        Yields:
+            dict: {"transcript": str, "final": bool}, the last hypothesis is final
+        """
+        config = self.get_config(config, lang)
+        key = self.make_key(config)
+        with self._key_lock(key):
+            engine = self._get(key, config)
+            if not callable(getattr(engine, "stream_start", None)):
+                from speech_recognition import AudioData
+                audio = AudioData(b"".join(chunks), sample_rate, sample_width)
+                yield make_hypothesis(engine.execute(audio, lang))
+                return
+
+            engine.stream_start(lang)
+            last = None
+            try:
+                for chunk in chunks:
+                    engine.stream_data(chunk)
+                    # OPM stream threads keep the current hypothesis in .text
+                    partial = getattr(getattr(engine, "stream", None), "text", None)
+                    if partial and partial != last:
+                        last = partial
+                        yield make_hypothesis(partial, final=False)
+            except BaseException:
+                engine.stream_stop()
+                raise
+            yield make_hypothesis(engine.stream_stop())
+
+    def warm_up(self, langs, config=None, background=True):
+        """ load the engines for langs ahead of the first request """
+
+        def _load():
+            for lang in langs:
+                try:
+                    self.get(lang, config)
+                except Exception as e:
+                    LOG.error(f"failed to warm up STT for {lang}: {e}")
+
+        if background:
+            t = Thread(target=_load, daemon=True)
+            t.start()
+            return t
+        _load()
+
+    @property
+    def resident(self):
+        with self._lock:
+            return list(self._engines)
+
+    def clear(self):
+        """ unload every engine that is not in use """
+        with self._lock:
+            max_resident, self.max_resident = self.max_resident, 0
+            evicted = self._evict()
+            self.max_resident = max_resident
+        self._shutdown(evicted)
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_stt_pool():
+    """ process-wide STTEnginePool, configured in mycroft.conf
+
+    "server": {
+        "stt_pool": {
+            "max_resident": 2,
+            // languages loaded in the background when the pool is created
+            "warm_up": ["en-us"]
+        }
+    }
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                cfg = (Configuration().get("server") or {}).get("stt_pool") or {}
+                _pool = STTEnginePool(max_resident=cfg.get("max_resident", 2))
+                if cfg.get("warm_up"):
+                    _pool.warm_up(cfg["warm_up"])
+    return _pool
+
+
+class STTPriority(enum.IntEnum):
+    INTERACTIVE = 0  # a user is waiting for the answer
+    DATASET = 1  # background work, eg. re-transcribing recordings
+
+
+class STTDispatcher:
+    """ bounded window of concurrent STT requests
+
+    - at most max_in_flight requests run at the same time, the rest wait in a priority queue
+    - when max_queued requests are waiting new ones are rejected right away with STTQueueFull,
+      unless an interactive request can take the place of a queued dataset request
+    - submitting the same audio (and language/limit) while it is pending returns the
+      pending future instead of sending it twice
+
+    Args:
+        max_in_flight (int): max concurrent requests
+        max_queued (int): max requests waiting for a free slot
+    """
+
+    def __init__(self, max_in_flight=4, max_queued=16):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max(0, max_queued)
+        self._queue = []  # heap of [priority, seq, key, func, args]
+        self._pending = {}  # key -> Future, queued or in flight
+        self._seq = itertools.count()
+        self._cond = Condition()
+        self._in_flight = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0,
+                       "rejected": 0, "coalesced": 0}
+        self._workers = []
+
+    @staticmethod
+    def _key(audio, language, limit):
+        if isinstance(audio, str):
+            audio = audio.encode("utf-8")
+        try:
+            digest = hashlib.sha1(audio).hexdigest()
+        except TypeError:  # not a bytes like object, never coalesced
+            digest = f"id-{id(audio)}"
+        return f"{digest}|{language}|{limit}"
+
+    def _ensure_workers(self):
+        # caller holds self._cond
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_in_flight:
+            w = Thread(target=self._run, daemon=True)
+            w.start()
+            self._workers.append(w)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, key, func, args = heapq.heappop(self._queue)
+                future = self._pending[key]
+                self._in_flight += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = func(*args)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._pending.pop(key, None)
+                    if future.cancelled() or future.exception() is not None:
+                        self._stats["failed"] += 1
+                    else:
+                        self._stats["completed"] += 1
+
+    def _make_room(self, priority):
+        """ drop the newest queued request with lower priority, caller holds self._cond """
+        victims = [item for item in self._queue if item[0] > priority]
+        if not victims:
+            return False
+        victim = max(victims, key=lambda item: (item[0], item[1]))
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        future = self._pending.pop(victim[2])
+        future.set_exception(STTQueueFull("dropped in favor of a higher priority request"))
+        self._stats["rejected"] += 1
+        return True
+
+    def submit(self, func, audio, language="en-us", limit=1, priority=STTPriority.INTERACTIVE):
+        """ schedule func(audio, language, limit)
+
+        Returns:
+            concurrent.futures.Future: resolves to the transcription
+
+        Raises:
+            STTQueueFull: if the queue is full
+        """
+        key = self._key(audio, language, limit)
+        with self._cond:
+            self._stats["submitted"] += 1
+            if key in self._pending:
+                self._stats["coalesced"] += 1
+                return self._pending[key]
+            # a request can start right away if a worker is idle
+            busy = self._in_flight + len(self._queue)
+            if busy >= self.max_in_flight + self.max_queued and not self._make_room(priority):
+                self._stats["rejected"] += 1
+                raise STTQueueFull(f"{self._in_flight} STT requests in flight, "
+                                   f"{len(self._queue)} queued")
+            future = Future()
+            self._pending[key] = future
+            heapq.heappush(self._queue, [int(priority), next(self._seq), key, func,
+                                         (audio, language, limit)])
+            self._ensure_workers()
+            self._cond.notify()
+        return future
+
+    def transcribe(self, func, audio, language="en-us", limit=1,
+                   priority=STTPriority.INTERACTIVE, timeout=None):
+        """ blocking version of submit """
+        return self.submit(func, audio, language, limit, priority).result(timeout)
+
+    @property
+    def metrics(self):
+        """ queue depth and counters, eg. for health checks or metrics upload """
+        with self._cond:
+            queued = {p.name.lower(): 0 for p in STTPriority}
+            for item in self._queue:
+                queued[STTPriority(item[0]).name.lower()] += 1
+            return {"in_flight": self._in_flight,
+                    "queued": len(self._queue),
+                    "queued_by_priority": queued,
+                    "max_in_flight": self.max_in_flight,
+                    "max_queued": self.max_queued,
+                    **self._stats}
+
+
+_dispatchers = {}
+_dispatchers_lock = Lock()
+
+
+def get_stt_dispatcher(url):
+    """ process-wide STTDispatcher for a backend url, None if disabled in mycroft.conf
+
+    "server": {
+        "stt_dispatcher": {"max_in_flight": 4, "max_queued": 16}  // max_in_flight 0 disables
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("stt_dispatcher") or {}
+    if not cfg.get("max_in_flight", 4):
+        return None
+    with _dispatchers_lock:
+        if url not in _dispatchers:
+            _dispatchers[url] = STTDispatcher(max_in_flight=cfg.get("max_in_flight", 4),
+                                              max_queued=cfg.get("max_queued", 16))
+        return _dispatchers[url]
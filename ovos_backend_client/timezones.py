@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from threading import Lock
+
+from ovos_config.config import Configuration
+
+try:
+    from timezonefinder import TimezoneFinder
+except ImportError:
+    TimezoneFinder = None
+
+
+class TimezoneResolver:
+    """ coordinate -> timezone lookups sharing a single TimezoneFinder
+
+    the finder (and its polygon data) is only built on first use, recent
+    results are kept in a LRU keyed by the rounded coordinates. TimezoneFinder
+    is not thread safe, lookups that miss the LRU are serialized
+
+    Args:
+        in_memory (bool): load all polygon data into memory, faster lookups at the cost of RAM
+        precision (int): decimal places coordinates are rounded to for the LRU, 3 is ~110m
+        cache_size (int): max number of results kept in the LRU
+    """
+
+    def __init__(self, in_memory=False, precision=3, cache_size=1024):
+        self.in_memory = in_memory
+        self.precision = precision
+        self.cache_size = cache_size
+        self._finder = None
+        self._lock = Lock()
+        self._finder_lock = Lock()  # held while querying the finder, cache hits do not wait for it
+        self._cache = OrderedDict()
+
+    @property
+    def available(self):
+        return TimezoneFinder is not None
+
+    @property
+    def finder(self):
+        if self._finder is None:
+            with self._lock:
+                if self._finder is None:
+                    if TimezoneFinder is None:
+                        raise ImportError("timezonefinder not installed, run: pip install timezonefinder")
+                    try:
+                        self._finder = TimezoneFinder(in_memory=self.in_memory)
+                    except TypeError:  # older timezonefinder versions
+                        self._finder = TimezoneFinder()
+        return self._finder
+
+    def preload(self):
+        """ build the finder now instead of on the first lookup """
+        return self.finder
+
+    def _key(self, lat, lon):
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        lat, lon = key
+        finder = self.finder
+        with self._finder_lock:
+            tz = finder.timezone_at(lng=lon, lat=lat)
+        with self._lock:
+            self._cache[key] = tz
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tz
+
+    def timezone_at(self, lat, lon):
+        """ timezone code (eg. "Europe/Lisbon") for a coordinate, None if unknown """
+        return self._lookup(self._key(lat, lon))
+
+    def timezones_at(self, coordinates):
+        """ resolve many (lat, lon) pairs in one pass
+
+        coordinates rounding to the same key are only looked up once
+
+        Returns:
+            list: timezone codes in the same order as the input
+        """
+        keys = [self._key(lat, lon) for lat, lon in coordinates]
+        results = {key: self._lookup(key) for key in dict.fromkeys(keys)}
+        return [results[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_resolver = None
+_resolver_lock = Lock()
+
+
+def get_timezone_resolver():
+    """ process-wide TimezoneResolver, configured in mycroft.conf
+
+    "server": {
+        "timezone_finder": {"in_memory": false, "precision": 3, "cache_size": 1024}
+    }
+    """
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                cfg = (Configuration().get("server") or {}).get("timezone_finder") or {}
+                _resolver = TimezoneResolver(in_memory=cfg.get("in_memory", False),
+                                             precision=cfg.get("precision", 3),
+                                             cache_size=cfg.get("cache_size", 1024))
+    return _resolver
+
+
+def get_timezones(coordinates):
+    """ batch resolve (lat, lon) pairs into timezone dicts as returned by the geolocation apis
+
+    Returns:
+        list: [{"name": ..., "code": ...}] in the same order as the input, None if unknown
+    """
+    return [{"name": tz.replace("/", " "), "code": tz} if tz else None
+            for tz in get_timezone_resolver().timezones_at(coordinates)]
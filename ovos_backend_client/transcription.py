@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from os.path import dirname, isfile, join
+
+from ovos_config.locations import get_xdg_cache_save_path
+from ovos_utils.log import LOG
+
+from ovos_backend_client.backends.base import BackendType
+from ovos_backend_client.database import get_database_config
+from ovos_backend_client.stt import STTEnginePool, decode_audio
+
+_worker_pool = None  # STTEnginePool of the current worker process
+
+
+def _init_worker(stt_config, lang, factory=None):
+    """ process pool initializer, every worker loads its own model once """
+    global _worker_pool
+    _worker_pool = STTEnginePool(max_resident=1, factory=factory)
+    _worker_pool.get(lang, stt_config)
+
+
+def _transcribe(job):
+    rec_id, path, lang, stt_config = job
+    try:
+        with open(path, "rb") as f:
+            audio = decode_audio(f.read())
+        tx = _worker_pool.execute(audio, lang, stt_config)
+    except Exception as e:
+        LOG.error(f"failed to transcribe recording {rec_id}: {e}")
+        return rec_id, None
+    if isinstance(tx, list):
+        tx = tx[0] if tx else ""
+    return rec_id, tx
+
+
+def _transcribe_chunk(jobs):
+    return [_transcribe(job) for job in jobs]
+
+
+class BatchTranscriptionJob:
+    """ re-transcribe the recorded utterances database with a local STT plugin
+
+    recordings are transcribed by a process pool, each worker holds one STT model,
+    results are written back in bulk with backend.db_update_stt_recordings every
+    batch_size recordings, the ids of committed recordings are saved to state_file
+    so an interrupted job resumes where it stopped. the default state_file is named
+    after job_id, runs only resume jobs with the same backend, language and STT config
+
+    audio is read from the recording "path", so it needs to be accessible locally
+
+    Args:
+        backend (AbstractBackend): backend providing the utterance database
+        lang (str): language of the recordings
+        stt_config (dict): STT plugin config, defaults to the stt section of mycroft.conf
+        workers (int): number of worker processes, defaults to the cpu count, 0 runs inline
+        batch_size (int): number of results per database commit
+        state_file (str): where to save progress
+        factory (callable): picklable STT factory, see STTEnginePool
+        job_id (str): identifies the job progress belongs to, defaults to a hash of the inputs
+    """
+
+    def __init__(self, backend, lang="en-us", stt_config=None, workers=None, batch_size=50,
+                 state_file=None, factory=None, job_id=None):
+        self.backend = backend
+        self.lang = lang
+        self.stt_config = STTEnginePool.get_config(stt_config, lang)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.batch_size = max(1, batch_size)
+        self.job_id = job_id or self.make_job_id(backend, self.stt_config)
+        self.state_file = state_file or join(get_xdg_cache_save_path("ovos_backend_client"),
+                                             f"batch_transcription_{self.job_id}.json")
+        self.factory = factory
+        self.done = self._load_state()
+
+    @staticmethod
+    def make_job_id(backend, stt_config):
+        """ hash of the recordings source and the STT config (which includes the language) """
+        source = [getattr(backend, "backend_type", None), getattr(backend, "backend_url", None)]
+        if source[0] == BackendType.OFFLINE:  # recordings live in the local database
+            source.append(get_database_config())
+        data = json.dumps([source, stt_config], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+    def _load_state(self):
+        if isfile(self.state_file):
+            try:
+                with open(self.state_file) as f:
+                    return set(json.load(f).get("done", []))
+            except Exception as e:
+                LOG.warning(f"ignoring corrupted batch transcription state: {e}")
+        return set()
+
+    def _save_state(self):
+        os.makedirs(dirname(self.state_file) or ".", exist_ok=True)
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"done": sorted(self.done, key=str)}, f)
+        os.replace(tmp, self.state_file)
+
+    def reset(self):
+        """ forget progress, next run starts from the first recording """
+        self.done = set()
+        if isfile(self.state_file):
+            os.remove(self.state_file)
+
+    def pending(self):
+        """ yield (rec_id, path, lang, stt_config) for recordings not transcribed yet """
+        for rec in self.backend.iter_stt_recordings():
+            rec_id = rec.get("utterance_id")
+            if rec_id in self.done:
+                continue
+            path = rec.get("path")
+            if not path or not isfile(path):
+                LOG.warning(f"skipping recording {rec_id}, audio not found: {path}")
+                continue
+            yield rec_id, path, self.lang, self.stt_config
+
+    def _commit(self, batch):
+        updates = {rec_id: tx for rec_id, tx in batch if tx is not None}
+        if updates:
+            self.backend.db_update_stt_recordings(updates)
+        # failed recordings are retried on the next run
+        self.done.update(updates)
+        self._save_state()
+
+    def run(self):
+        """ transcribe every pending recording
+
+        Returns:
+            int: number of recordings updated
+        """
+        jobs = self.pending()
+        futures = deque()
+        if self.workers:
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                           initargs=(self.stt_config, self.lang, self.factory))
+            chunks = iter(lambda: list(islice(jobs, 4)), [])
+
+            def submit_results():
+                # a bounded window of chunks in flight, recordings are listed as the pool drains
+                futures.extend(executor.submit(_transcribe_chunk, c) for c in islice(chunks, self.workers * 2))
+                while futures:
+                    chunk = futures.popleft().result()
+                    futures.extend(executor.submit(_transcribe_chunk, c) for c in islice(chunks, 1))
+                    yield from chunk
+
+            results = submit_results()
+        else:
+            executor = None
+            _init_worker(self.stt_config, self.lang, self.factory)
+            results = map(_transcribe, jobs)
+        updated = 0
+        batch = []
+        try:
+            for rec_id, tx in results:
+                batch.append((rec_id, tx))
+                if tx is not None:
+                    updated += 1
+                if len(batch) >= self.batch_size:
+                    self._commit(batch)
+                    batch = []
+        finally:
+            if batch:
+                self._commit(batch)
+            if executor:
+                for future in futures:  # cancel_futures needs python 3.9
+                    future.cancel()
+                executor.shutdown(wait=True)
+        return updated
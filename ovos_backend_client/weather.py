@@ -0,0 +1,133 @@
+import asyncio
+from functools import wraps
+
+from ovos_config.config import Configuration
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# fields shared by every view of a OneCall response
+_ONECALL_HEADER = ("lat", "lon", "timezone", "timezone_offset")
+
+
+def get_weather_config():
+    """ weather settings from mycroft.conf
+
+    "server": {
+        "weather": {
+            // derive current/hourly/daily from a single cached OneCall request
+            // the returned data follows the OneCall format, eg. data["current"]
+            "aggregate": false,
+            // nearby coordinates share cache entries, 0 disables bucketing
+            // precision 5 is a ~4.9 x 4.9 km cell, 6 is ~1.2 x 0.6 km
+            "geohash_precision": 6
+        }
+    }
+    """
+    cfg = (Configuration().get("server") or {}).get("weather") or {}
+    return {"aggregate": cfg.get("aggregate", False),
+            "geohash_precision": cfg.get("geohash_precision", 6)}
+
+
+def geohash_encode(lat, lon, precision=6):
+    """ encode a coordinate as a geohash string of the given length """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_decode(geohash):
+    """ return the (lat, lon) center of a geohash cell """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for c in geohash:
+        cd = _GEOHASH_ALPHABET.index(c)
+        for mask in (16, 8, 4, 2, 1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if cd & mask:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def quantize_lat_lon(lat_lon, precision=None):
+    """ snap a (lat, lon) to the center of its geohash cell
+
+    every coordinate inside the same cell maps to the same value, so it can be
+    used as a cache key for data that does not change over short distances
+    """
+    if precision is None:
+        precision = get_weather_config()["geohash_precision"]
+    if not lat_lon or not precision:
+        return lat_lon
+    lat, lon = geohash_decode(geohash_encode(float(lat_lon[0]), float(lat_lon[1]), precision))
+    return round(lat, 6), round(lon, 6)
+
+
+def geo_bucketed(func):
+    """ decorator quantizing the lat_lon argument of weather methods
+
+    must wrap the caching decorator so nearby lookups share a cache entry
+    """
+
+    def _bucket(args, kwargs):
+        if "lat_lon" in kwargs:
+            kwargs["lat_lon"] = quantize_lat_lon(kwargs["lat_lon"])
+        elif args:
+            args = (quantize_lat_lon(args[0]),) + tuple(args[1:])
+        return args, kwargs
+
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            args, kwargs = _bucket(args, kwargs)
+            return await func(self, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        args, kwargs = _bucket(args, kwargs)
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _onecall_view(data, section):
+    view = {k: data[k] for k in _ONECALL_HEADER if k in data}
+    view[section] = data.get(section)
+    if data.get("alerts"):
+        view["alerts"] = data["alerts"]
+    return view
+
+
+def onecall_current(data):
+    """ current conditions from a OneCall response """
+    return _onecall_view(data, "current")
+
+
+def onecall_hourly(data):
+    """ hourly forecast from a OneCall response """
+    return _onecall_view(data, "hourly")
+
+
+def onecall_daily(data):
+    """ daily forecast from a OneCall response """
+    return _onecall_view(data, "daily")
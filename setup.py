@@ -58,7 +58,8 @@ setup(
     author='jarbasai',
     install_requires=required("requirements/requirements.txt"),
     extras_require={
-        'offline': required('requirements/offline.txt')
+        'offline': required('requirements/offline.txt'),
+        'async': required('requirements/async.txt')
     },
     author_email='jarbasai@mailfence.com',
     description='api client for supported ovos-core backends'
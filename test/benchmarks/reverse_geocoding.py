@@ -0,0 +1,52 @@
+"""
+compare local reverse geocoding against the nominatim http api
+
+usage: python reverse_geocoding.py cities15000.txt [admin1CodesASCII.txt] [countryInfo.txt]
+
+dump files available at https://download.geonames.org/export/dump/
+"""
+import random
+import sys
+import time
+
+from ovos_backend_client.backends import OfflineBackend
+from ovos_backend_client.geocoding import Gazetteer, ReverseGeocoder
+
+
+def main(cities_file, admin1_file=None, countries_file=None, n_local=10000, n_http=5):
+    rnd = random.Random(0)
+
+    start = time.perf_counter()
+    gazetteer = Gazetteer(cities_file, admin1_file, countries_file)
+    geocoder = ReverseGeocoder(gazetteer)
+    print(f"loaded {len(gazetteer)} places and built index in {time.perf_counter() - start:.2f}s")
+
+    coords = [(rnd.uniform(-60, 70), rnd.uniform(-180, 180)) for _ in range(n_local)]
+    start = time.perf_counter()
+    for lat, lon in coords:
+        geocoder.reverse(lat, lon)
+    elapsed = time.perf_counter() - start
+    print(f"local: {elapsed / n_local * 1e6:.1f} us per lookup ({n_local} lookups)")
+
+    # nominatim usage policy allows at most 1 request per second
+    backend = OfflineBackend()
+    reverse = OfflineBackend.reverse_geolocation_get.__wrapped__  # bypass the response cache
+    timings = []
+    for lat, lon in coords[:n_http]:
+        start = time.perf_counter()
+        try:
+            reverse(backend, lat, lon)
+        except Exception as e:
+            print(f"http lookup failed: {e}")
+            continue
+        timings.append(time.perf_counter() - start)
+        time.sleep(1)
+    if timings:
+        print(f"http: {sum(timings) / len(timings) * 1e3:.1f} ms per lookup ({len(timings)} lookups)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(*sys.argv[1:4])
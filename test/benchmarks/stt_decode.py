@@ -0,0 +1,54 @@
+"""
+per utterance overhead of turning stt_get input into AudioData
+
+compares the old temporary file path against decode_audio for 1s, 5s and 30s clips
+
+usage: python stt_decode.py
+"""
+import math
+import struct
+import time
+from tempfile import NamedTemporaryFile
+
+from speech_recognition import AudioData, AudioFile, Recognizer
+
+from ovos_backend_client.stt import decode_audio
+
+
+def make_clip(seconds, sample_rate=16000):
+    samples = (int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate))
+               for i in range(int(seconds * sample_rate)))
+    frames = b"".join(struct.pack("<h", s) for s in samples)
+    return AudioData(frames, sample_rate, 2)
+
+
+def tempfile_decode(data):
+    with NamedTemporaryFile() as fp:
+        fp.write(data)
+        with AudioFile(fp.name) as source:
+            return Recognizer().record(source)
+
+
+def bench(func, data, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(data)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main(runs=20):
+    for seconds in (1, 5, 30):
+        clip = make_clip(seconds)
+        encodings = {"wav": clip.get_wav_data()}
+        try:
+            encodings["flac"] = clip.get_flac_data()
+        except Exception as e:  # needs the flac binary
+            print(f"skipping flac: {e}")
+        for fmt, data in encodings.items():
+            old = bench(tempfile_decode, data, runs)
+            new = bench(decode_audio, data, runs)
+            print(f"{seconds:>2}s {fmt:<4} tempfile: {old:7.2f} ms   in memory: {new:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
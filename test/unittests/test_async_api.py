@@ -0,0 +1,143 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import ovos_backend_client.cache
+from ovos_backend_client.backends import BackendType
+from ovos_backend_client.cache import MemoryResponseCache, set_response_cache
+from ovos_backend_client.session import aiohttp
+
+
+def create_identity(uuid, expired=False):
+    mock_identity = MagicMock()
+    mock_identity.expires_at = 0  # no background refresh
+    mock_identity.is_expired.return_value = expired
+    mock_identity.uuid = uuid
+    mock_identity.access = "token"
+    return mock_identity
+
+
+@unittest.skipIf(aiohttp is None, "aiohttp not installed")
+class TestAsyncApi(unittest.TestCase):
+    # IsolatedAsyncioTestCase needs python 3.8, every test drives its own event loop
+
+    def setUp(self):
+        self._old_cache = ovos_backend_client.cache._cache
+        set_response_cache(MemoryResponseCache())
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.run_async(self.start_server())
+
+    def tearDown(self):
+        self.run_async(self.stop_server())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        set_response_cache(self._old_cache)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    async def start_server(self):
+        from aiohttp import web
+
+        self.requests = []
+
+        async def handler(request):
+            self.requests.append({"method": request.method,
+                                  "path": request.path,
+                                  "query": dict(request.query),
+                                  "headers": dict(request.headers),
+                                  "body": await request.read()})
+            return web.json_response({"uuid": "1234", "data": {"coordinate": {"latitude": 1, "longitude": 2},
+                                                               "timezone": {"code": "UTC", "name": "UTC"}}})
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop_server(self):
+        from ovos_backend_client.session import close_async_sessions
+        await close_async_sessions()
+        await self.runner.cleanup()
+
+    @patch('ovos_backend_client.identity.IdentityManager.get')
+    def test_device_get(self, mock_identity_get):
+        async def test():
+            from ovos_backend_client.async_api import AsyncDeviceApi
+            mock_identity_get.return_value = create_identity('1234')
+            device = AsyncDeviceApi(url=self.url, backend_type=BackendType.PERSONAL)
+            self.assertTrue(device.url.endswith("/device"))
+            data = await device.get()
+            self.assertEqual(data["uuid"], "1234")
+            self.assertEqual(self.requests[0]["path"], "/v1/device/1234")
+            self.assertEqual(self.requests[0]["headers"]["Authorization"], "Bearer token")
+
+        self.run_async(test())
+
+    @patch('ovos_backend_client.identity.IdentityManager.get')
+    def test_stt(self, mock_identity_get):
+        async def test():
+            from ovos_backend_client.async_api import AsyncSTTApi
+            mock_identity_get.return_value = create_identity('1234')
+            stt = AsyncSTTApi(url=self.url, backend_type=BackendType.PERSONAL)
+            await stt.stt(b'La la la', 'en-US', 1)
+            req = self.requests[0]
+            self.assertEqual(req["method"], "POST")
+            self.assertEqual(req["path"], "/v1/stt")
+            self.assertEqual(req["body"], b'La la la')
+            self.assertEqual(req["query"], {"lang": "en-US", "limit": "1"})
+            self.assertEqual(req["headers"]["Content-Type"], "audio/x-flac")
+
+        self.run_async(test())
+
+    @patch('ovos_backend_client.identity.IdentityManager.get')
+    def test_concurrent_fan_out(self, mock_identity_get):
+        async def test():
+            from ovos_backend_client.async_api import AsyncOpenWeatherMapApi, AsyncWolframAlphaApi, \
+                AsyncGeolocationApi
+            mock_identity_get.return_value = create_identity('1234')
+            owm = AsyncOpenWeatherMapApi(url=self.url, backend_type=BackendType.PERSONAL)
+            wolf = AsyncWolframAlphaApi(url=self.url, backend_type=BackendType.PERSONAL)
+            geo = AsyncGeolocationApi(url=self.url, backend_type=BackendType.PERSONAL)
+            await asyncio.gather(owm.get_current(lat_lon=(1, 2)),
+                                 wolf.spoken("2+2", lat_lon=(1, 2)),
+                                 geo.get_geolocation("Lisbon"))
+            self.assertEqual(sorted(r["path"] for r in self.requests),
+                             ["/v1/geolocation", "/v1/owm/weather", "/v1/wolframAlphaSpoken"])
+
+        self.run_async(test())
+
+    @patch('ovos_backend_client.identity.IdentityManager.get')
+    def test_dataset_upload(self, mock_identity_get):
+        async def test():
+            from ovos_backend_client.async_api import AsyncDatasetApi
+            mock_identity_get.return_value = create_identity('1234')
+            dataset = AsyncDatasetApi(url=self.url, backend_type=BackendType.PERSONAL)
+            await dataset.upload_wake_word(b"RIFF", {"name": "hey_mycroft"},
+                                           upload_url=f"{self.url}/precise/upload")
+            req = self.requests[0]
+            self.assertEqual(req["path"], "/precise/upload")
+            self.assertTrue(req["headers"]["Content-Type"].startswith("multipart/form-data"))
+            self.assertIn(b"hey_mycroft", req["body"])
+
+        self.run_async(test())
+
+    @patch('ovos_backend_client.identity.IdentityManager.get')
+    def test_metrics_batch(self, mock_identity_get):
+        async def test():
+            from ovos_backend_client.backends.async_personal import AsyncPersonalBackend
+            mock_identity_get.return_value = create_identity('1234')
+            backend = AsyncPersonalBackend(self.url)
+            self.assertIsNone(backend.metrics_buffer)  # sync-only
+            await backend.metrics_upload_batch([("timing", {"a": 1}), ("timing", {"a": 2})])
+            self.assertEqual(self.requests[0]["path"], "/v1/device/1234/metrics")
+            self.assertEqual(json.loads(self.requests[0]["body"]),
+                             [{"name": "timing", "data": {"a": 1}}, {"name": "timing", "data": {"a": 2}}])
+
+        self.run_async(test())
@@ -0,0 +1,137 @@
+import unittest
+import wave
+from io import BytesIO
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest.mock import patch
+
+from ovos_backend_client.blobs import BlobStore
+
+
+def make_wav(seed=0, channels=1, width=2):
+    buf = BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(16000)
+        w.writeframes(bytes((i * (seed + 1)) % 256 for i in range(1600 * width * channels)))
+    return buf.getvalue()
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.store = BlobStore(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_dedup(self):
+        wav = make_wav()
+        digest = self.store.put(wav)
+        self.assertEqual(self.store.put(wav), digest)
+        path = self.store.path_of(digest)
+        self.assertEqual(path, join(self.tmp.name, digest[:2], digest[2:4], f"{digest}.wav"))
+        self.assertEqual(self.store.digest_of(path), digest)
+        self.assertIsNone(self.store.digest_of("/tmp/other.wav"))
+        self.assertEqual(self.store.refcount(digest), 2)
+        self.assertNotEqual(self.store.put(make_wav(1)), digest)
+
+    def test_refcounted_delete(self):
+        digest = self.store.put(make_wav())
+        self.store.put(make_wav())
+        path = self.store.path_of(digest)
+        self.assertFalse(self.store.release(digest))
+        self.assertTrue(exists(path))
+        self.assertTrue(self.store.release(digest))
+        self.assertFalse(exists(path))
+        self.assertEqual(self.store.refcount(digest), 0)
+
+    def test_concurrent_put_release(self):
+        # separate connections, as separate processes would have
+        stores = [self.store, BlobStore(self.tmp.name), BlobStore(self.tmp.name)]
+        wav = make_wav()
+        missing = []
+
+        def worker(store):
+            for _ in range(30):
+                digest = store.put(wav)
+                if store.path_of(digest) is None:
+                    missing.append(digest)
+                store.release(digest)
+
+        threads = [Thread(target=worker, args=(s,)) for s in stores]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(missing, [])
+        digest = self.store.put(wav)
+        self.assertEqual(self.store.refcount(digest), 1)
+        self.assertIsNotNone(self.store.path_of(digest))
+
+    def test_mmap_read(self):
+        wav = make_wav()
+        data = self.store.read(self.store.put(wav))
+        self.assertEqual(data[:], wav)
+        self.assertRaises(FileNotFoundError, self.store.read, "0" * 64)
+
+    def test_flac(self):
+        store = BlobStore(self.tmp.name, compress=True)
+        wav = make_wav()
+        digest = store.put(wav)
+        self.assertTrue(store.path_of(digest).endswith(".flac"))
+        with wave.open(BytesIO(store.read(digest)), "rb") as w:
+            self.assertEqual(w.readframes(w.getnframes()), wave.open(BytesIO(wav)).readframes(3200))
+        # 8 bit samples are unsigned in WAV and survive the round trip
+        wav = make_wav(width=1)
+        digest = store.put(wav)
+        self.assertTrue(store.path_of(digest).endswith(".flac"))
+        with wave.open(BytesIO(store.read(digest)), "rb") as w:
+            self.assertEqual(w.readframes(w.getnframes()), wave.open(BytesIO(wav)).readframes(1600))
+        # stereo would be downmixed, stored as is
+        self.assertTrue(store.path_of(store.put(make_wav(channels=2))).endswith(".wav"))
+
+
+class TestOfflineRecordings(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        config = {"server": {"blob_store": {"enabled": True, "path": join(self.tmp.name, "blobs")},
+                             "database": {"engine": "sqlite", "path": join(self.tmp.name, "db.sqlite")}}}
+        self.patches = [patch("ovos_backend_client.blobs.Configuration", return_value=config),
+                        patch("ovos_backend_client.database.Configuration", return_value=config),
+                        patch("ovos_backend_client.database.get_xdg_cache_save_path", return_value=self.tmp.name)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_ww_recordings(self):
+        from ovos_backend_client.backends import OfflineBackend
+        backend = OfflineBackend()
+        wav = make_wav()
+        backend.db_post_ww_recording(wav, "hey mycroft", {"name": "hey mycroft"})
+        backend.db_post_ww_recording(wav, "hey mycroft", {"name": "hey mycroft"})
+        recs = backend.db_list_ww_recordings()
+        self.assertEqual(recs[0]["path"], recs[1]["path"])
+        self.assertTrue(backend.db_delete_ww_recording(recs[0]["wakeword_id"]))
+        self.assertTrue(exists(recs[0]["path"]))
+        self.assertTrue(backend.db_delete_ww_recording(recs[1]["wakeword_id"]))
+        self.assertFalse(exists(recs[0]["path"]))
+
+    def test_failed_delete_keeps_audio(self):
+        from ovos_backend_client.backends import OfflineBackend
+        from ovos_backend_client.database import get_wakeword_database
+        backend = OfflineBackend()
+        backend.db_post_ww_recording(make_wav(), "hey mycroft", {"name": "hey mycroft"})
+        rec = backend.db_list_ww_recordings()[0]
+        db_class = type(get_wakeword_database())
+        with patch.object(db_class, "commit", side_effect=OSError("disk full")):
+            self.assertRaises(OSError, backend.db_delete_ww_recording, rec["wakeword_id"])
+        # the record was not deleted, so neither was its audio
+        self.assertTrue(exists(rec["path"]))
+        self.assertEqual(len(backend.db_list_ww_recordings()), 1)
@@ -0,0 +1,109 @@
+import time
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+import ovos_backend_client.cache
+from ovos_backend_client.cache import MemoryResponseCache, SQLiteResponseCache, cached_response, \
+    set_response_cache
+
+
+class TestSQLiteResponseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, "responses.db")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_shared_between_instances(self):
+        # each instance has its own connection, same as separate processes
+        writer = SQLiteResponseCache(self.path)
+        reader = SQLiteResponseCache(self.path)
+        writer.set("owm", "k", {"temp": 20}, ttl=60)
+        self.assertEqual(reader.get("owm", "k"), {"temp": 20})
+        self.assertIsNone(reader.get("wolfram", "k"))
+        writer.close()
+        reader.close()
+
+    def test_ttl(self):
+        cache = SQLiteResponseCache(self.path)
+        cache.set("owm", "k", "value", ttl=-1)
+        self.assertIsNone(cache.get("owm", "k"))
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = SQLiteResponseCache(self.path, max_entries=2)
+        cache.touch_interval = 0
+        cache.set("owm", "a", 1, ttl=60)
+        time.sleep(0.01)
+        cache.set("owm", "b", 2, ttl=60)
+        time.sleep(0.01)
+        cache.get("owm", "a")  # "b" is now the least recently used
+        time.sleep(0.01)
+        cache.set("owm", "c", 3, ttl=60)
+        self.assertEqual(cache.get("owm", "a"), 1)
+        self.assertIsNone(cache.get("owm", "b"))
+        self.assertEqual(cache.get("owm", "c"), 3)
+        cache.clear("owm")
+        self.assertIsNone(cache.get("owm", "a"))
+        cache.close()
+
+    def test_read_only_hits(self):
+        cache = SQLiteResponseCache(self.path)
+        cache.set("owm", "a", 1, ttl=60)
+        cache.get("owm", "a")
+        self.assertFalse(cache._connection.in_transaction)
+        self.assertEqual(cache._connection.total_changes, 1)  # only the insert
+        cache.close()
+
+
+class TestCachedResponse(unittest.TestCase):
+    def setUp(self) -> None:
+        self._old = ovos_backend_client.cache._cache
+        set_response_cache(MemoryResponseCache())
+
+    def tearDown(self) -> None:
+        set_response_cache(self._old)
+
+    def test_decorator(self):
+        fetch = MagicMock(return_value={"temp": 20})
+
+        class Api:
+            url = "https://api.openweathermap.org"
+
+            @cached_response("owm")
+            def get_weather(self, lat_lon=None):
+                return fetch(lat_lon)
+
+        api = Api()
+        self.assertEqual(api.get_weather((1, 2)), {"temp": 20})
+        self.assertEqual(Api().get_weather((1, 2)), {"temp": 20})
+        self.assertEqual(fetch.call_count, 1)
+        api.get_weather((3, 4))
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_not_serializable(self):
+        fetch = MagicMock(return_value=object())
+
+        class Api:
+            @cached_response("wolfram")
+            def spoken(self, query):
+                return fetch(query)
+
+        Api().spoken("2+2")
+        Api().spoken("2+2")
+        self.assertEqual(fetch.call_count, 2)
+
+    @patch("ovos_backend_client.backends.offline.OfflineBackend.get")
+    def test_single_layer(self, mock_get):
+        from ovos_backend_client.api import OpenWeatherMapApi
+        from ovos_backend_client.backends import BackendType
+        mock_get.return_value.json.return_value = {"current": {"temp": 20}}
+        owm = OpenWeatherMapApi(backend_type=BackendType.OFFLINE, key="key")
+        owm.get_weather((1, 2))
+        OpenWeatherMapApi(backend_type=BackendType.OFFLINE, key="key").get_weather((1, 2))
+        self.assertEqual(mock_get.call_count, 1)
+        # the api wrapper stores the response, the backend does not cache it again
+        self.assertEqual(len(ovos_backend_client.cache._cache._data), 1)
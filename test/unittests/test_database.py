@@ -1,7 +1,7 @@
 import unittest
 
 from os import environ
-from os.path import join, dirname, exists, basename, isdir
+from os.path import join, dirname, exists, basename, isdir, getsize
 from shutil import rmtree
 
 
@@ -130,3 +130,363 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(test_db.total_apps(), 1)
 
         self.assertEqual(basename(test_db.path), "ovos_oauth_apps.json")
+
+
+class TestJsonlDatabase(unittest.TestCase):
+    def setUp(self) -> None:
+        from tempfile import TemporaryDirectory
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, "test.jsonl")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def open(self, **kwargs):
+        from ovos_backend_client.jsonl import JsonlDatabase
+        return JsonlDatabase("test", self.path, **kwargs)
+
+    def test_append_only(self):
+        with self.open() as db:
+            db.add_item({"a": 1})
+        size = getsize(self.path)
+        with self.open() as db:
+            db.add_item({"a": 2})
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)  # header + 2 inserts
+        self.assertGreater(getsize(self.path), size)
+        self.assertEqual(self.open().values(), [{"a": 1}, {"a": 2}])
+
+    def test_replay(self):
+        with self.open() as db:
+            for i in range(4):
+                db.add_item({"i": i})
+        with self.open() as db:
+            db[1] = {"i": 10}
+            db.pop(0)
+        db = self.open()
+        self.assertEqual(db.values(), [{"i": 10}, {"i": 2}, {"i": 3}])
+        self.assertEqual(db.get(5), None)
+        self.assertEqual(len(db), 3)
+
+    def test_tail_reload(self):
+        from ovos_backend_client import jsonl
+        with self.open() as db:
+            db.add_item({"i": 0})
+        with self.open() as db:
+            db.add_item({"i": 1})
+        # a change appended by another process
+        with open(self.path, "a") as f:
+            f.write('{"op": "add", "item": {"i": 2}}\n{"op": "add", "item"')
+        db = self.open()
+        self.assertEqual(db.values(), [{"i": 0}, {"i": 1}, {"i": 2}])
+        # the partial line is left for the next load
+        self.assertEqual(jsonl._loaded[self.path][1], getsize(self.path) - len('{"op": "add", "item"'))
+
+    def test_compaction(self):
+        db = self.open(compact_ratio=1)
+        db.add_item({"i": 0})
+        db.commit()
+        for i in range(150):
+            db[0] = {"i": i}
+            db.commit()
+        with open(self.path) as f:
+            self.assertLess(len(f.read().splitlines()), 110)
+        self.assertEqual(self.open().values(), [{"i": 149}])
+
+    def test_concurrent_writers(self):
+        with self.open() as db:
+            for i in range(3):
+                db.add_item({"i": i})
+        a, b = self.open(), self.open()
+        a.add_item({"i": "a"})
+        a.pop(0)
+        a.commit()
+        # b still sees the log as it was before a committed
+        b.add_item({"i": "b"})
+        b[2] = {"i": 20}
+        b[0] = {"i": 0}  # deleted by a, dropped
+        b.commit()
+        expected = [{"i": 1}, {"i": 20}, {"i": "a"}, {"i": "b"}]
+        self.assertEqual(b.values(), expected)
+        self.assertEqual(self.open().values(), expected)
+
+    def test_uncommitted_changes_are_private(self):
+        with self.open() as db:
+            db.add_item({"k": 1})
+        a, b = self.open(), self.open()
+        self.assertIs(a._items, b._items)  # the loaded snapshot is shared, not copied
+        b[0]["k"] = 99  # modifies a copy
+        b.get(0)["k"] = 99
+        b.values()[0]["k"] = 99
+        self.assertEqual(self.open()[0], {"k": 1})
+        b[0] = {"k": 2}
+        self.assertEqual(a[0], {"k": 1})
+        self.assertEqual(self.open()[0], {"k": 1})
+        b.commit()
+        self.assertEqual(self.open()[0], {"k": 2})
+
+    def test_compaction_keeps_other_writers(self):
+        a, b = self.open(compact_ratio=1), self.open(compact_ratio=1)
+        a.add_item({"i": 0})
+        a.commit()
+        b.add_item({"b": 0})
+        b.commit()
+        for i in range(150):  # compacts, rewriting the log from a's view
+            a[0] = {"i": i}
+            a.commit()
+        self.assertEqual(self.open().values(), [{"i": 149}, {"b": 0}])
+
+    def test_legacy_import(self):
+        import json
+        legacy = join(self.tmp.name, "test.jsondb")
+        with open(legacy, "w") as f:
+            json.dump({"test": [{"i": 0}, {"i": 1}]}, f)
+        db = self.open(legacy_path=legacy)
+        self.assertEqual(db.values(), [{"i": 0}, {"i": 1}])
+        self.assertTrue(exists(self.path))
+        with open(self.path) as f:
+            header = json.loads(f.readline())
+        self.assertEqual(header["version"], 1)
+
+    def test_engine_selection(self):
+        from unittest.mock import patch
+        from ovos_backend_client.database import JsonlMetricDatabase, JsonMetricDatabase, get_metric_database
+        with patch("ovos_backend_client.database.Configuration") as mock_config:
+            mock_config.return_value = {"server": {"database": {"engine": "jsonl"}}}
+            with patch("ovos_backend_client.database.get_xdg_cache_save_path", return_value=self.tmp.name):
+                db = get_metric_database()
+                self.assertIsInstance(db, JsonlMetricDatabase)
+                db.add_metric("test", {"a": 1})
+                db.commit()
+                self.assertEqual(get_metric_database().total_metrics(), 1)
+            mock_config.return_value = {}
+            self.assertIsInstance(get_metric_database(), JsonMetricDatabase)
+
+
+class TestSQLiteDatabase(unittest.TestCase):
+    def setUp(self) -> None:
+        from tempfile import TemporaryDirectory
+        from unittest.mock import patch
+        self.tmp = TemporaryDirectory()
+        self.patches = [patch("ovos_backend_client.database.Configuration",
+                              return_value={"server": {"database": {"engine": "sqlite"}}}),
+                        patch("ovos_backend_client.database.get_xdg_cache_save_path", return_value=self.tmp.name)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_wal(self):
+        from ovos_backend_client.database import get_metric_database, SQLiteMetricDatabase
+        db = get_metric_database()
+        self.assertIsInstance(db, SQLiteMetricDatabase)
+        self.assertEqual(db.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(db.path, join(self.tmp.name, "ovos_backend.db"))
+
+    def test_stable_ids(self):
+        from ovos_backend_client.database import get_wakeword_database
+        with get_wakeword_database() as db:
+            for i in range(3):
+                db.add_wakeword(f"hey {i}", f"/tmp/{i}.wav", tag="wake_word")
+        with get_wakeword_database() as db:
+            self.assertTrue(db.delete_wakeword(0))
+            self.assertFalse(db.delete_wakeword(0))
+            ww = db.add_wakeword("hey 3", "/tmp/3.wav")
+        self.assertEqual(ww.wakeword_id, 3)
+        db = get_wakeword_database()
+        self.assertEqual(db.total_wakewords(), 3)
+        self.assertEqual(db.get_wakeword(2).transcription, "hey 2")
+        db.update_wakeword(2, transcription="hey mycroft")
+        db.commit()
+        self.assertEqual(get_wakeword_database().get_wakeword(2).transcription, "hey mycroft")
+        self.assertEqual([w["wakeword_id"] for w in db.values()], [1, 2, 3])
+
+    def test_isolation(self):
+        from ovos_backend_client.database import get_metric_database
+        writer = get_metric_database()
+        writer.add_metric("test", {"a": 1})
+        # readers only see committed changes
+        self.assertEqual(get_metric_database().total_metrics(), 0)
+        writer.commit()
+        self.assertEqual(get_metric_database().total_metrics(), 1)
+        writer.add_metric("test", {"a": 2})
+        writer.reset()
+        self.assertEqual(get_metric_database().total_metrics(), 1)
+
+    def test_legacy_import(self):
+        import json
+        from os import makedirs
+        from ovos_backend_client.database import get_utterance_database, get_oauth_token_database
+        folder = join(self.tmp.name, "json_database")
+        makedirs(folder)
+        with open(join(folder, "ovos_utterances.jsondb"), "w") as f:
+            json.dump({"ovos_utterances": [{"utterance_id": 0, "transcription": "hello",
+                                            "path": "/tmp/0.wav", "uuid": "AnonDevice"}]}, f)
+        with open(join(folder, "ovos_oauth.json"), "w") as f:
+            json.dump({"spotify": {"access_token": "x"}}, f)
+        self.assertEqual(get_utterance_database().get_utterance(0).transcription, "hello")
+        self.assertEqual(get_oauth_token_database().get_token("spotify"), {"access_token": "x"})
+        # imported only once
+        with get_oauth_token_database() as db:
+            self.assertTrue(db.delete_token("spotify"))
+        self.assertEqual(get_oauth_token_database().total_tokens(), 0)
+
+    def test_oauth_apps(self):
+        from ovos_backend_client.database import get_oauth_app_database, SQLiteOAuthApplicationDatabase
+        with get_oauth_app_database() as db:
+            self.assertIsInstance(db, SQLiteOAuthApplicationDatabase)
+            db.add_application("test_service", "id", "secret", "auth", "token", "callback", "scope")
+        db = get_oauth_app_database()
+        self.assertEqual(db.get_application("test_service")["client_id"], "id")
+        self.assertEqual(db.total_apps(), 1)
+        self.assertIsNone(db.get_application("other"))
+
+
+class _TmpDatabaseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        from tempfile import TemporaryDirectory
+        from unittest.mock import patch
+        self.tmp = TemporaryDirectory()
+        self.patches = [patch("ovos_backend_client.database.get_xdg_cache_save_path", return_value=self.tmp.name),
+                        patch("ovos_backend_client.database.Configuration")]
+        self.config = self.patches[1].start()
+        self.patches[0].start()
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+
+class TestPagination(_TmpDatabaseTest):
+    def test_offline_pages(self):
+        from ovos_backend_client.backends import OfflineBackend
+        from ovos_backend_client.database import get_metric_database
+        for engine in ("sqlite", "jsonl"):
+            self.config.return_value = {"server": {"database": {"engine": engine}}}
+            with get_metric_database() as db:
+                for i in range(7):
+                    db.add_metric("test", {"i": i})
+            backend = OfflineBackend()
+            self.assertEqual([m["meta"]["i"] for m in backend.db_list_metrics(2, 3)], [2, 3, 4])
+            self.assertEqual(len(backend.db_list_metrics()), 7)
+            self.assertEqual([m["meta"]["i"] for m in backend.iter_metrics(page_size=3)], list(range(7)))
+
+    def test_personal_pages(self):
+        from unittest.mock import MagicMock, patch
+        from ovos_backend_client.backends import PersonalBackend
+        recs = [{"id": i} for i in range(5)]
+
+        def get(url, params=None, **kwargs):
+            page = recs[params["offset"]:params["offset"] + params["limit"]]
+            return MagicMock(json=MagicMock(return_value=page))
+
+        backend = PersonalBackend("https://api.test", credentials={"admin": "key"})
+        with patch.object(PersonalBackend, "get", side_effect=get) as mock_get:
+            self.assertEqual(list(backend.iter_ww_recordings(page_size=2)), recs)
+            # the server is probed once with limit=1 the first time offset is set
+            self.assertEqual(mock_get.call_count, 4)
+            self.assertEqual(mock_get.call_args_list[2][1]["params"], {"offset": 0, "limit": 1})
+            self.assertEqual(mock_get.call_args[1]["params"], {"offset": 4, "limit": 2})
+            self.assertTrue(mock_get.call_args[1]["url"].endswith("/v1/admin/ww_recs/list"))
+        # servers without pagination return everything
+        with patch.object(PersonalBackend, "get", return_value=MagicMock(json=MagicMock(return_value=recs))):
+            self.assertEqual(backend.db_list_ww_recordings(1, 2), recs[1:3])
+            self.assertEqual(list(backend.iter_ww_recordings(page_size=2)), recs)
+            # once detected, pages are sliced even when the response is not longer than limit
+            self.assertEqual(backend.db_list_ww_recordings(3, 5), recs[3:])
+            self.assertEqual(backend.db_list_ww_recordings(2), recs[2:])
+        # not longer than limit, the probe shows the offset was ignored
+        backend = PersonalBackend("https://api.test", credentials={"admin": "key"})
+        with patch.object(PersonalBackend, "get", return_value=MagicMock(json=MagicMock(return_value=recs))):
+            self.assertEqual(backend.db_list_devices(offset=2, limit=10), recs[2:])
+
+
+class TestQueries(_TmpDatabaseTest):
+    def test_offline_queries(self):
+        from ovos_backend_client.backends import OfflineBackend
+        from ovos_backend_client.database import AudioTag, SpeakerTag, get_wakeword_database
+        backend = OfflineBackend()
+        for engine in ("sqlite", "jsonl"):
+            self.config.return_value = {"server": {"database": {"engine": engine}}}
+            with get_wakeword_database() as db:
+                for i in range(6):
+                    db.add_wakeword("hey mycroft", f"/tmp/{i}.wav", uuid=f"dev{i % 2}",
+                                    tag=AudioTag.WAKE_WORD if i % 3 else AudioTag.UNTAGGED,
+                                    speaker_type=SpeakerTag.FEMALE)
+                # recorded before timestamps were tracked
+                db.add_item({"wakeword_id": 6, "transcription": "hey mycroft", "path": "/tmp/6.wav",
+                             "uuid": "dev0", "tag": "untagged", "speaker_type": "untagged"})
+            recs = backend.db_query_ww_recordings(tag=AudioTag.UNTAGGED)
+            self.assertEqual([r["wakeword_id"] for r in recs], [0, 3, 6])
+            recs = backend.db_query_ww_recordings(tag="wake_word", uuid="dev1", limit=1)
+            self.assertEqual([r["wakeword_id"] for r in recs], [1])
+            self.assertEqual(len(backend.db_query_ww_recordings(since=0)), 6)
+            self.assertEqual(backend.db_query_ww_recordings(since=2e9), [])
+
+    def test_offline_metric_queries(self):
+        from ovos_backend_client.backends import OfflineBackend
+        self.config.return_value = {"server": {"database": {"engine": "sqlite"}}}
+        backend = OfflineBackend()
+        backend.db_post_metrics([("timing", {"i": 0}), ("intent", {"i": 1}), ("timing", {"i": 2})])
+        self.assertEqual([m["meta"]["i"] for m in backend.db_query_metrics(metric_type="timing")], [0, 2])
+        self.assertEqual(backend.db_query_metrics(uuid="other"), [])
+
+    def test_personal_filters(self):
+        from unittest.mock import MagicMock, patch
+        from ovos_backend_client.backends import PersonalBackend
+        from ovos_backend_client.database import AudioTag
+        recs = [{"id": i, "tag": "untagged" if i % 2 else "wake_word"} for i in range(5)]
+        backend = PersonalBackend("https://api.test", credentials={"admin": "key"})
+        with patch.object(PersonalBackend, "get", return_value=MagicMock(json=MagicMock(return_value=recs))) as get:
+            # a server without filter support, results are filtered locally
+            self.assertEqual(backend.db_query_ww_recordings(tag=AudioTag.UNTAGGED), [recs[1], recs[3]])
+            self.assertEqual(get.call_args[1]["params"], {"tag": "untagged", "offset": 0})
+
+    def test_personal_filters_paged_server(self):
+        from functools import partial
+        from unittest.mock import MagicMock, patch
+        from ovos_backend_client.backends import PersonalBackend
+        recs = [{"id": i, "tag": "wake_word" if i % 10 == 9 else "untagged"} for i in range(250)]
+
+        def get(url, params=None, **kwargs):
+            # pages, but ignores the filters
+            page = recs[params["offset"]:params["offset"] + params["limit"]]
+            return MagicMock(json=MagicMock(return_value=page))
+
+        backend = PersonalBackend("https://api.test", credentials={"admin": "key"})
+        matches = [r for r in recs if r["tag"] == "wake_word"]
+        with patch.object(PersonalBackend, "get", side_effect=get):
+            self.assertEqual(backend.db_query_ww_recordings(tag="wake_word", limit=10), matches[:10])
+            self.assertEqual(backend.db_query_ww_recordings(tag="wake_word", offset=20, limit=10), matches[20:])
+            pages = partial(backend.db_query_ww_recordings, tag="wake_word")
+            self.assertEqual(list(backend._iter_pages(pages, page_size=10)), matches)
+
+
+class TestOAuthExpiry(_TmpDatabaseTest):
+    def test_refresh_expired_only(self):
+        import asyncio
+        import time
+        from unittest.mock import patch
+        from ovos_backend_client.backends import AsyncOfflineBackend, OfflineBackend
+        self.config.return_value = {"server": {"database": {"engine": "sqlite"}}}
+        backend = OfflineBackend()
+        backend.db_post_oauth_token("valid", {"access_token": "a", "expires_at": time.time() + 3600})
+        backend.db_post_oauth_token("expired", {"access_token": "b", "expires_at": time.time() - 1})
+        with patch.object(OfflineBackend, "oauth_refresh_token", return_value="refreshed") as refresh:
+            self.assertEqual(backend.oauth_get_token("valid")["access_token"], "a")
+            refresh.assert_not_called()
+            self.assertEqual(backend.oauth_get_token("expired"), "refreshed")
+
+        async def refreshed(dev_cred):
+            return "refreshed"
+
+        backend = AsyncOfflineBackend()
+        with patch.object(AsyncOfflineBackend, "oauth_refresh_token", side_effect=refreshed) as refresh:
+            self.assertEqual(asyncio.run(backend.oauth_get_token("valid"))["access_token"], "a")
+            refresh.assert_not_called()
+            self.assertEqual(asyncio.run(backend.oauth_get_token("expired")), "refreshed")
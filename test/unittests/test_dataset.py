@@ -0,0 +1,116 @@
+import os
+import tarfile
+import unittest
+import wave
+from io import BytesIO
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+
+def make_wav(seed=0):
+    buf = BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(bytes((i * (seed + 1)) % 256 for i in range(3200)))
+    return buf.getvalue()
+
+
+class TestDatasetArchives(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.configure("device1")
+
+    def configure(self, folder):
+        for p in getattr(self, "patches", []):
+            p.stop()
+        root = join(self.tmp.name, folder)
+        config = {"server": {"database": {"engine": "sqlite", "path": join(root, "db.sqlite")}},
+                  "listener": {"save_path": join(root, "recordings")}}
+        self.patches = [patch("ovos_backend_client.database.Configuration", return_value=config),
+                        patch("ovos_backend_client.dataset.Configuration", return_value=config),
+                        patch("ovos_backend_client.backends.offline.Configuration", return_value=config),
+                        patch("ovos_backend_client.database.get_xdg_cache_save_path", return_value=root)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        from ovos_backend_client.api import DatasetApi
+        from ovos_backend_client.backends import BackendType, OfflineBackend
+        from ovos_backend_client.database import get_utterance_database, get_wakeword_database
+        api = DatasetApi(backend_type=BackendType.OFFLINE)
+        backend = OfflineBackend()
+        backend.db_post_ww_recording(make_wav(0), "hey mycroft", {"name": "hey mycroft", "n": 0})
+        backend.db_post_ww_recording(make_wav(1), "hey mycroft", {"name": "hey mycroft", "n": 1})
+        backend.db_post_stt_recording(make_wav(2), "what time is it")
+
+        archive = BytesIO()
+        self.assertEqual(api.export_dataset(archive, compression="gz"), 3)
+        archive.seek(0)
+        with tarfile.open(fileobj=archive, mode="r:gz") as tar:
+            names = tar.getnames()
+        self.assertEqual(names[:2], ["wakewords/00000000.json", "wakewords/00000000.wav"])
+        self.assertIn("wakewords.jsonl", names)
+        self.assertIn("utterances/00000000.wav", names)
+
+        self.configure("device2")
+        archive.seek(0)
+        self.assertEqual(api.import_dataset(archive, uuid="device2"), 3)
+        wws = get_wakeword_database().values()
+        self.assertEqual([w["meta"]["n"] for w in wws], [0, 1])
+        self.assertEqual({w["uuid"] for w in wws}, {"device2"})
+        with open(wws[1]["path"], "rb") as f:
+            self.assertEqual(f.read(), make_wav(1))
+        self.assertEqual(get_utterance_database().get_utterance(0).transcription, "what time is it")
+
+    def test_remote_backend(self):
+        from ovos_backend_client.api import DatasetApi
+        from ovos_backend_client.backends import BackendType
+        api = DatasetApi(url="https://api-test.mycroft.ai", backend_type=BackendType.PERSONAL)
+        self.assertRaises(ValueError, api.export_dataset, BytesIO())
+        self.assertRaises(ValueError, api.import_dataset, BytesIO())
+
+    def test_orphan_metadata(self):
+        from ovos_backend_client.dataset import import_dataset
+        from ovos_backend_client.database import get_wakeword_database
+        archive = BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            for name, data in [("wakewords/1.json", b'{"transcription": "lost"}'),
+                               ("wakewords/2.json", b'{"transcription": "hey"}'), ("wakewords/2.wav", make_wav()),
+                               ("wakewords/1.wav", make_wav(1))]:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, BytesIO(data))
+        archive.seek(0)
+        self.assertEqual(import_dataset(archive), 1)
+        self.assertEqual([w["transcription"] for w in get_wakeword_database().values()], ["hey"])
+
+    def test_failed_export(self):
+        from ovos_backend_client.dataset import _TarWriter, export_dataset
+        with patch("ovos_backend_client.dataset._database", side_effect=KeyError("db")), \
+                patch.object(_TarWriter, "close", side_effect=RuntimeError("compressor")):
+            # the original error is raised, not the one closing the archive
+            self.assertRaises(KeyError, export_dataset, BytesIO())
+
+    def test_failed_import(self):
+        from ovos_backend_client.dataset import import_dataset
+        from ovos_backend_client.database import get_wakeword_database
+        archive = BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            for name, data in [("wakewords/1.json", b'{"transcription": "hey"}'), ("wakewords/1.wav", make_wav()),
+                               ("wakewords/2.json", b"not json")]:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, BytesIO(data))
+        archive.seek(0)
+        self.assertRaises(ValueError, import_dataset, archive)
+        # nothing committed, and the audio saved for the rolled back record was removed
+        self.assertEqual(len(get_wakeword_database()), 0)
+        self.assertEqual(os.listdir(join(self.tmp.name, "device1", "recordings")), [])
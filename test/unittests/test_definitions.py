@@ -0,0 +1,76 @@
+import json
+import os
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.definitions import DefinitionsCatalog
+
+
+class TestDefinitionsCatalog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        os.makedirs(join(self.tmp.name, "en-us"))
+        self.write("en-us", "a", {"n": 1})
+
+        def load():
+            defs = {}
+            for lang in os.listdir(self.tmp.name):
+                for f in os.listdir(join(self.tmp.name, lang)):
+                    with open(join(self.tmp.name, lang, f)) as fp:
+                        defs[f[:-5]] = json.load(fp)
+            return defs
+
+        self.load = MagicMock(side_effect=load)
+        self.catalog = DefinitionsCatalog(self.tmp.name, self.load, rescan_interval=0)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write(self, lang, name, data):
+        with open(join(self.tmp.name, lang, f"{name}.json"), "w") as f:
+            json.dump(data, f)
+
+    def test_memoized(self):
+        for _ in range(10):
+            self.assertEqual(self.catalog.get("a"), {"n": 1})
+        self.assertIsNone(self.catalog.get("b"))
+        self.assertEqual(self.load.call_count, 1)
+        # copies are returned
+        self.catalog.get("a")["n"] = 2
+        self.assertEqual(self.catalog.values(), [{"n": 1}])
+
+    def test_invalidation(self):
+        self.assertEqual(len(self.catalog), 1)
+        self.write("en-us", "b", {"n": 2})
+        os.utime(join(self.tmp.name, "en-us"), ns=(0, 0))  # mtime granularity of some filesystems
+        self.assertEqual(self.catalog.get("b"), {"n": 2})
+        os.makedirs(join(self.tmp.name, "pt-pt"))
+        self.write("pt-pt", "c", {"n": 3})
+        self.assertIn("c", self.catalog)
+        self.assertEqual(self.load.call_count, 3)
+        # edits inside existing files change their mtime
+        self.write("en-us", "a", {"n": 10})
+        os.utime(join(self.tmp.name, "en-us", "a.json"), ns=(0, 0))
+        self.assertEqual(self.catalog.get("a"), {"n": 10})
+        self.assertEqual(self.load.call_count, 4)
+        self.catalog.invalidate()
+        self.assertEqual(self.catalog.get("a"), {"n": 10})
+        self.assertEqual(self.load.call_count, 5)
+
+    def test_rescan_interval(self):
+        catalog = DefinitionsCatalog(self.tmp.name, self.load, rescan_interval=60)
+        self.assertEqual(len(catalog), 1)
+        self.write("en-us", "b", {"n": 2})
+        os.utime(join(self.tmp.name, "en-us"), ns=(0, 0))
+        with patch("os.scandir") as mock_scandir:
+            self.assertIsNone(catalog.get("b"))  # not checked again yet
+            mock_scandir.assert_not_called()
+        catalog._scanned_at -= 60
+        self.assertEqual(catalog.get("b"), {"n": 2})
+
+    def test_missing_folder(self):
+        catalog = DefinitionsCatalog(join(self.tmp.name, "missing"), dict)
+        self.assertEqual(catalog.values(), [])
+        self.assertIsNone(catalog.get("a"))
@@ -0,0 +1,137 @@
+import math
+import random
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from ovos_backend_client.geocoding import ForwardGeocoder, Gazetteer, KDTree, ReverseGeocoder, _to_xyz, \
+    normalize_place_name
+
+CITIES = [
+    # geonameid, name, asciiname, alternatenames, lat, lon, class, code, cc, cc2, admin1, admin2,
+    # admin3, admin4, population, elevation, dem, timezone, modification date
+    ["2267057", "Lisbon", "Lisbon", "", "38.71667", "-9.13333", "P", "PPLC", "PT", "", "14", "",
+     "", "", "517802", "", "45", "Europe/Lisbon", "2022-01-01"],
+    ["2735943", "Porto", "Porto", "", "41.14961", "-8.61099", "P", "PPLA", "PT", "", "17", "",
+     "", "", "249633", "", "94", "Europe/Lisbon", "2022-01-01"],
+    ["4274277", "Lawrence", "Lawrence", "", "38.97167", "-95.23525", "P", "PPL", "US", "", "KS", "",
+     "", "", "96892", "", "264", "America/Chicago", "2022-01-01"],
+    ["2193733", "Auckland", "Auckland", "", "-36.84853", "174.76349", "P", "PPLA", "NZ", "", "E7", "",
+     "", "", "417910", "", "26", "Pacific/Auckland", "2022-01-01"],
+]
+
+
+def write_gazetteer(folder, cities_data=CITIES):
+    cities = join(folder, "cities.txt")
+    with open(cities, "w") as f:
+        for c in cities_data:
+            f.write("\t".join(c) + "\n")
+    admin1 = join(folder, "admin1.txt")
+    with open(admin1, "w") as f:
+        f.write("PT.14\tLisbon\tLisbon\t2267056\nUS.KS\tKansas\tKansas\t4273857\n")
+    countries = join(folder, "countries.txt")
+    with open(countries, "w") as f:
+        f.write("#ISO\tISO3\tISO-Numeric\tfips\tCountry\n")
+        f.write("PT\tPRT\t620\tPO\tPortugal\nUS\tUSA\t840\tUS\tUnited States\n")
+    return cities, admin1, countries
+
+
+class TestKDTree(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rnd = random.Random(42)
+        coords = [(rnd.uniform(-90, 90), rnd.uniform(-180, 180)) for _ in range(500)]
+        points = [_to_xyz(*c) for c in coords]
+        tree = KDTree(points)
+        for _ in range(100):
+            q = _to_xyz(rnd.uniform(-90, 90), rnd.uniform(-180, 180))
+            # math.dist and n-dimensional math.hypot need python 3.8
+            expected = min(range(len(points)), key=lambda i: math.sqrt(sum((a - b) ** 2 for a, b in zip(points[i], q))))
+            self.assertEqual(tree.nearest(q), expected)
+
+    def test_empty(self):
+        self.assertEqual(KDTree([]).nearest((0, 0, 1)), -1)
+
+
+class TestReverseGeocoder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.gazetteer = Gazetteer(*write_gazetteer(self.tmp.name))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_reverse(self):
+        geocoder = ReverseGeocoder(self.gazetteer)
+        loc = geocoder.reverse(38.7, -9.1)
+        self.assertEqual(loc["city"]["name"], "Lisbon")
+        self.assertEqual(loc["city"]["state"]["name"], "Lisbon")
+        self.assertEqual(loc["city"]["state"]["country"], {"code": "PT", "name": "Portugal"})
+        self.assertEqual(loc["timezone"], {"name": "Europe Lisbon", "code": "Europe/Lisbon"})
+        self.assertEqual(loc["coordinate"], {"latitude": 38.7, "longitude": -9.1})
+        self.assertEqual(geocoder.reverse(39, -95)["city"]["state"]["code"], "KS")
+        # across the antimeridian
+        self.assertEqual(geocoder.reverse(-36.8, -179.9)["city"]["name"], "Auckland")
+
+    @patch("ovos_backend_client.backends.offline.OfflineBackend.get")
+    @patch("ovos_backend_client.backends.offline.get_reverse_geocoder")
+    def test_offline_backend(self, mock_get_geocoder, mock_get):
+        from ovos_backend_client.backends import OfflineBackend
+        mock_get_geocoder.return_value = ReverseGeocoder(self.gazetteer)
+        # __wrapped__ bypasses the response cache
+        loc = OfflineBackend.reverse_geolocation_get.__wrapped__(OfflineBackend(), 41.1, -8.6)
+        self.assertEqual(loc["city"]["name"], "Porto")
+        mock_get.assert_not_called()
+
+
+class TestForwardGeocoder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        cities = CITIES + [
+            ["4393217", "Kansas City", "Kansas City", "", "39.09973", "-94.57857", "P", "PPL", "US", "", "MO", "",
+             "", "", "508090", "", "274", "America/Chicago", "2022-01-01"],
+            ["4273837", "Kansas City", "Kansas City", "", "39.11417", "-94.62746", "P", "PPLA2", "US", "", "KS",
+             "", "", "", "156607", "", "280", "America/Chicago", "2022-01-01"],
+            ["3448439", "São Paulo", "Sao Paulo", "", "-23.5475", "-46.63611", "P", "PPLA", "BR", "", "27", "",
+             "", "", "10021295", "", "769", "America/Sao_Paulo", "2022-01-01"]]
+        paths = write_gazetteer(self.tmp.name, cities)
+        with open(paths[1], "a") as f:
+            f.write("US.MO\tMissouri\tMissouri\t4398678\n")
+        self.gazetteer = Gazetteer(*paths)
+        self.geocoder = ForwardGeocoder(self.gazetteer, join(self.tmp.name, "places.idx"))
+
+    def tearDown(self) -> None:
+        self.geocoder.index.close()
+        self.tmp.cleanup()
+
+    def test_normalize(self):
+        self.assertEqual(normalize_place_name("  São Paulo, Brazil!"), "sao paulo brazil")
+
+    def test_index(self):
+        index = self.geocoder.index
+        self.assertEqual(len(index.lookup("kansas city")), 2)
+        self.assertEqual(index.lookup("kansas"), [])
+        self.assertEqual(sorted(self.gazetteer.names[i] for i in index.prefix("l")), ["Lawrence", "Lisbon"])
+        self.assertEqual(index.prefix("zzz"), [])
+        self.assertEqual(index.prefix("a"), [3])
+
+    def test_geocode(self):
+        self.assertEqual(self.geocoder.geocode("Kansas City Missouri")["city"]["state"]["code"], "MO")
+        self.assertEqual(self.geocoder.geocode("kansas city, KS")["city"]["state"]["code"], "KS")
+        # most populated wins without qualifiers
+        self.assertEqual(self.geocoder.geocode("Kansas City")["city"]["state"]["code"], "MO")
+        loc = self.geocoder.geocode("Lisbon Portugal")
+        self.assertEqual(loc["coordinate"], {"latitude": 38.71667, "longitude": -9.13333})
+        self.assertEqual(self.geocoder.geocode("sao paulo")["city"]["name"], "São Paulo")
+        self.assertIsNone(self.geocoder.geocode("Lisbon Spain"))
+        self.assertIsNone(self.geocoder.geocode("Atlantis"))
+
+    @patch("ovos_backend_client.backends.offline.OfflineBackend.get")
+    @patch("ovos_backend_client.backends.offline.get_forward_geocoder")
+    def test_offline_backend(self, mock_get_geocoder, mock_get):
+        from ovos_backend_client.backends import OfflineBackend
+        mock_get_geocoder.return_value = self.geocoder
+        # __wrapped__ bypasses the response cache
+        loc = OfflineBackend.geolocation_get.__wrapped__(OfflineBackend(), "Porto")
+        self.assertEqual(loc["city"]["name"], "Porto")
+        mock_get.assert_not_called()
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.identity import IdentityManager, TokenRefresher
+
+
+class TestIdentityCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._old_file = IdentityManager.IDENTITY_FILE
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, "identity2.json")
+        with open(self.path, "w") as f:
+            json.dump({"uuid": "1234", "access": "a", "refresh": "r", "expires_at": -1}, f)
+
+    def tearDown(self) -> None:
+        IdentityManager.IDENTITY_FILE = self._old_file
+        IdentityManager.load()
+        self.tmp.cleanup()
+
+    def test_cached_reads(self):
+        IdentityManager.set_identity_file(self.path)
+        self.assertEqual(IdentityManager.get().uuid, "1234")
+        with patch.object(IdentityManager, "_load") as mock_load:
+            for _ in range(5):
+                IdentityManager.set_identity_file(self.path)
+                self.assertEqual(IdentityManager.get().uuid, "1234")
+            mock_load.assert_not_called()
+
+    def test_reload_on_change(self):
+        IdentityManager.set_identity_file(self.path)
+        self.assertEqual(IdentityManager.get().uuid, "1234")
+        # replace the file, new inode and size
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"uuid": "56789", "access": "b"}, f)
+        os.replace(tmp_path, self.path)
+        self.assertTrue(IdentityManager.is_stale())
+        self.assertEqual(IdentityManager.get().uuid, "56789")
+        self.assertFalse(IdentityManager.is_stale())
+
+    def test_save_revalidates(self):
+        IdentityManager.set_identity_file(self.path)
+        IdentityManager.save({"uuid": "abcd", "accessToken": "x", "expiration": 10})
+        self.assertFalse(IdentityManager.is_stale())
+        with patch.object(IdentityManager, "_load") as mock_load:
+            self.assertEqual(IdentityManager.get().uuid, "abcd")
+            mock_load.assert_not_called()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)["uuid"], "abcd")
+
+
+class TestTokenRefresher(unittest.TestCase):
+    def setUp(self) -> None:
+        self._old_file = IdentityManager.IDENTITY_FILE
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, "identity2.json")
+        with open(self.path, "w") as f:
+            json.dump({"uuid": "1234", "access": "a", "refresh": "r",
+                       "expires_at": time.time() - 10}, f)
+        IdentityManager.set_identity_file(self.path)
+
+    def tearDown(self) -> None:
+        IdentityManager.IDENTITY_FILE = self._old_file
+        IdentityManager.load()
+        self.tmp.cleanup()
+
+    def test_single_flight(self):
+        calls = []
+
+        def refresh_func(identity):
+            calls.append(identity.access)
+            time.sleep(0.2)
+            return {"uuid": "1234", "accessToken": "b", "refreshToken": "r2", "expiration": 3600}
+
+        refresher = TokenRefresher(refresh_func, margin=60, jitter=0)
+        threads = [Thread(target=refresher.refresh) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        refresher.shutdown()
+        self.assertEqual(calls, ["a"])
+        self.assertEqual(IdentityManager.get().access, "b")
+
+    def test_skip_if_already_refreshed(self):
+        refresh_func = MagicMock()
+        IdentityManager.save({"uuid": "1234", "accessToken": "b", "refreshToken": "r2", "expiration": 3600})
+        refresher = TokenRefresher(refresh_func, margin=60, jitter=0)
+        refresher.refresh()
+        refresher.shutdown()
+        refresh_func.assert_not_called()
+
+    def test_schedule(self):
+        IdentityManager.save({"uuid": "1234", "accessToken": "b", "refreshToken": "r2", "expiration": 3600})
+        refresher = TokenRefresher(MagicMock(), margin=60, jitter=0)
+        refresher.check()
+        timer = refresher._timer
+        self.assertTrue(timer.is_alive())
+        self.assertAlmostEqual(timer.interval, 3600 - 60, delta=5)
+        refresher.check()  # same expiration, not rescheduled
+        self.assertIs(refresher._timer, timer)
+        refresher.shutdown()
+        self.assertFalse(timer.is_alive() and not timer.finished.is_set())
+
+    def test_timer_refresh_with_jitter(self):
+        IdentityManager.save({"uuid": "1234", "accessToken": "b", "refreshToken": "r2", "expiration": 1.5})
+        refreshed = Event()
+
+        def refresh_func(identity):
+            refreshed.set()
+            return {"uuid": "1234", "accessToken": "c", "refreshToken": "r3", "expiration": 3600}
+
+        # fires between 0.1 and 0.5 seconds, before the token is within margin of expiring
+        refresher = TokenRefresher(refresh_func, margin=1, jitter=0.4)
+        refresher.schedule()
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(50):  # rescheduled from the timer thread itself
+            if refresher._timer is not None and refresher._scheduled_for == IdentityManager.get().expires_at:
+                break
+            time.sleep(0.05)
+        timer = refresher._timer
+        refresher.shutdown()
+        self.assertEqual(IdentityManager.get().access, "c")
+        self.assertIsNotNone(timer)
+        self.assertAlmostEqual(timer.interval, 3600 - 1, delta=5)
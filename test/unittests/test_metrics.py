@@ -0,0 +1,145 @@
+import unittest
+from threading import Event
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.metrics import MetricsBuffer
+
+
+class TestMetricsBuffer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.batches = []
+        self.flushed = Event()
+
+        def flush(events):
+            self.batches.append(events)
+            self.flushed.set()
+
+        self.buffer = MetricsBuffer(flush, max_events=3, interval=60)
+
+    def tearDown(self) -> None:
+        self.buffer.shutdown()
+
+    def test_flush_on_size(self):
+        self.buffer.report("a", {"n": 1})
+        self.buffer.report("b", {"n": 2})
+        self.assertFalse(self.flushed.wait(0.1))
+        self.buffer.report("c", {"n": 3})
+        self.assertTrue(self.flushed.wait(2))
+        self.assertEqual(self.batches, [[("a", {"n": 1}), ("b", {"n": 2}), ("c", {"n": 3})]])
+
+    def test_flush_on_interval(self):
+        buffer = MetricsBuffer(self.batches.append, max_events=100, interval=0.05)
+        buffer.report("a", {})
+        for _ in range(40):
+            if self.batches:
+                break
+            self.flushed.wait(0.05)
+        buffer.shutdown()
+        self.assertEqual(self.batches, [[("a", {})]])
+
+    def test_aggregation(self):
+        buffer = MetricsBuffer(self.batches.append, max_events=100, interval=60)
+        buffer.count("intents")
+        buffer.count("intents", 2)
+        buffer.timing("stt", 0.5)
+        buffer.timing("stt", 1.5)
+        buffer.report("event", {"x": 1})
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(self.batches, [[
+            ("event", {"x": 1}),
+            ("intents", {"type": "counter", "value": 3}),
+            ("stt", {"type": "timer", "count": 2, "total": 2.0, "min": 0.5, "max": 1.5})]])
+        buffer.shutdown()
+
+    def test_requeue_on_failure(self):
+        flush = MagicMock(side_effect=[ConnectionError(), None])
+        buffer = MetricsBuffer(flush, max_events=100, interval=60)
+        buffer.report("a", {})
+        self.assertEqual(buffer.flush(), 0)
+        buffer.report("b", {})
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(flush.call_args[0][0], [("a", {}), ("b", {})])
+        buffer.shutdown()
+
+    def test_requeue_merges_aggregates(self):
+        flush = MagicMock(side_effect=[ConnectionError(), None])
+        buffer = MetricsBuffer(flush, max_events=100, interval=60)
+        buffer.count("intents", 2)
+        buffer.timing("stt", 0.5)
+        buffer.report("event", {"type": "counter", "value": 1, "x": 1})
+        self.assertEqual(buffer.flush(), 0)
+        buffer.count("intents")
+        buffer.timing("stt", 1.5)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(flush.call_args[0][0], [
+            ("event", {"type": "counter", "value": 1, "x": 1}),
+            ("intents", {"type": "counter", "value": 3}),
+            ("stt", {"type": "timer", "count": 2, "total": 2.0, "min": 0.5, "max": 1.5})])
+        buffer.shutdown()
+
+    def test_bounded_requeue_drops_oldest(self):
+        flush = MagicMock(side_effect=[ConnectionError(), None])
+        buffer = MetricsBuffer(flush, max_events=100, interval=60, max_buffered=3)
+        buffer.report("0", {})
+        buffer.report("1", {})
+        buffer.flush()
+        buffer.report("2", {})
+        buffer.report("3", {})
+        self.assertEqual(len(buffer), 3)
+        buffer.flush()
+        self.assertEqual(flush.call_args[0][0], [("1", {}), ("2", {}), ("3", {})])
+        buffer.shutdown()
+
+    def test_bounded(self):
+        buffer = MetricsBuffer(MagicMock(side_effect=ConnectionError()), max_events=100, interval=60,
+                               max_buffered=5)
+        for i in range(10):
+            buffer.report(str(i), {})
+        self.assertEqual(len(buffer), 5)
+        buffer.shutdown()
+
+
+class TestBufferedBackends(unittest.TestCase):
+    @patch("ovos_backend_client.backends.offline.get_metric_database")
+    def test_offline_single_commit(self, mock_db):
+        from ovos_backend_client.backends import OfflineBackend
+        backend = OfflineBackend()
+        buffer = MetricsBuffer(backend.metrics_upload_batch, max_events=100, interval=60)
+        with patch.object(OfflineBackend, "metrics_buffer", buffer):
+            for i in range(5):
+                backend.metrics_upload("intent", {"i": i})
+            mock_db.assert_not_called()
+            buffer.flush()
+        buffer.shutdown()
+        mock_db.assert_called_once()
+        db = mock_db.return_value.__enter__.return_value
+        self.assertEqual(db.add_metric.call_count, 5)
+
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.device_report_metric")
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.post")
+    def test_personal_batch(self, mock_post, mock_report):
+        from ovos_backend_client.backends import PersonalBackend
+        mock_post.return_value = MagicMock(status_code=200)
+        backend = PersonalBackend("https://api.test")
+        with patch.object(PersonalBackend, "uuid", "1234"):
+            backend.metrics_upload_batch([("a", {"x": 1}), ("b", {})])
+            mock_post.assert_called_once_with("https://api.test/v1/device/1234/metrics",
+                                              json=[{"name": "a", "data": {"x": 1}},
+                                                    {"name": "b", "data": {}}])
+            mock_report.assert_not_called()
+            # older servers, one request per metric
+            mock_post.return_value = MagicMock(status_code=404)
+            backend.metrics_upload_batch([("a", {"x": 1}), ("b", {})])
+            self.assertEqual(mock_report.call_count, 2)
+
+    @patch("ovos_backend_client.backends.base.get_metrics_buffer", return_value=None)
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.device_report_metric")
+    def test_buffer_disabled(self, mock_report, _):
+        from ovos_backend_client.api import MetricsApi
+        from ovos_backend_client.backends import BackendType
+        api = MetricsApi("https://api.test", backend_type=BackendType.PERSONAL)
+        api.report_metric("a", {})
+        api.count("b")
+        mock_report.assert_any_call("a", {})
+        mock_report.assert_any_call("b", {"type": "counter", "value": 1})
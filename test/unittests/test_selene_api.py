@@ -16,15 +16,20 @@ import unittest
 import ovos_backend_client
 from ovos_backend_client.backends import BackendType
 import ovos_backend_client.backends
+import ovos_backend_client.cache
 import ovos_backend_client.pairing
+import ovos_backend_client.session
 from unittest.mock import MagicMock, patch
 from unittest import skip
 
-ovos_backend_client.backends.base.requests.post = MagicMock()
+from ovos_backend_client.cache import MemoryResponseCache, set_response_cache
+
+ovos_backend_client.session.requests.Session.post = MagicMock()
 
 
 def create_identity(uuid, expired=False):
     mock_identity = MagicMock()
+    mock_identity.expires_at = 0  # no background refresh
     mock_identity.is_expired.return_value = expired
     mock_identity.uuid = uuid
     return mock_identity
@@ -42,7 +47,7 @@ def create_response(status, json=None, url='', data=''):
 class TestDeviceApi(unittest.TestCase):
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.request')
+    @patch('ovos_backend_client.session.requests.Session.request')
     def test_init(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -53,7 +58,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertTrue(device.url.endswith("/device"))
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.post')
+    @patch('ovos_backend_client.session.requests.Session.post')
     def test_device_activate(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -66,7 +71,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertEqual(json['token'], 'token')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_device_get(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -79,7 +84,7 @@ class TestDeviceApi(unittest.TestCase):
 
     @patch('ovos_backend_client.identity.IdentityManager.update')
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_device_get_code(self, mock_request, mock_identity_get,
                              mock_identit_update):
         mock_request.return_value = create_response(200, '123ABC')
@@ -94,7 +99,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertEqual(params["params"], {"state": "state"})
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_device_get_settings(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -106,7 +111,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/setting')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.post')
+    @patch('ovos_backend_client.session.requests.Session.post')
     def test_device_report_metric(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -124,7 +129,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/metric/mymetric')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.put')
+    @patch('ovos_backend_client.session.requests.Session.put')
     def test_device_send_email(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -142,7 +147,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/message')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_device_get_oauth_token(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -155,7 +160,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/token/1')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_device_get_location(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -167,7 +172,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/location')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_device_get_subscription(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -188,7 +193,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertTrue(device.is_subscriber)
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.put')
+    @patch('ovos_backend_client.session.requests.Session.put')
     def test_device_upload_skills_data(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -210,7 +215,7 @@ class TestDeviceApi(unittest.TestCase):
             device.upload_skills_data('This isn\'t right at all')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_stt(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -218,7 +223,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertTrue(stt.url.endswith('stt'))
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.post')
+    @patch('ovos_backend_client.session.requests.Session.post')
     def test_stt_stt(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -235,6 +240,7 @@ class TestDeviceApi(unittest.TestCase):
     def test_has_been_paired(self, mock_identity_load):
         # reset pairing cache
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity_load.return_value = mock_identity
         # Test None
         mock_identity.uuid = None
@@ -248,9 +254,16 @@ class TestDeviceApi(unittest.TestCase):
 
 
 class TestSettingsMeta(unittest.TestCase):
+    def setUp(self) -> None:
+        self._old = ovos_backend_client.cache._cache
+        set_response_cache(MemoryResponseCache())
+
+    def tearDown(self) -> None:
+        set_response_cache(self._old)
+
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.put')
+    @patch('ovos_backend_client.session.requests.Session.put')
     def test_upload_meta(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -286,7 +299,7 @@ class TestSettingsMeta(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/settingsMeta')
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     def test_get_skill_settings(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -306,6 +319,7 @@ class TestIsPaired(unittest.TestCase):
     def test_is_paired_offline_true(self, mock_backend_status, mock_identity_get):
         mock_backend_status.return_value = False
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.uuid = '1234'
         mock_identity_get.return_value = mock_identity
         self.assertTrue(ovos_backend_client.pairing.is_paired(backend_type=BackendType.OFFLINE))
@@ -315,6 +329,7 @@ class TestIsPaired(unittest.TestCase):
     def test_is_paired_offline_false(self, mock_backend_status, mock_identity_get):
         mock_backend_status.return_value = False
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.uuid = ''
         mock_identity_get.return_value = mock_identity
         self.assertFalse(ovos_backend_client.pairing.is_paired(backend_type=BackendType.OFFLINE))
@@ -326,6 +341,7 @@ class TestIsPaired(unittest.TestCase):
         mock_backend_status.return_value = False
         mock_request.return_value = {"uuid": "1234"}
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.is_expired.return_value = False
         mock_identity.uuid = '1234'
         mock_identity_get.return_value = mock_identity
@@ -334,12 +350,13 @@ class TestIsPaired(unittest.TestCase):
         self.assertEqual(num_calls, mock_identity_get.num_calls)
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     @patch('ovos_backend_client.pairing.is_backend_disabled')
     def test_is_paired_selene_false_local(self, mock_backend_status, mock_request, mock_identity_get):
         mock_backend_status.return_value = False
         mock_request.return_value = create_response(200)
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.is_expired.return_value = False
         mock_identity.uuid = ''
         mock_identity_get.return_value = mock_identity
@@ -348,36 +365,39 @@ class TestIsPaired(unittest.TestCase):
         self.assertFalse(ovos_backend_client.pairing.is_paired(backend_type=BackendType.PERSONAL))
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     @patch('ovos_backend_client.pairing.is_backend_disabled')
     def test_is_paired_selene_false_remote(self, mock_backend_status, mock_request, mock_identity_get):
         mock_backend_status.return_value = False
         mock_request.return_value = create_response(401)
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.is_expired.return_value = False
         mock_identity.uuid = '1234'
         mock_identity_get.return_value = mock_identity
         self.assertFalse(ovos_backend_client.pairing.is_paired(backend_type=BackendType.PERSONAL))
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     @patch('ovos_backend_client.pairing.is_backend_disabled')
     def test_is_paired_selene_error_remote(self, mock_backend_status, mock_request, mock_identity_get):
         mock_backend_status.return_value = False
         mock_request.return_value = create_response(500)
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.is_expired.return_value = False
         mock_identity.uuid = '1234'
         mock_identity_get.return_value = mock_identity
         self.assertFalse(ovos_backend_client.pairing.is_paired(backend_type=BackendType.PERSONAL))
 
     @patch('ovos_backend_client.identity.IdentityManager.get')
-    @patch('ovos_backend_client.backends.base.requests.get')
+    @patch('ovos_backend_client.session.requests.Session.get')
     @patch('ovos_backend_client.pairing.is_backend_disabled')
     def test_is_paired_selene_false_disabled(self, mock_backend_status, mock_request, mock_identity_get):
         mock_backend_status.return_value = True
         mock_request.return_value = create_response(500)
         mock_identity = MagicMock()
+        mock_identity.expires_at = 0  # no background refresh
         mock_identity.is_expired.return_value = False
         mock_identity.uuid = '1234'
         mock_identity_get.return_value = mock_identity
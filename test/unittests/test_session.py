@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import patch
+
+from ovos_backend_client.session import get_session, close_sessions, create_session
+
+
+class TestSession(unittest.TestCase):
+    def tearDown(self) -> None:
+        close_sessions()
+
+    def test_session_per_host(self):
+        s1 = get_session("https://api.openweathermap.org/data/2.5/onecall")
+        s2 = get_session("https://api.openweathermap.org/data/2.5/weather")
+        s3 = get_session("https://nominatim.openstreetmap.org/search")
+        self.assertIs(s1, s2)
+        self.assertIsNot(s1, s3)
+        # url without scheme defaults to http
+        self.assertIs(get_session("127.0.0.1:6712"), get_session("http://127.0.0.1:6712/v1/stt"))
+
+    def test_close_sessions(self):
+        s1 = get_session("http://0.0.0.0:6712")
+        close_sessions()
+        self.assertIsNot(s1, get_session("http://0.0.0.0:6712"))
+
+    def test_create_session(self):
+        session = create_session(pool_connections=2, pool_maxsize=4, max_retries=5)
+        adapter = session.get_adapter("https://example.com")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 5)
+        self.assertFalse(adapter.max_retries.raise_on_status)
+        self.assertEqual(session.headers["Connection"], "keep-alive")
+        session = create_session(keep_alive=False)
+        self.assertEqual(session.headers["Connection"], "close")
+
+    @patch('ovos_backend_client.session.get_session_config')
+    def test_session_config(self, mock_config):
+        mock_config.return_value = {"pool_connections": 1, "pool_maxsize": 1,
+                                    "max_retries": 0, "keep_alive": False}
+        session = get_session("http://localhost:1234")
+        self.assertEqual(session.headers["Connection"], "close")
+        self.assertEqual(session.get_adapter("http://localhost:1234").max_retries.total, 0)
@@ -0,0 +1,142 @@
+import unittest
+from tempfile import TemporaryDirectory
+from threading import Event
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.spool import RetryUpload, UploadSpool, check_upload
+
+
+class TestUploadSpool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.spool = UploadSpool(self.tmp.name, max_bytes=10000, batch_size=2, base_delay=0.05, max_delay=0.2)
+        self.uploaded = []
+
+    def tearDown(self) -> None:
+        self.spool.shutdown()
+        self.tmp.cleanup()
+
+    def handler(self, audio, params, url):
+        self.uploaded.append((audio, params, url))
+
+    def test_enqueue_returns_immediately(self):
+        release = Event()
+        self.spool.register("ww", lambda *args: release.wait(2))
+        self.spool.enqueue("ww", b"audio", {"name": "hey"}, "http://upload")
+        self.assertEqual(self.spool.pending, 1)
+        release.set()
+        self.assertTrue(self.spool.flush(2))
+        self.assertEqual(self.spool.pending, 0)
+
+    def test_upload_order(self):
+        for i in range(5):
+            self.spool.enqueue("ww", f"audio{i}".encode(), {"i": i}, "http://upload")
+        self.assertEqual(self.spool.pending, 5)
+        # no handler registered yet, samples wait
+        self.assertEqual(self.spool.upload_batch(), 0)
+        self.spool.register("ww", self.handler)
+        self.assertTrue(self.spool.flush(2))
+        self.assertEqual([p["i"] for _, p, _ in self.uploaded], list(range(5)))
+        self.assertEqual(self.uploaded[0], (b"audio0", {"i": 0}, "http://upload"))
+
+    def test_survives_restart(self):
+        self.spool.enqueue("ww", b"audio", {}, None)
+        spool = UploadSpool(self.tmp.name)
+        spool.register("ww", self.handler)
+        self.assertTrue(spool.flush(2))
+        spool.shutdown()
+        self.assertEqual(self.uploaded, [(b"audio", {}, None)])
+
+    def test_shared_spool(self):
+        # a second uploader on the same directory, as another process would be
+        other = UploadSpool(self.tmp.name, batch_size=2)
+        for i in range(20):
+            self.spool.enqueue("ww", f"audio{i}".encode(), {"i": i})
+        uploaded = []
+        for spool in (self.spool, other):
+            spool.register("ww", lambda audio, params, url: uploaded.append(params["i"]))
+        self.assertTrue(self.spool.flush(5))
+        self.assertTrue(other.flush(5))
+        other.shutdown()
+        self.assertEqual(sorted(uploaded), list(range(20)))
+
+    def test_recover_dead_claim(self):
+        import os
+        import subprocess
+        import sys
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+        entry = self.spool.enqueue("ww", b"audio", {})
+        os.rename(os.path.join(self.tmp.name, entry + ".json"),
+                  os.path.join(self.tmp.name, f"{entry}.{proc.pid}-dead.inflight"))
+        self.assertEqual(self.spool.pending, 1)
+        self.spool.register("ww", self.handler)
+        self.assertTrue(self.spool.flush(2))
+        self.assertEqual(self.uploaded, [(b"audio", {}, None)])
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_byte_cap(self):
+        for i in range(5):
+            self.spool.enqueue("ww", bytes([i]) * 3000, {"i": i})
+        self.assertLessEqual(self.spool.size, 10000)
+        self.spool.register("ww", self.handler)
+        self.assertTrue(self.spool.flush(2))
+        # oldest samples were evicted
+        self.assertEqual([p["i"] for _, p, _ in self.uploaded], [2, 3, 4])
+
+    def test_backoff(self):
+        handler = MagicMock(side_effect=[RetryUpload("503"), ConnectionError(), None])
+        self.spool.enqueue("ww", b"audio", {})
+        self.spool.register("ww", handler)
+        self.assertTrue(self.spool.flush(2))
+        self.assertEqual(handler.call_count, 3)
+        self.assertEqual(self.spool.failures, 0)
+
+    def test_rejected_sample_dropped(self):
+        self.spool.enqueue("ww", b"bad", {})
+        self.spool.enqueue("ww", b"good", {})
+        self.spool.register("ww", lambda audio, *args: check_upload(
+            MagicMock(status_code=400 if audio == b"bad" else 200)))
+        self.assertTrue(self.spool.flush(2))
+        self.assertEqual(self.spool.pending, 0)
+        self.assertEqual(self.spool.failures, 0)
+
+    def test_check_upload(self):
+        for status in (500, 503, 408, 429):
+            with self.assertRaises(RetryUpload):
+                check_upload(MagicMock(status_code=status))
+        with self.assertRaises(ValueError):
+            check_upload(MagicMock(status_code=404))
+        response = MagicMock(status_code=200)
+        self.assertIs(check_upload(response), response)
+
+
+class TestSpooledBackend(unittest.TestCase):
+    @patch("ovos_backend_client.backends.base.get_upload_spool")
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.post")
+    def test_device_upload_wake_word(self, mock_post, mock_get_spool):
+        from ovos_backend_client.backends import PersonalBackend
+        with TemporaryDirectory() as tmp:
+            spool = UploadSpool(tmp)
+            mock_get_spool.return_value = spool
+            mock_post.return_value = MagicMock(status_code=200)
+            backend = PersonalBackend("https://api.test")
+            with patch.object(PersonalBackend, "uuid", "1234"):
+                result = backend.device_upload_wake_word(b"RIFF", {"name": "hey_mycroft", "model": "m",
+                                                                   "engine": "precise", "time": "1"})
+                self.assertIn("spooled", result)
+                self.assertTrue(spool.flush(2))
+            spool.shutdown()
+        url = mock_post.call_args[0][0]
+        self.assertEqual(url, "https://api.test/v1/device/1234/wake-word-file")
+        files = mock_post.call_args[1]["files"]
+        self.assertEqual(files["audio"].getvalue(), b"RIFF")
+
+    @patch("ovos_backend_client.backends.base.get_upload_spool", return_value=None)
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.post")
+    def test_spool_disabled(self, mock_post, _):
+        from ovos_backend_client.backends import PersonalBackend
+        backend = PersonalBackend("https://api.test")
+        backend.dataset_upload_stt_recording(b"RIFF", {"transcription": "hello"}, "https://upload.test")
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args[0][0], "https://upload.test")
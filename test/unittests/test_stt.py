@@ -0,0 +1,367 @@
+import time
+import unittest
+from threading import Event, Thread
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.exceptions import STTQueueFull
+from ovos_backend_client.stt import STTDispatcher, STTEnginePool, STTPriority, decode_audio, encode_audio, \
+    make_hypothesis
+
+try:
+    import speech_recognition as sr
+except ImportError:
+    sr = None
+
+
+class FakeSTT:
+    def __init__(self, config):
+        self.config = config
+        self.shutdown = MagicMock()
+
+    def execute(self, audio, lang):
+        time.sleep(0.1)
+        return f"{lang}:{audio}"
+
+
+class FakeStreamingSTT(FakeSTT):
+    """ mimics the OPM StreamingSTT interface, the hypothesis grows with every chunk """
+
+    def stream_start(self, lang):
+        self.stream = MagicMock(text="")
+
+    def stream_data(self, chunk):
+        self.stream.text = (self.stream.text + " " + chunk.decode()).strip()
+
+    def stream_stop(self):
+        text, self.stream = self.stream.text, None
+        return text
+
+
+class TestSTTEnginePool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.factory = MagicMock(side_effect=FakeSTT)
+        self.pool = STTEnginePool(max_resident=2, factory=self.factory)
+        self.config = {"module": "fake"}
+
+    def test_engine_per_lang(self):
+        self.assertEqual(self.pool.execute("a", "en-us", self.config), "en-us:a")
+        self.assertEqual(self.pool.execute("b", "pt-pt", self.config), "pt-pt:b")
+        self.assertEqual(self.pool.execute("c", "en-us", self.config), "en-us:c")
+        self.assertEqual(self.factory.call_count, 2)
+        langs = [c[0][0]["lang"] for c in self.factory.call_args_list]
+        self.assertEqual(langs, ["en-us", "pt-pt"])
+
+    def test_lru_eviction(self):
+        en = self.pool.get("en-us", self.config)
+        self.pool.get("pt-pt", self.config)
+        self.pool.get("en-us", self.config)  # pt-pt is now the least recently used
+        pt = self.pool._engines[self.pool.make_key({**self.config, "lang": "pt-pt"})]
+        self.pool.get("es-es", self.config)
+        self.assertEqual(len(self.pool.resident), 2)
+        pt.shutdown.assert_called_once()
+        self.assertIs(self.pool.get("en-us", self.config), en)
+        self.assertEqual(self.factory.call_count, 3)
+
+    def test_busy_engine_not_evicted(self):
+        pool = STTEnginePool(max_resident=1, factory=FakeStreamingSTT)
+        stream = pool.stream(iter([b"a", b"b"]), "en-us", self.config)
+        next(stream)  # en-us is in use until the stream ends
+        en = pool._engines[pool.make_key({**self.config, "lang": "en-us"})]
+        pt = pool.get("pt-pt", self.config)
+        self.assertEqual(len(pool.resident), 2)
+        en.shutdown.assert_not_called()
+        # engines are shut down outside of the pool lock
+        locked = []
+        pt.shutdown.side_effect = lambda: locked.append(pool._lock.locked())
+        list(stream)
+        pool.get("es-es", self.config)
+        self.assertEqual(pool.resident, [pool.make_key({**self.config, "lang": "es-es"})])
+        en.shutdown.assert_called_once()
+        pt.shutdown.assert_called_once()
+        self.assertEqual(locked, [False])
+
+    def test_languages_run_concurrently(self):
+        self.pool.warm_up(["en-us", "pt-pt"], self.config, background=False)
+        threads = [Thread(target=self.pool.execute, args=("a", lang, self.config))
+                   for lang in ("en-us", "pt-pt")]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLess(time.monotonic() - start, 0.19)
+
+    def test_single_load(self):
+        threads = [Thread(target=self.pool.get, args=("en-us", self.config)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.factory.call_count, 1)
+
+    def test_single_reload_after_eviction(self):
+        pool = STTEnginePool(max_resident=1, factory=self.factory)
+        pool.get("en-us", self.config)
+        pool.get("pt-pt", self.config)  # evicts en-us
+        self.assertEqual(pool._locks, {})  # key locks are dropped once unused
+        threads = [Thread(target=pool.get, args=("en-us", self.config)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.factory.call_count, 3)
+
+    def test_stream(self):
+        pool = STTEnginePool(factory=FakeStreamingSTT)
+        hypotheses = list(pool.stream([b"hello", b"world"], "en-us", self.config))
+        self.assertEqual(hypotheses, [make_hypothesis("hello", False),
+                                      make_hypothesis("hello world", False),
+                                      make_hypothesis("hello world")])
+
+    @unittest.skipIf(sr is None, "speech_recognition not installed")
+    def test_stream_buffered(self):
+        # plugins without streaming support transcribe once the chunks end
+        hypotheses = list(self.pool.stream([b"\x00\x00", b"\x01\x00"], "en-us", self.config))
+        self.assertEqual(len(hypotheses), 1)
+        self.assertTrue(hypotheses[0]["final"])
+        self.assertTrue(hypotheses[0]["transcript"].startswith("en-us:<speech_recognition.audio.AudioData"))
+
+    def test_stream_releases_engine(self):
+        pool = STTEnginePool(factory=FakeStreamingSTT)
+        stream = pool.stream(iter([b"a", b"b"]), "en-us", self.config)
+        next(stream)
+        stream.close()
+        # the engine lock was released and the stream stopped
+        self.assertEqual(pool.execute("x", "en-us", self.config), "en-us:x")
+        self.assertIsNone(pool.get("en-us", self.config).stream)
+
+
+@unittest.skipIf(sr is None, "speech_recognition not installed")
+class TestStreamingBackends(unittest.TestCase):
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.check_token")
+    @patch("ovos_backend_client.backends.base.get_session")
+    def test_personal_stream(self, mock_get_session, _):
+        from ovos_backend_client.backends import PersonalBackend
+        sent = []
+
+        def post(url, data=None, **kwargs):
+            sent.extend(data)
+            return MagicMock(status_code=200, iter_lines=lambda: [
+                b'{"transcript": "hello", "final": false}', b"",
+                b'{"transcript": "hello world", "final": true}'])
+
+        mock_get_session.return_value.post.side_effect = post
+        backend = PersonalBackend("https://api.test")
+        hypotheses = list(backend.stt_stream([b"a", b"b"], "en-us"))
+        self.assertEqual(hypotheses, [make_hypothesis("hello", False), make_hypothesis("hello world")])
+        self.assertEqual(sent, [b"a", b"b"])
+        url = mock_get_session.return_value.post.call_args[0][0]
+        self.assertEqual(url, "https://api.test/v1/stt/stream")
+        headers = mock_get_session.return_value.post.call_args[1]["headers"]
+        self.assertEqual(headers["Content-Type"], "audio/L16; rate=16000")
+
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.stt_get", return_value=["hello"])
+    @patch("ovos_backend_client.backends.personal.PersonalBackend.post")
+    def test_personal_stream_fallback(self, mock_post, mock_stt_get):
+        from ovos_backend_client.backends import PersonalBackend
+        mock_post.return_value = MagicMock(status_code=404)
+        backend = PersonalBackend("https://api.test")
+        hypotheses = list(backend.stt_stream([b"\x01\x00", b"\x02\x00"], "en-us"))
+        self.assertEqual(hypotheses, [make_hypothesis("hello")])
+        audio = mock_stt_get.call_args[0][0]
+        self.assertEqual(audio.frame_data, b"\x01\x00\x02\x00")
+
+    @patch("ovos_backend_client.backends.async_offline.get_stt_pool")
+    def test_async_offline_stream(self, mock_get_pool):
+        import asyncio
+        from ovos_backend_client.backends import AsyncOfflineBackend
+        mock_get_pool.return_value = STTEnginePool(factory=FakeStreamingSTT)
+
+        async def chunks():
+            for c in (b"hello", b"world"):
+                await asyncio.sleep(0)
+                yield c
+
+        async def collect():
+            backend = AsyncOfflineBackend()
+            backend.stt_config = {"module": "fake"}
+            return [h async for h in backend.stt_stream(chunks(), "en-us")]
+
+        self.assertEqual(asyncio.run(collect()), [make_hypothesis("hello", False),
+                                                  make_hypothesis("hello world", False),
+                                                  make_hypothesis("hello world")])
+
+
+    @patch("ovos_backend_client.backends.offline.get_stt_pool")
+    def test_offline_assigned_engine(self, mock_get_pool):
+        from ovos_backend_client.backends import OfflineBackend
+        audio = sr.AudioData(b"\x00\x00", 16000, 2)
+        backend = OfflineBackend()
+        backend.stt = MagicMock()
+        backend.stt.execute.return_value = "hello"
+        self.assertEqual(backend.stt_get(audio), ["hello"])
+        backend.stt.execute.assert_called_once()
+        mock_get_pool.return_value.execute.assert_not_called()
+        # plugins loaded through the backend are looked up in the pool on every use
+        backend.load_stt_plugin({"module": "fake"}, "en-us")
+        self.assertIs(backend.stt, mock_get_pool.return_value.get.return_value)
+        mock_get_pool.return_value.execute.return_value = "pooled"
+        self.assertEqual(backend.stt_get(audio), ["pooled"])
+
+
+@unittest.skipIf(sr is None, "speech_recognition not installed")
+class TestDecodeAudio(unittest.TestCase):
+    def test_wav(self):
+        frames = b"\x01\x00\x02\x00" * 8000
+        wav = sr.AudioData(frames, 16000, 2).get_wav_data()
+        with patch("tempfile.NamedTemporaryFile") as mock_tmp:
+            audio = decode_audio(memoryview(wav))
+            mock_tmp.assert_not_called()
+        self.assertEqual(audio.frame_data, frames)
+        self.assertEqual(audio.sample_rate, 16000)
+        self.assertEqual(audio.sample_width, 2)
+
+    def test_passthrough(self):
+        audio = sr.AudioData(b"\x00\x00", 16000, 2)
+        self.assertIs(decode_audio(audio), audio)
+
+    def test_8bit(self):
+        import wave
+        from io import BytesIO
+        buf = BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(1)
+            w.setframerate(8000)
+            w.writeframes(bytes([128, 255, 0]))  # unsigned, 128 is silence
+        audio = decode_audio(buf.getvalue())
+        self.assertEqual(audio.frame_data, bytes([0, 127, 128]))  # signed 0, 127, -128
+        self.assertEqual(audio.get_wav_data()[-3:], bytes([128, 255, 0]))
+
+    def test_multichannel(self):
+        import struct
+        import wave
+        from io import BytesIO
+        for width, fmt in ((2, "<h"), (3, "<i"), (4, "<i")):
+            buf = BytesIO()
+            with wave.open(buf, "wb") as w:
+                w.setnchannels(4)
+                w.setsampwidth(width)
+                w.setframerate(16000)
+                # frames of 4 channels, each frame averages to 100
+                frame = b"".join(struct.pack(fmt, v)[:width] for v in (400, 0, 0, 0))
+                w.writeframes(frame * 10)
+            audio = decode_audio(buf.getvalue())
+            self.assertEqual(audio.sample_width, width)
+            self.assertEqual(len(audio.frame_data), 10 * width)
+            self.assertEqual(audio.frame_data[:width], struct.pack(fmt, 100)[:width])
+
+    def test_flac(self):
+        frames = b"\x01\x00\x02\x00" * 8000
+        flac = sr.AudioData(frames, 16000, 2).get_flac_data()
+        audio = decode_audio(flac)
+        self.assertEqual(audio.frame_data, frames)
+        self.assertEqual(audio.sample_rate, 16000)
+
+
+@unittest.skipIf(sr is None, "speech_recognition not installed")
+class TestEncodeAudio(unittest.TestCase):
+    def setUp(self) -> None:
+        # 1 second of 44.1kHz 16bit stereo
+        self.frames = b"\x01\x00\x02\x00" * 44100
+        self.audio = sr.AudioData(self.frames, 44100, 2)
+
+    def test_wav_to_flac(self):
+        wav = self.audio.get_wav_data()
+        data, content_type = encode_audio(wav, "flac", 16000)
+        self.assertEqual(content_type, "audio/x-flac")
+        self.assertEqual(data[:4], b"fLaC")
+        self.assertLess(len(data), len(wav) / 4)
+        decoded = decode_audio(data)
+        self.assertEqual(decoded.sample_rate, 16000)
+        self.assertEqual(decoded.sample_width, 2)
+
+    def test_stereo_downmix(self):
+        import wave
+        from io import BytesIO
+        buf = BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(b"\x10\x00\x10\x00" * 16000)
+        data, content_type = encode_audio(buf.getvalue(), "wav", 16000)
+        self.assertEqual(content_type, "audio/wav")
+        decoded = decode_audio(data)
+        self.assertEqual(len(decoded.frame_data), 16000 * 2)
+
+    def test_never_upsample(self):
+        audio = sr.AudioData(b"\x01\x00" * 8000, 8000, 2)
+        data, _ = encode_audio(audio, "wav", 16000)
+        self.assertEqual(decode_audio(data).sample_rate, 8000)
+
+    def test_passthrough(self):
+        flac = self.audio.get_flac_data()
+        self.assertEqual(encode_audio(flac, "flac", 16000), (flac, "audio/x-flac"))
+        self.assertEqual(encode_audio("La la la"), ("La la la", "audio/x-flac"))
+
+    @patch("ovos_backend_client.stt.shutil.which", return_value=None)
+    def test_opus_fallback(self, _):
+        data, content_type = encode_audio(self.audio, "opus", 16000)
+        self.assertEqual(content_type, "audio/x-flac")
+        self.assertEqual(data[:4], b"fLaC")
+
+
+class TestSTTDispatcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.release = Event()
+        self.calls = []
+
+        def stt_get(audio, language, limit):
+            self.calls.append(audio)
+            self.release.wait(2)
+            return [f"{language}:{audio}"]
+
+        self.stt_get = stt_get
+
+    def test_bounded_window(self):
+        dispatcher = STTDispatcher(max_in_flight=2, max_queued=2)
+        futures = [dispatcher.submit(self.stt_get, f"a{i}") for i in range(4)]
+        time.sleep(0.1)
+        metrics = dispatcher.metrics
+        self.assertEqual(metrics["in_flight"], 2)
+        self.assertEqual(metrics["queued"], 2)
+        with self.assertRaises(STTQueueFull):
+            dispatcher.submit(self.stt_get, "a4")
+        self.release.set()
+        self.assertEqual([f.result(2) for f in futures], [[f"en-us:a{i}"] for i in range(4)])
+        self.assertEqual(dispatcher.metrics["rejected"], 1)
+        self.assertEqual(dispatcher.metrics["completed"], 4)
+
+    def test_coalesce(self):
+        dispatcher = STTDispatcher(max_in_flight=1, max_queued=1)
+        f1 = dispatcher.submit(self.stt_get, b"same")
+        f2 = dispatcher.submit(self.stt_get, b"same")
+        self.assertIs(f1, f2)
+        self.release.set()
+        self.assertEqual(f1.result(2), ["en-us:b'same'"])
+        self.assertEqual(self.calls, [b"same"])
+        self.assertEqual(dispatcher.metrics["coalesced"], 1)
+
+    def test_priority(self):
+        dispatcher = STTDispatcher(max_in_flight=1, max_queued=2)
+        running = dispatcher.submit(self.stt_get, "running")
+        time.sleep(0.05)
+        dataset = [dispatcher.submit(self.stt_get, f"d{i}", priority=STTPriority.DATASET) for i in range(2)]
+        # queue is full, the newest dataset request makes room for the interactive one
+        interactive = dispatcher.submit(self.stt_get, "interactive")
+        with self.assertRaises(STTQueueFull):
+            dataset[1].result(1)
+        with self.assertRaises(STTQueueFull):
+            dispatcher.submit(self.stt_get, "d2", priority=STTPriority.DATASET)
+        self.assertEqual(dispatcher.metrics["queued_by_priority"], {"interactive": 1, "dataset": 1})
+        self.release.set()
+        interactive.result(2)
+        dataset[0].result(2)
+        running.result(2)
+        self.assertEqual(self.calls, ["running", "interactive", "d0"])
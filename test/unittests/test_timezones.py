@@ -0,0 +1,75 @@
+import time
+import unittest
+from threading import Thread
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.timezones import TimezoneResolver
+
+
+class TestTimezoneResolver(unittest.TestCase):
+    @patch("ovos_backend_client.timezones.TimezoneFinder")
+    def test_lazy_single_finder(self, mock_finder):
+        mock_finder.return_value.timezone_at.return_value = "Europe/Lisbon"
+        resolver = TimezoneResolver(in_memory=True)
+        mock_finder.assert_not_called()
+        self.assertEqual(resolver.timezone_at(38.7077, -9.1365), "Europe/Lisbon")
+        self.assertEqual(resolver.timezone_at(40.0, -8.0), "Europe/Lisbon")
+        mock_finder.assert_called_once_with(in_memory=True)
+
+    @patch("ovos_backend_client.timezones.TimezoneFinder")
+    def test_lru(self, mock_finder):
+        lookup = mock_finder.return_value.timezone_at
+        lookup.return_value = "Europe/Lisbon"
+        resolver = TimezoneResolver(precision=3, cache_size=2)
+        resolver.timezone_at(38.70771, -9.13651)
+        resolver.timezone_at(38.70772, -9.13652)  # same rounded key
+        self.assertEqual(lookup.call_count, 1)
+        resolver.timezone_at(1, 1)
+        resolver.timezone_at(2, 2)  # evicts the first entry
+        resolver.timezone_at(38.7077, -9.1365)
+        self.assertEqual(lookup.call_count, 4)
+
+    @patch("ovos_backend_client.timezones.TimezoneFinder")
+    def test_batch(self, mock_finder):
+        lookup = mock_finder.return_value.timezone_at
+        lookup.side_effect = lambda lng, lat: "A" if lat > 0 else "B"
+        resolver = TimezoneResolver()
+        self.assertEqual(resolver.timezones_at([(1, 1), (-1, 1), (1, 1)]), ["A", "B", "A"])
+        self.assertEqual(lookup.call_count, 2)
+
+    @patch("ovos_backend_client.timezones.TimezoneFinder")
+    def test_serialized_lookups(self, mock_finder):
+        active = []
+        overlaps = []
+
+        def lookup(lng, lat):
+            active.append(lat)
+            overlaps.append(len(active) > 1)
+            time.sleep(0.01)
+            active.remove(lat)
+            return "Europe/Lisbon"
+
+        mock_finder.return_value.timezone_at.side_effect = lookup
+        resolver = TimezoneResolver()
+        threads = [Thread(target=resolver.timezone_at, args=(i, i)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(overlaps, [False] * 5)
+
+    @patch("ovos_backend_client.timezones.TimezoneFinder", None)
+    def test_not_installed(self):
+        resolver = TimezoneResolver()
+        self.assertFalse(resolver.available)
+        with self.assertRaises(ImportError):
+            resolver.timezone_at(1, 1)
+
+    @patch("ovos_backend_client.backends.base.get_timezone_resolver")
+    def test_backend_timezone(self, mock_get_resolver):
+        from ovos_backend_client.backends.base import AbstractBackend
+        resolver = MagicMock()
+        resolver.timezone_at.return_value = "Europe/Lisbon"
+        mock_get_resolver.return_value = resolver
+        self.assertEqual(AbstractBackend._get_timezone(lat=38.7, lon=-9.1),
+                         {"name": "Europe Lisbon", "code": "Europe/Lisbon"})
@@ -0,0 +1,83 @@
+import json
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+from ovos_backend_client.transcription import BatchTranscriptionJob
+
+try:
+    import speech_recognition as sr
+except ImportError:
+    sr = None
+
+
+class FakeSTT:
+    def __init__(self, config):
+        self.config = config
+
+    def execute(self, audio, lang):
+        return [f"{lang} {len(audio.frame_data)}"]
+
+
+@unittest.skipIf(sr is None, "speech_recognition not installed")
+class TestBatchTranscription(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.recs = []
+        for i in range(5):
+            path = join(self.tmp.name, f"{i}.wav")
+            with open(path, "wb") as f:
+                f.write(sr.AudioData(b"\x00\x00" * (i + 1), 16000, 2).get_wav_data())
+            self.recs.append({"utterance_id": i, "transcription": "", "path": path})
+        self.recs.append({"utterance_id": 5, "transcription": "", "path": join(self.tmp.name, "missing.wav")})
+        self.backend = MagicMock()
+        self.backend.iter_stt_recordings.side_effect = lambda: iter(self.recs)
+        self.state = join(self.tmp.name, "state.json")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _job(self, workers=0):
+        return BatchTranscriptionJob(self.backend, "en-us", {"module": "fake"}, workers=workers,
+                                     batch_size=2, state_file=self.state, factory=FakeSTT)
+
+    def test_bulk_commits(self):
+        self.assertEqual(self._job().run(), 5)
+        calls = [c[0][0] for c in self.backend.db_update_stt_recordings.call_args_list]
+        self.assertEqual(calls, [{0: "en-us 2", 1: "en-us 4"}, {2: "en-us 6", 3: "en-us 8"}, {4: "en-us 10"}])
+        with open(self.state) as f:
+            self.assertEqual(json.load(f)["done"], [0, 1, 2, 3, 4])
+
+    def test_resume(self):
+        with open(self.state, "w") as f:
+            json.dump({"done": [0, 1, 2]}, f)
+        job = self._job()
+        self.assertEqual(job.run(), 2)
+        self.backend.db_update_stt_recordings.assert_called_once_with({3: "en-us 8", 4: "en-us 10"})
+        self.assertEqual(job.run(), 0)
+        job.reset()
+        self.assertEqual(job.run(), 5)
+
+    def test_process_pool(self):
+        self.assertEqual(self._job(workers=2).run(), 5)
+        updates = {}
+        for c in self.backend.db_update_stt_recordings.call_args_list:
+            updates.update(c[0][0])
+        self.assertEqual(updates, {i: f"en-us {2 * (i + 1)}" for i in range(5)})
+
+    @patch("ovos_backend_client.transcription.get_xdg_cache_save_path")
+    def test_state_per_job(self, mock_cache_path):
+        from ovos_backend_client.backends import PersonalBackend
+        mock_cache_path.return_value = self.tmp.name
+        backend = PersonalBackend("https://a.example.com")
+
+        def state_file(lang="en-us", config=None, backend=backend):
+            return BatchTranscriptionJob(backend, lang, config or {"module": "fake"}).state_file
+
+        self.assertEqual(state_file(), state_file())
+        self.assertNotEqual(state_file(), state_file("pt-pt"))
+        self.assertNotEqual(state_file(), state_file(config={"module": "other"}))
+        self.assertNotEqual(state_file(), state_file(backend=PersonalBackend("https://b.example.com")))
+        job = BatchTranscriptionJob(backend, stt_config={"module": "fake"}, job_id="nightly")
+        self.assertTrue(job.state_file.endswith("batch_transcription_nightly.json"))
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+
+import ovos_backend_client.cache
+from ovos_backend_client.api import OpenWeatherMapApi
+from ovos_backend_client.backends import BackendType, OfflineBackend
+from ovos_backend_client.cache import MemoryResponseCache, set_response_cache
+from ovos_backend_client.weather import geohash_encode, onecall_current, onecall_daily, onecall_hourly, \
+    quantize_lat_lon
+
+ONECALL = {"lat": 1, "lon": 2, "timezone": "UTC", "timezone_offset": 0,
+           "current": {"temp": 20}, "hourly": [{"temp": 21}], "daily": [{"temp": {"day": 22}}]}
+
+
+class TestOneCallViews(unittest.TestCase):
+    def test_views(self):
+        self.assertEqual(onecall_current(ONECALL),
+                         {"lat": 1, "lon": 2, "timezone": "UTC", "timezone_offset": 0,
+                          "current": {"temp": 20}})
+        self.assertEqual(onecall_hourly(ONECALL)["hourly"], [{"temp": 21}])
+        self.assertNotIn("current", onecall_hourly(ONECALL))
+        self.assertEqual(onecall_daily(ONECALL)["daily"], [{"temp": {"day": 22}}])
+
+
+class TestGeoBuckets(unittest.TestCase):
+    def test_geohash(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+    def test_quantize(self):
+        a = quantize_lat_lon((38.7077, -9.1365), 6)
+        b = quantize_lat_lon((38.7079, -9.1362), 6)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, quantize_lat_lon((38.75, -9.1365), 6))
+        self.assertEqual(quantize_lat_lon((38.7077, -9.1365), 0), (38.7077, -9.1365))
+        self.assertIsNone(quantize_lat_lon(None, 6))
+
+    @patch("ovos_backend_client.weather.get_weather_config")
+    @patch("ovos_backend_client.backends.offline.OfflineBackend.get")
+    def test_nearby_share_cache(self, mock_get, mock_config):
+        mock_config.return_value = {"aggregate": False, "geohash_precision": 6}
+        mock_get.return_value.json.return_value = ONECALL
+        old = ovos_backend_client.cache._cache
+        set_response_cache(MemoryResponseCache())
+        try:
+            owm = OpenWeatherMapApi(backend_type=BackendType.OFFLINE, key="key")
+            owm.get_weather((38.7077, -9.1365))
+            owm.get_weather(lat_lon=(38.7079, -9.1362))
+            mock_get.assert_called_once()
+        finally:
+            set_response_cache(old)
+
+
+class TestWeatherAggregation(unittest.TestCase):
+    def setUp(self) -> None:
+        self._old = ovos_backend_client.cache._cache
+        set_response_cache(MemoryResponseCache())
+
+    def tearDown(self) -> None:
+        set_response_cache(self._old)
+
+    @patch("ovos_backend_client.api.get_weather_config")
+    @patch("ovos_backend_client.backends.offline.OfflineBackend.get")
+    def test_single_fetch(self, mock_get, mock_config):
+        mock_config.return_value = {"aggregate": True}
+        mock_get.return_value.json.return_value = ONECALL
+        owm = OpenWeatherMapApi(backend_type=BackendType.OFFLINE, key="key")
+        self.assertEqual(owm.get_current((1, 2))["current"], {"temp": 20})
+        self.assertEqual(owm.get_hourly((1, 2))["hourly"], [{"temp": 21}])
+        self.assertEqual(owm.get_daily((1, 2))["daily"], [{"temp": {"day": 22}}])
+        mock_get.assert_called_once()
+        self.assertTrue(mock_get.call_args[0][0].endswith("/onecall"))
+
+    @patch("ovos_backend_client.backends.offline.get_weather_config")
+    @patch("ovos_backend_client.backends.offline.OfflineBackend.get")
+    def test_disabled(self, mock_get, mock_config):
+        mock_config.return_value = {"aggregate": False}
+        mock_get.return_value.json.return_value = {"main": {"temp": 20}}
+        backend = OfflineBackend(credentials={"owm": "key"})
+        backend.owm_get_current((1, 2))
+        self.assertTrue(mock_get.call_args[0][0].endswith("/weather"))